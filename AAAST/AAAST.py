@@ -1,130 +1,442 @@
-# -*- coding: utf-8 -*-
-"""
-@author: mlv
-
-Purpose:
-    Functions for parsing the syntax tree for python files.
-"""
-
-# ast package can parse Python files
-import ast
-
-def get_ast_for_file(full_path):
-    '''
-    Get the ast for a python file.
-
-    Parameters
-    ----------
-    full_path : path
-        file path to the python file
-
-    Returns
-    -------
-    AST node with AST information for the python file.
-    '''
-    return ast.parse(open(full_path).read())
-
-
-def get_imports(module_node):
-    '''
-    Get a list of imported modules based on the AST for a python file.
-    Imported modules are extracted from "Import xxx" and "From XXX import YYY" statements
-
-    Parameters
-    ----------
-    module_node : AST node
-        AST node for a python file.
-
-    Returns
-    -------
-    list of string
-        List of full module names for imported modules.
-
-    '''
-    extractor = NodeExtractor()
-    extractor.visit(module_node)
-    return extractor.imports    
-
-
-'''
-Visitor to extract imported modules
-'''
-class NodeExtractor(ast.NodeVisitor):
-
-    def __init__(self):
-      self.imports = set()
-      self.rest_api_routes = []
-
-    def visit_Import(self, import_node):
-        # retrieve the name from the returned object
-        # normally, there is just a single alias
-        for alias in import_node.names:
-            self.imports.add(alias.name)
-        # delegate to the default visitor
-        super(NodeExtractor, self).generic_visit(import_node)
-        
-    def visit_ImportFrom(self, import_from_node):
-        
-        if import_from_node.level == 0: # imports with level 1 import from current dir. import level 2 import from the parent dir. We ignore these
-            import_from_module_name = str(import_from_node.module)
-            for alias in import_from_node.names:
-                imported_module_name = import_from_module_name + "." + alias.name
-                self.imports.add(imported_module_name)
-#        else:
-#            print(ast.dump(import_from_node))
-        # delegate to the default visitor
-        super(NodeExtractor, self).generic_visit(import_from_node)
-
-
-
-
-'''
-    The remainder of this file is not used for the report.
-    It contains experiments that where ultimately not used.
-'''
-'''
-# class RestApiExtractor(ast.NodeVisitor):
-#     def __init__(self):
-#         self.rest_api_routes = []
-#     def visit_Call(self, call_node):
-#         # Check if this has an attribute with a value of "api" and a keywords list including "GET" or "POST"
-# #        print(ast.dump(call_node))
-#         func = call_node.func
-#         if type(func) is ast.Attribute:
-#             value = func.value
-#             if type(value) is ast.Name:
-#                 value_id = value.id
-#                 if(value_id == "api"):
-#                     for keyword in call_node.keywords:
-#                         value_list = keyword.value
-#                         for element in value_list.elts:
-#                             element_value = element.value
-#                             if(element_value == "GET" or element_value == "POST"):
-#                                 self.register_rest_api(call_node, element_value)
-                            
-# #            else:
-# #                print("Value is not Name")
-# #        else:
-# #            print("Func is not Attribute")
-#         super(RestApiExtractor, self).generic_visit(call_node)
-#     def register_rest_api(self, call_node, api_type):
-#         api_ref = ""
-#         for arg in call_node.args:
-#             if type(arg) == ast.Constant:
-#                 api_ref = arg.value
-# #        print(api_ref)
-#         self.rest_api_routes.append([api_type, api_ref])
-
-        
-#     def visit_FunctionDef(self, function_def_node):
-#         for decorator_node in function_def_node.decorator_list:
-#             visitor = RestApiExtractor()
-#             visitor.visit(decorator_node)
-#             for api_route in visitor.rest_api_routes:
-#                 self.rest_api_routes.append([api_route[0] , api_route[1], function_def_node.name])
-
-# def get_rest_api(module_node):
-#     extractor = NodeExtractor()
-#     extractor.visit(module_node)
-#     return extractor.rest_api_routes
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Functions for parsing the syntax tree for python files.
+"""
+
+# ast package can parse Python files
+import ast
+import re
+import unicodedata
+
+def get_ast_for_file(full_path):
+    '''
+    Get the ast for a python file.
+
+    Parameters
+    ----------
+    full_path : path
+        file path to the python file
+
+    Returns
+    -------
+    AST node with AST information for the python file.
+    '''
+    with open(full_path, "rb") as file:
+        return ast.parse(file.read())
+
+
+def get_ast_for_source(source):
+    '''
+    Get the ast for the contents of a python file.
+
+    Parameters
+    ----------
+    source : bytes or string
+        Contents of the python file. Bytes are decoded as specified by
+        the encoding declaration of the file, if any.
+
+    Returns
+    -------
+    AST node with AST information for the python file.
+    '''
+    return ast.parse(source)
+
+
+def get_imports(module_node):
+    '''
+    Get a list of imported modules based on the AST for a python file.
+    Imported modules are extracted from "Import xxx" and "From XXX import YYY" statements
+
+    Parameters
+    ----------
+    module_node : AST node
+        AST node for a python file.
+
+    Returns
+    -------
+    list of string
+        List of full module names for imported modules.
+
+    '''
+    extractor = NodeExtractor()
+    extractor.visit(module_node)
+    return extractor.imports    
+
+
+def get_import_lines(module_node):
+    '''
+    Get the imported modules based on the AST for a python file, with the
+    line numbers of the import statements. Like get_imports, but for
+    reporting where an import is made.
+
+    Parameters
+    ----------
+    module_node : AST node
+        AST node for a python file.
+
+    Returns
+    -------
+    list of (string, int)
+        Full module name for imported module, and the line number of the
+        import statement. In the order of the file.
+    '''
+    extractor = NodeExtractor()
+    extractor.visit(module_node)
+    return extractor.import_lines
+
+
+'''
+Visitor to extract imported modules
+'''
+class NodeExtractor(ast.NodeVisitor):
+
+    def __init__(self):
+      self.imports = set()
+      self.import_lines = []
+      self.rest_api_routes = []
+
+    def visit_Import(self, import_node):
+        # retrieve the name from the returned object
+        # normally, there is just a single alias
+        for alias in import_node.names:
+            self.imports.add(alias.name)
+            self.import_lines.append((alias.name, import_node.lineno))
+        # delegate to the default visitor
+        super(NodeExtractor, self).generic_visit(import_node)
+        
+    def visit_ImportFrom(self, import_from_node):
+        
+        if import_from_node.level == 0: # imports with level 1 import from current dir. import level 2 import from the parent dir. We ignore these
+            import_from_module_name = str(import_from_node.module)
+            for alias in import_from_node.names:
+                imported_module_name = import_from_module_name + "." + alias.name
+                self.imports.add(imported_module_name)
+                self.import_lines.append((imported_module_name, import_from_node.lineno))
+#        else:
+#            print(ast.dump(import_from_node))
+        # delegate to the default visitor
+        super(NodeExtractor, self).generic_visit(import_from_node)
+
+
+"""
+    Fast import extraction.
+    Scans the source text with regular expressions instead of building the
+    full AST. Only comments, string literals and the import statements
+    themselves are recognized. Gives the same imports as NodeExtractor,
+    several times faster and with far less memory.
+    Sources the scanner cannot handle with certainty are handed to the AST instead.
+    Note: the scanner does not check the syntax of the rest of the file.
+"""
+
+# Comments, string literals and import keywords. Any other quote is a string the scanner does not understand.
+SOURCE_TOKEN = re.compile(r"""
+    (?P<comment>\#[^\r\n]*)
+  | (?P<prefix>[rRbBuUfF]{0,2})(?P<string>'''(?:[^\\]|\\.)*?'''|\"\"\"(?:[^\\]|\\.)*?\"\"\"|'(?:[^\\'\r\n]|\\.)*'|"(?:[^\\"\r\n]|\\.)*")
+  | \b(?P<keyword>import|from)\b
+  | (?P<stray>['"])
+""", re.VERBOSE | re.DOTALL)
+
+LINE_SPACE = r"(?:[ \t\f]|\\(?:\r\n|\r|\n))*"  # white space, including explicit line joins
+BRACKET_SPACE = r"(?:[ \t\f\r\n]|\\(?:\r\n|\r|\n)|\#[^\r\n]*)*"  # inside () also new lines and comments
+NAME = r"[^\W\d]\w*"
+DOTTED_NAME = NAME + r"(?:" + LINE_SPACE + r"\." + LINE_SPACE + NAME + r")*"
+BRACKETED_NAME = NAME + r"(?:" + BRACKET_SPACE + r"as\b" + BRACKET_SPACE + NAME + r")?"
+
+IMPORT_ALIAS = re.compile(LINE_SPACE + r"(?P<name>" + DOTTED_NAME + r")(?:" + LINE_SPACE + r"as\b" + LINE_SPACE + NAME + r")?")
+FROM_MODULE = re.compile(LINE_SPACE + r"(?P<dots>(?:\." + LINE_SPACE + r")*)(?P<module>(?!import\b)" + DOTTED_NAME + r")?" + LINE_SPACE + r"import\b")
+FROM_STAR = re.compile(LINE_SPACE + r"\*")
+FROM_ALIAS = re.compile(LINE_SPACE + r"(?P<name>" + NAME + r")(?:" + LINE_SPACE + r"as\b" + LINE_SPACE + NAME + r")?")
+FROM_ALIAS_LIST = re.compile(LINE_SPACE + r"\((?P<aliases>" + BRACKET_SPACE + BRACKETED_NAME +
+                             r"(?:" + BRACKET_SPACE + r"," + BRACKET_SPACE + BRACKETED_NAME + r")*" + BRACKET_SPACE + r",?" + BRACKET_SPACE + r")\)")
+BRACKETED_ALIAS = re.compile(BRACKET_SPACE + r"(?P<name>" + NAME + r")(?:" + BRACKET_SPACE + r"as\b" + BRACKET_SPACE + NAME + r")?" + BRACKET_SPACE + r",?")
+COMMA = re.compile(LINE_SPACE + r",")
+STATEMENT_END = re.compile(LINE_SPACE + r"(?=[;\r\n#]|\Z)")
+CODING_DECLARATION = re.compile(rb"[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)")
+
+def get_imports_from_source(source):
+    '''
+    Get a list of imported modules from the contents of a python file,
+    without building the full AST. See SOURCE_TOKEN.
+
+    Parameters
+    ----------
+    source : bytes or string
+        Contents of the python file.
+
+    Returns
+    -------
+    set of string
+        Full module names for imported modules. The same as get_imports
+        for the AST of the file.
+    '''
+    text = decode_source(source)
+    imports = scan_imports(text) if text is not None else None
+    if imports is None:
+        imports = get_imports(get_ast_for_source(source))
+    return imports
+
+
+def decode_source(source):
+    '''
+    Helper function for get_imports_from_source.
+    Decode the contents of a python file.
+
+    Returns
+    -------
+    string
+        The decoded source. None if the source is not UTF-8 or contains null bytes.
+    '''
+    if isinstance(source, bytes):
+        for line in source.split(b"\n", 2)[:2]:
+            declaration = CODING_DECLARATION.match(line)
+            if declaration:
+                encoding = declaration.group(1).decode("ascii").lower().replace("_", "-")
+                if encoding not in ("utf-8", "utf8") and not encoding.startswith("utf-8-"):
+                    return None
+                break
+        try:
+            source = source.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return None
+    if "\0" in source:
+        return None
+    return source
+
+
+def scan_imports(text):
+    '''
+    Helper function for get_imports_from_source.
+    Scan the source text for import statements.
+
+    Returns
+    -------
+    set of string
+        Full module names for imported modules. None if the scanner cannot handle the source.
+    '''
+    imports = set()
+    comment_ends = set()
+    pos = 0
+    while True:
+        token = SOURCE_TOKEN.search(text, pos)
+        if not token:
+            return imports
+        pos = token.end()
+        if token.group("comment") is not None:
+            comment_ends.add(pos)
+        elif token.group("string") is not None:
+            if "f" in token.group("prefix").lower():
+                # Nested quotes in f-strings (python 3.12) cut the string inside a replacement field.
+                body = token.group("string").replace("{{", "").replace("}}", "")
+                if body.count("{") != body.count("}"):
+                    return None
+        elif token.group("keyword") is not None:
+            if not is_statement_start(text, token.start(), comment_ends):
+                if token.group("keyword") == "from":
+                    continue # "yield from" or "raise ... from"
+                return None
+            if token.group("keyword") == "import":
+                pos = scan_import(text, pos, imports)
+            else:
+                pos = scan_import_from(text, pos, imports)
+            if pos is None:
+                return None
+        else:
+            return None
+
+
+def is_statement_start(text, pos, comment_ends):
+    '''
+    Helper function for scan_imports.
+    Test if a position in the source text is the start of a statement.
+    '''
+    while True:
+        pos -= 1
+        while pos >= 0 and text[pos] in " \t\f":
+            pos -= 1
+        if pos < 0:
+            return True
+        if text[pos] not in "\r\n":
+            return text[pos] in ":;"
+        if text[pos] == "\n" and pos > 0 and text[pos - 1] == "\r":
+            pos -= 1
+        if pos == 0 or text[pos - 1] != "\\" or pos in comment_ends:
+            return True
+        pos -= 1 # explicit line join. Continue before the backslash
+
+
+def dotted_name(name):
+    '''
+    Helper function for scan_imports.
+    Normalize a name the way the python parser does.
+    '''
+    name = re.sub(r"[^\w.]", "", name)
+    if not name.isascii():
+        name = unicodedata.normalize("NFKC", name)
+    return name
+
+
+def scan_import(text, pos, imports):
+    '''
+    Helper function for scan_imports.
+    Scan "import a.b as c, d" after the import keyword.
+
+    Returns
+    -------
+    int
+        Position after the statement. None if the statement was not understood.
+    '''
+    while True:
+        alias = IMPORT_ALIAS.match(text, pos)
+        if not alias:
+            return None
+        imports.add(dotted_name(alias.group("name")))
+        pos = alias.end()
+        comma = COMMA.match(text, pos)
+        if not comma:
+            break
+        pos = comma.end()
+    end = STATEMENT_END.match(text, pos)
+    return end.end() if end else None
+
+
+def scan_import_from(text, pos, imports):
+    '''
+    Helper function for scan_imports.
+    Scan "from a.b import c as d, e", "from a import (b, c)" and "from a import *"
+    after the from keyword.
+    Relative imports are ignored like in NodeExtractor.
+
+    Returns
+    -------
+    int
+        Position after the statement. None if the statement was not understood.
+    '''
+    module = FROM_MODULE.match(text, pos)
+    if not module or (not module.group("dots") and not module.group("module")):
+        return None
+    pos = module.end()
+    star = FROM_STAR.match(text, pos)
+    alias_list = FROM_ALIAS_LIST.match(text, pos)
+    if star:
+        names = ["*"]
+        pos = star.end()
+    elif alias_list:
+        names = [alias.group("name") for alias in BRACKETED_ALIAS.finditer(alias_list.group("aliases"))]
+        pos = alias_list.end()
+    else:
+        names = []
+        while True:
+            alias = FROM_ALIAS.match(text, pos)
+            if not alias:
+                return None
+            names.append(alias.group("name"))
+            pos = alias.end()
+            comma = COMMA.match(text, pos)
+            if not comma:
+                break
+            pos = comma.end()
+    end = STATEMENT_END.match(text, pos)
+    if not end:
+        return None
+    if not module.group("dots"):
+        module_name = dotted_name(module.group("module"))
+        for name in names:
+            imports.add(module_name + "." + (name if name == "*" else dotted_name(name)))
+    return end.end()
+
+
+
+def compare_import_extractors(full_paths):
+    '''
+    Differential test of get_imports_from_source against NodeExtractor
+    on a corpus of python files. Files the AST cannot parse are skipped.
+
+    Parameters
+    ----------
+    full_paths : iterable of paths
+        The python files to compare on.
+
+    Returns
+    -------
+    list of (string, set of string, set of string)
+        File path, imports found by NodeExtractor and imports found by the fast
+        extraction, for every file where they differ.
+    '''
+    mismatches = []
+    for full_path in full_paths:
+        with open(full_path, "rb") as file:
+            source = file.read()
+        try:
+            expected = get_imports(get_ast_for_source(source))
+        except (SyntaxError, ValueError, RecursionError):
+            continue
+        imports = get_imports_from_source(source)
+        if imports != expected:
+            mismatches.append((str(full_path), expected, imports))
+    return mismatches
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    assert get_imports_from_source(b"import a.b as c, d\nfrom e.f import (g, # g\n  h as i,)\n") == {"a.b", "d", "e.f.g", "e.f.h"}
+    assert get_imports_from_source(b"if x:\n    from . import y\nelse: import z; from w import *\n") == {"z", "w.*"}
+    assert get_imports_from_source(b"s = 'import a'\ndef f():\n    yield from g # import b\n") == set()
+    assert get_imports_from_source(b"from a import \\\n    b\n") == {"a.b"}
+    assert get_import_lines(get_ast_for_source(b"import a\n\nfrom b import (c,\n    d)\nimport a\n")) == [("a", 1), ("b.c", 3), ("b.d", 3), ("a", 5)]
+
+
+'''
+    The remainder of this file is not used for the report.
+    It contains experiments that where ultimately not used.
+'''
+'''
+# class RestApiExtractor(ast.NodeVisitor):
+#     def __init__(self):
+#         self.rest_api_routes = []
+#     def visit_Call(self, call_node):
+#         # Check if this has an attribute with a value of "api" and a keywords list including "GET" or "POST"
+# #        print(ast.dump(call_node))
+#         func = call_node.func
+#         if type(func) is ast.Attribute:
+#             value = func.value
+#             if type(value) is ast.Name:
+#                 value_id = value.id
+#                 if(value_id == "api"):
+#                     for keyword in call_node.keywords:
+#                         value_list = keyword.value
+#                         for element in value_list.elts:
+#                             element_value = element.value
+#                             if(element_value == "GET" or element_value == "POST"):
+#                                 self.register_rest_api(call_node, element_value)
+                            
+# #            else:
+# #                print("Value is not Name")
+# #        else:
+# #            print("Func is not Attribute")
+#         super(RestApiExtractor, self).generic_visit(call_node)
+#     def register_rest_api(self, call_node, api_type):
+#         api_ref = ""
+#         for arg in call_node.args:
+#             if type(arg) == ast.Constant:
+#                 api_ref = arg.value
+# #        print(api_ref)
+#         self.rest_api_routes.append([api_type, api_ref])
+
+        
+#     def visit_FunctionDef(self, function_def_node):
+#         for decorator_node in function_def_node.decorator_list:
+#             visitor = RestApiExtractor()
+#             visitor.visit(decorator_node)
+#             for api_route in visitor.rest_api_routes:
+#                 self.rest_api_routes.append([api_route[0] , api_route[1], function_def_node.name])
+
+# def get_rest_api(module_node):
+#     extractor = NodeExtractor()
+#     extractor.visit(module_node)
+#     return extractor.rest_api_routes
 '''
\ No newline at end of file
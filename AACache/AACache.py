@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Persistent on-disk cache of the scan results (imports, LOC and SLOC) for the
+    python files of the target system, so that warm runs only parse the
+    files that have changed.
+
+    A file is considered unchanged if its size and modification time are
+    the same as when it was cached. If they differ, the file is read and
+    hashed, and only parsed if the content hash differs too.
+    Contents that are read without a file, e.g., blobs from a git repository
+    (see AAGitSource), are looked up directly by their content hash.
+
+    The cache file looks like this:
+        {
+            "format": CACHE_FORMAT_VERSION,
+            "extractor": extractor_fingerprint(fast_imports),
+            "files": {full_path: [size, mtime_ns, content_hash], ...},
+            "contents": {content_hash: {"imports": [...], "LOC": n, "SLOC": n, "error": None}, ...}
+        }
+"""
+
+import os
+import json
+import hashlib
+from AAAST import AAAST
+
+# Bump when the layout of the cache file changes.
+CACHE_FORMAT_VERSION = 2
+
+# Cached results are discarded when the source of any of these changes.
+# The whole AAAST module is included, since NodeExtractor and the fast extraction share it.
+FINGERPRINTED_CODE = [AAAST]
+
+def extractor_fingerprint(fast_imports=False):
+    '''
+    Identify the version of the import extraction code.
+
+    Parameters
+    ----------
+    fast_imports : bool, optional
+        True if the imports are extracted with AAAST.get_imports_from_source. The default is False.
+
+    Returns
+    -------
+    string
+        Hash of the source of FINGERPRINTED_CODE and the extraction mode.
+    '''
+    import inspect # slow to import, and only needed when a cache is used
+    hasher = hashlib.sha1(b"fast" if fast_imports else b"ast")
+    for code in FINGERPRINTED_CODE:
+        try:
+            source = inspect.getsource(code)
+        except (OSError, TypeError): # source not available. Only the format version protects the cache.
+            source = code.__name__
+        hasher.update(source.replace("\r\n", "\n").encode("utf-8"))
+    return hasher.hexdigest()
+
+
+'''
+    Class for loading, updating and saving the cache file
+'''
+class ParseCache:
+    def __init__(self, cache_path, fast_imports=False):
+        self.cache_path = str(cache_path)
+        self.fast_imports = fast_imports
+        self.files = {}
+        self.contents = {}
+        self.stats = {}  # size and mtime of the files looked up in this run
+        self.used_hashes = set() # contents looked up or stored in this run
+        self.load()
+
+    def load(self):
+        '''
+        Read the cache file. A missing, corrupt or outdated cache file gives an empty cache.
+        '''
+        self.files = {}
+        self.contents = {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print("ParseCache: ignoring unreadable cache file " + self.cache_path + ": " + str(e))
+            return
+        if data.get("format") != CACHE_FORMAT_VERSION or data.get("extractor") != extractor_fingerprint(self.fast_imports):
+            return
+        self.files = data.get("files", {})
+        self.contents = data.get("contents", {})
+
+    def lookup(self, full_path):
+        '''
+        Get the cached scan result for a file if the file has not changed.
+
+        Parameters
+        ----------
+        full_path : string
+            Full file system path of the py file.
+
+        Returns
+        -------
+        dict
+            Scan result like AAIngest.scan_file. None if the file must be scanned.
+        '''
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        self.stats[full_path] = (stat.st_size, stat.st_mtime_ns)
+        entry = self.files.get(full_path)
+        if entry and tuple(entry[:2]) == self.stats[full_path] and entry[2] in self.contents:
+            return self.cached_result(full_path, entry[2])
+        return None
+
+    def lookup_contents(self, full_path, content_hash):
+        '''
+        Get the cached scan result for contents with a known hash, e.g., a git blob.
+
+        Parameters
+        ----------
+        full_path : string
+            Name of the contents in the result.
+        content_hash : string
+            See AAIngest.content_hash.
+
+        Returns
+        -------
+        dict
+            Scan result like AAIngest.scan_file. None if the contents must be scanned.
+        '''
+        if content_hash in self.contents:
+            self.used_hashes.add(content_hash)
+            return self.cached_result(full_path, content_hash)
+        return None
+
+    def known_hash(self, full_path):
+        '''
+        Get the content hash that a file had when it was cached, or None.
+        '''
+        entry = self.files.get(full_path)
+        if entry and entry[2] in self.contents:
+            return entry[2]
+        return None
+
+    def store(self, scan):
+        '''
+        Add a scan result from AAIngest.scan_file to the cache.
+
+        Parameters
+        ----------
+        scan : dict
+            Scan result. If it is marked "unchanged", the cached contents are reused.
+            See known_hash.
+
+        Returns
+        -------
+        dict
+            The complete scan result.
+        '''
+        full_path = scan["full_path"]
+        content_hash = scan["content_hash"]
+        if content_hash is None: # could not be read. Try again next time.
+            return scan
+        if not scan["unchanged"]:
+            self.contents[content_hash] = {"imports": list(scan["imports"] or []), "LOC": scan["LOC"], "SLOC": scan["SLOC"], "error": scan["error"]}
+        self.used_hashes.add(content_hash)
+        stat = self.stats.get(full_path)
+        if stat:
+            self.files[full_path] = [stat[0], stat[1], content_hash]
+        return self.cached_result(full_path, content_hash)
+
+    def cached_result(self, full_path, content_hash):
+        contents = self.contents[content_hash]
+        imports = None if contents["error"] else tuple(contents["imports"])
+        return {"full_path": full_path, "content_hash": content_hash, "unchanged": False,
+                "imports": imports, "LOC": contents["LOC"], "SLOC": contents["SLOC"], "error": contents["error"]}
+
+    def prune(self):
+        '''
+        Remove the entries for files that were not looked up in this run
+        (e.g., deleted files), and contents that neither a file refers to nor
+        were used in this run.
+        A run that only read git blobs keeps all the file entries.
+        '''
+        if self.stats:
+            self.files = {full_path: entry for full_path, entry in self.files.items() if full_path in self.stats}
+        used_hashes = self.used_hashes.union(entry[2] for entry in self.files.values())
+        self.contents = {content_hash: contents for content_hash, contents in self.contents.items() if content_hash in used_hashes}
+
+    def save(self):
+        '''
+        Prune the cache and write it to the cache file.
+        The file is replaced atomically, so an interrupted run does not corrupt it.
+        '''
+        self.prune()
+        data = {"format": CACHE_FORMAT_VERSION,
+                "extractor": extractor_fingerprint(self.fast_imports),
+                "files": self.files,
+                "contents": self.contents}
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.cache_path)
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Import cycle analysis.
+    The strongly connected components of the module graph are found with an
+    iterative version of Tarjan's algorithm on the integer arrays of an
+    AAGraph.ModuleGraph, so deep import chains do not hit the recursion limit
+    and no names are hashed while the graph is walked.
+    Every component with more than one module is a cycle group: each of its
+    modules can reach all the others through imports. For each group a set
+    of imports is proposed that would break all its cycles. Finding the
+    smallest such set is NP-hard, so the greedy ordering of Eades, Lin and
+    Smyth is used, preferring to break the imports that stand for few module
+    imports. For groups of up to PRUNED_GROUP_SIZE modules the proposal is
+    then pruned until it is minimal: putting back any one of its imports
+    closes a cycle again.
+"""
+
+import heapq
+import itertools
+from array import array
+from AAGraph import AAGraph
+
+# Largest cycle group whose proposed imports to break are pruned to a minimal set.
+# The pruning walks the group once per proposed import.
+PRUNED_GROUP_SIZE = 1000
+
+def strongly_connected_components(graph):
+    '''
+    Find the strongly connected components of a graph with Tarjan's algorithm.
+
+    Parameters
+    ----------
+    graph : AAGraph.ModuleGraph
+
+    Returns
+    -------
+    list of list of int
+        The nodes of each component. A component comes before the components
+        that import it, i.e., in reverse topological order of the condensed graph.
+    '''
+    offsets = graph.offsets.tolist()
+    targets = graph.targets.tolist()
+    size = graph.size()
+    index = [-1] * size   # node -> visiting number. size when its component is done.
+    low = [0] * size      # node -> lowest visiting number reachable on the stack
+    next_edge = offsets[:-1] # node -> next edge to follow
+    stack = []
+    components = []
+    counter = 0
+    for root in range(size):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        work = [root] # nodes being visited
+        while work:
+            node = work[-1]
+            edge = next_edge[node]
+            end = offsets[node + 1]
+            while edge < end:
+                imported_node = targets[edge]
+                edge += 1
+                if index[imported_node] < 0:
+                    next_edge[node] = edge
+                    index[imported_node] = low[imported_node] = counter
+                    counter += 1
+                    stack.append(imported_node)
+                    work.append(imported_node)
+                    break
+                if index[imported_node] < low[node]: # never true for nodes in done components
+                    low[node] = index[imported_node]
+            else:
+                work.pop()
+                if low[node] == index[node]:
+                    position = len(stack) - 1
+                    while stack[position] != node:
+                        position -= 1
+                    component = stack[position:]
+                    del stack[position:]
+                    for member in component:
+                        index[member] = size
+                    components.append(component)
+                if work:
+                    importing_node = work[-1]
+                    if low[node] < low[importing_node]:
+                        low[importing_node] = low[node]
+    return components
+
+
+def cycle_groups(graph):
+    '''
+    Find the groups of modules that import each other in a cycle.
+
+    Parameters
+    ----------
+    graph : AAGraph.ModuleGraph
+
+    Returns
+    -------
+    list of list of int
+        The nodes of each strongly connected component with more than one node.
+    '''
+    return [component for component in strongly_connected_components(graph) if len(component) > 1]
+
+
+def group_edges(graph, group):
+    '''
+    Helper function for find_cycles and feedback_edges.
+    Get the edges between the nodes of a group.
+
+    Returns
+    -------
+    list of list of (int, int)
+        Position in group -> imported position in group and weight of each of its edges.
+    '''
+    positions = {node: position for position, node in enumerate(group)}.get
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    outgoing = []
+    for node in group:
+        start = offsets[node]
+        end = offsets[node + 1]
+        imported_weights = itertools.repeat(1) if weights is None else weights[start:end]
+        outgoing.append([(imported_position, weight) for imported_position, weight in zip(map(positions, targets[start:end]), imported_weights)
+                         if imported_position is not None])
+    return outgoing
+
+
+def greedy_order(outgoing):
+    '''
+    Helper function for feedback_edges.
+    Order the nodes of a group so that few edges point backwards
+    (Eades, Lin and Smyth). Sinks go to the end and sources to the front.
+    When there are neither, the node whose outgoing edges outweigh its
+    incoming edges the most goes to the front.
+
+    Parameters
+    ----------
+    outgoing : list of list of (int, int)
+        See group_edges.
+
+    Returns
+    -------
+    list of int
+        The nodes in order.
+    '''
+    size = len(outgoing)
+    incoming = [[] for _ in range(size)]
+    out_weight = [0] * size
+    in_weight = [0] * size
+    for source, edges in enumerate(outgoing):
+        for target, weight in edges:
+            incoming[target].append((source, weight))
+            in_weight[target] += weight
+            out_weight[source] += weight
+    out_degree = [len(edges) for edges in outgoing]
+    in_degree = [len(edges) for edges in incoming]
+    removed = bytearray(size)
+    sinks = [node for node in range(size) if out_degree[node] == 0]
+    sources = [node for node in range(size) if in_degree[node] == 0]
+    # The heap holds (in_weight - out_weight) * size + node, so the ties go to the lowest node.
+    # A node is pushed when its key goes down. When it went up, it is pushed again when popped.
+    candidates = [(in_weight[node] - out_weight[node]) * size + node for node in range(size)]
+    heapq.heapify(candidates)
+    front = []
+    back = []
+    remaining = size
+    while remaining:
+        if sinks:
+            node = sinks.pop()
+            if removed[node]:
+                continue
+            back.append(node)
+        elif sources:
+            node = sources.pop()
+            if removed[node]:
+                continue
+            front.append(node)
+        else:
+            key, node = divmod(heapq.heappop(candidates), size)
+            if removed[node]:
+                continue
+            current = in_weight[node] - out_weight[node]
+            if key != current:
+                if key < current:
+                    heapq.heappush(candidates, current * size + node)
+                continue
+            front.append(node)
+        removed[node] = 1
+        remaining -= 1
+        for target, weight in outgoing[node]:
+            if not removed[target]:
+                in_degree[target] -= 1
+                in_weight[target] -= weight
+                if in_degree[target] == 0:
+                    sources.append(target)
+                else:
+                    heapq.heappush(candidates, (in_weight[target] - out_weight[target]) * size + target)
+        for source, weight in incoming[node]:
+            if not removed[source]:
+                out_degree[source] -= 1
+                out_weight[source] -= weight
+                if out_degree[source] == 0:
+                    sinks.append(source)
+    back.reverse()
+    return front + back
+
+
+def reaches(outgoing, start, goal):
+    '''
+    Helper function for feedback_edges.
+    Test if there is a path from one node to another.
+    '''
+    seen = {start}
+    pending = [start]
+    while pending:
+        for target in outgoing[pending.pop()]:
+            if target == goal:
+                return True
+            if target not in seen:
+                seen.add(target)
+                pending.append(target)
+    return False
+
+
+def feedback_edges(graph, group, outgoing = None):
+    '''
+    Propose the edges to remove to break all cycles in a cycle group.
+
+    Parameters
+    ----------
+    graph : AAGraph.ModuleGraph
+    group : list of int
+        Nodes of a strongly connected component, see cycle_groups.
+    outgoing : list of list of (int, int), optional
+        The edges of the group, see group_edges. Found if not given.
+
+    Returns
+    -------
+    list of (int, int, int)
+        Importing node, imported node and weight of each edge to remove.
+        Sorted on the weight, lightest first.
+    '''
+    if outgoing is None:
+        outgoing = group_edges(graph, group)
+    order = greedy_order(outgoing)
+    rank = [0] * len(group)
+    for number, position in enumerate(order):
+        rank[position] = number
+    backward = [(source, target, weight) for source, edges in enumerate(outgoing) for target, weight in edges if rank[target] < rank[source]]
+    if len(group) <= PRUNED_GROUP_SIZE:
+        # Put back the heaviest edges first, as long as they do not close a cycle.
+        forward = [[target for target, _ in edges if rank[source] < rank[target]] for source, edges in enumerate(outgoing)]
+        kept = []
+        for source, target, weight in sorted(backward, key=lambda edge: -edge[2]):
+            if reaches(forward, target, source):
+                kept.append((source, target, weight))
+            else:
+                forward[source].append(target)
+        backward = kept
+    return sorted(((group[source], group[target], weight) for source, target, weight in backward), key=lambda edge: (edge[2], edge[0], edge[1]))
+
+
+def find_cycles(graph):
+    '''
+    Find the cycle groups of a graph and the edges that would break them.
+
+    Parameters
+    ----------
+    graph : AAGraph.ModuleGraph
+
+    Returns
+    -------
+    list of dict
+        One per cycle group, largest first:
+        "modules" : sorted full names of the modules in the group.
+        "imports" : number of edges between the modules of the group.
+        "break" : (importing module, imported module, weight) of the edges
+            to remove to break all cycles of the group, see feedback_edges.
+        "minimal" : True if the group has at most PRUNED_GROUP_SIZE modules, so
+            that putting back any one of the "break" edges closes a cycle again.
+            False if the proposal was not pruned and may break more than needed.
+    '''
+    cycles = []
+    names = graph.module_names()
+    for group in cycle_groups(graph):
+        outgoing = group_edges(graph, group)
+        cycles.append({"modules": sorted(names[node] for node in group),
+                       "imports": sum(map(len, outgoing)),
+                       "break": [(names[source], names[target], weight) for source, target, weight in feedback_edges(graph, group, outgoing)],
+                       "minimal": len(group) <= PRUNED_GROUP_SIZE})
+    cycles.sort(key=lambda cycle: (-len(cycle["modules"]), cycle["modules"]))
+    return cycles
+
+
+def import_cycles(roots, depth = None):
+    '''
+    Find the import cycles of the target system.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    depth : int, optional
+        Fold the modules to this level first, see AAGraph.ModuleGraph.fold_to_depth.
+        The folded graph is built straight from the trees, see AAGraph.folded_module_graph.
+        The default is None, which means the modules are not folded.
+
+    Returns
+    -------
+    list of dict
+        See find_cycles.
+    '''
+    if depth is None:
+        return find_cycles(AAGraph.module_graph(roots))
+    return find_cycles(AAGraph.folded_module_graph(roots, {}, AAGraph.depth_fold_target(depth)))
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    from AAModuleTree import AAModuleTree
+    from AASymbols import AASymbols
+    roots = AAModuleTree.ModuleRoots()
+    for full_name, imports in [("app", ["app.a"]), ("app.a", ["app.b.f", "os"]), ("app.b", ["app.c", "app.a"]), ("app.c", ["app.a", "app.d.g"]),
+                               ("app.d", ["app.e"]), ("app.e", ["app.d"]), ("lib", ["app"]), ("lib.x", ["lib.y"]), ("lib.y", ["lib.x", "app.e"])]:
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    graph = AAGraph.module_graph(roots)
+    assert graph.module_names() == [module_description.full_name for module_description in AAModuleTree.traverse_modules(roots)]
+    assert sorted((module_name, imported_module_name) for module_name, imported_module_name, _ in graph.edges()) == \
+        [("app", "app.a"), ("app.a", "app.b"), ("app.b", "app.a"), ("app.b", "app.c"), ("app.c", "app.a"), ("app.c", "app.d"),
+         ("app.d", "app.e"), ("app.e", "app.d"), ("lib", "app"), ("lib.x", "lib.y"), ("lib.y", "app.e"), ("lib.y", "lib.x")]
+
+    # components come before their importers
+    components = strongly_connected_components(graph)
+    assert sorted(sorted(graph.module_names(component)) for component in components) == \
+        [["app"], ["app.a", "app.b", "app.c"], ["app.d", "app.e"], ["lib"], ["lib.x", "lib.y"]]
+    component_of = {node: number for number, component in enumerate(components) for node in component}
+    sources = graph.edge_sources()
+    assert all(component_of[sources[edge]] >= component_of[graph.targets[edge]] for edge in range(len(graph.targets)))
+
+    cycles = find_cycles(graph)
+    assert [cycle["modules"] for cycle in cycles] == [["app.a", "app.b", "app.c"], ["app.d", "app.e"], ["lib.x", "lib.y"]]
+    assert [cycle["imports"] for cycle in cycles] == [4, 2, 2]
+    assert [len(cycle["break"]) for cycle in cycles] == [1, 1, 1]
+    assert cycles[0]["break"] == [("app.a", "app.b", 1)] # the only import on both cycles
+    assert all(cycle["minimal"] for cycle in cycles)
+
+    # folded to the top level, only lib imports app. Folded to the second level, the groups stay.
+    assert sorted(graph.fold_to_depth(1).edges()) == [("lib", "app", 2)]
+    assert import_cycles(roots, 1) == []
+    assert [cycle["modules"] for cycle in import_cycles(roots, 2)] == [["app.a", "app.b", "app.c"], ["app.d", "app.e"], ["lib.x", "lib.y"]]
+
+    # removing the proposed edges breaks all cycles, and putting back any one of them closes a cycle
+    def graph_without(edges, removed):
+        offsets = array("i", [0])
+        targets = array("i")
+        for node in range(size):
+            targets.extend(sorted(target for source, target in edges if source == node and (source, target) not in removed))
+            offsets.append(len(targets))
+        return AAGraph.ModuleGraph(module_ids, offsets, targets)
+
+    size = 12
+    module_ids = array("i", [AASymbols.SYMBOLS.id("ring.m" + str(node)) for node in range(size)])
+    edges = set((node, (node * 5 + 3) % size) for node in range(size)) | set((node, (node + 1) % size) for node in range(size))
+    ring = graph_without(edges, set())
+    groups = cycle_groups(ring)
+    assert len(groups) == 1 and sorted(groups[0]) == list(range(size))
+    removed = set((source, target) for source, target, _ in feedback_edges(ring, groups[0]))
+    assert removed and removed <= edges
+    assert cycle_groups(graph_without(edges, removed)) == []
+    for edge in removed:
+        assert cycle_groups(graph_without(edges, removed - {edge})) != []
+
+    # a group too large to prune is reported as not minimal
+    size = PRUNED_GROUP_SIZE + 1
+    module_ids = array("i", [AASymbols.SYMBOLS.id("ring.big" + str(node)) for node in range(size)])
+    cycles = find_cycles(AAGraph.ModuleGraph(module_ids, array("i", range(size + 1)), array("i", [(node + 1) % size for node in range(size)])))
+    assert len(cycles) == 1 and len(cycles[0]["modules"]) == size and not cycles[0]["minimal"]
+    assert len(cycles[0]["break"]) == 1
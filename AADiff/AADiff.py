@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Architecture diff between two analyses of the target system, e.g., two
+    git revisions, or two models saved with save_model.
+    An ArchitectureModel holds the modules as a sorted array of name IDs and
+    the imports as a sorted array of integer edge keys, importing module ID
+    times 2**32 plus imported module ID. Both analyses use the shared
+    AASymbols.SYMBOLS, so equal keys are equal imports, and the diff is one
+    merge walk over the sorted arrays, linear in the number of modules and
+    imports. The strings are only looked up for what changed.
+    Models can be folded to any level before they are compared, see
+    AAGraph.ModuleGraph.fold_to_depth. For that, a model also keeps the
+    collections the imports of a module stop in when they are not the
+    imported modules, e.g., for an import of a namespace package.
+"""
+
+import json
+from array import array
+from AAGraph import AAGraph
+from AASymbols import AASymbols
+
+# Version of the files written by save_model.
+MODEL_FORMAT = 1
+
+# Edge key of an import: importing module ID * EDGE_KEY_BASE + imported module ID.
+EDGE_KEY_BASE = 1 << 32
+
+'''
+    Class holding the modules and imports of an analysis as sorted integer arrays
+'''
+class ArchitectureModel:
+    def __init__(self, module_ids, external, edges, weights, stops = None):
+        self.module_ids = module_ids # sorted name IDs of the modules
+        self.external = external     # module -> 1 for external modules, else 0
+        self.edges = edges           # sorted edge keys of the imports, see EDGE_KEY_BASE
+        self.weights = weights       # edge -> number of module imports it stands for
+        self.stops = array("q") if stops is None else stops # sorted keys of module ID and stop ID, see AAGraph.ModuleGraph.stops
+
+    def graph(self):
+        '''
+        Convert the model to a ModuleGraph, target system modules first.
+
+        Returns
+        -------
+        AAGraph.ModuleGraph
+        '''
+        module_ids = array("i", [module_id for module_id, external in zip(self.module_ids, self.external) if not external])
+        system_count = len(module_ids)
+        module_ids.extend(module_id for module_id, external in zip(self.module_ids, self.external) if external)
+        positions = {module_id: node for node, module_id in enumerate(module_ids)}
+        node_targets = [[] for _ in module_ids]
+        node_weights = [[] for _ in module_ids]
+        for key, weight in zip(self.edges, self.weights):
+            node = positions[key // EDGE_KEY_BASE]
+            node_targets[node].append(positions[key % EDGE_KEY_BASE])
+            node_weights[node].append(weight)
+        offsets = array("i", [0])
+        targets = array("i")
+        weights = array("i")
+        for imported_nodes, imported_weights in zip(node_targets, node_weights):
+            targets.extend(imported_nodes)
+            weights.extend(imported_weights)
+            offsets.append(len(targets))
+        stops = {}
+        for key in self.stops:
+            stops.setdefault(positions[key // EDGE_KEY_BASE], []).append(key % EDGE_KEY_BASE)
+        return AAGraph.ModuleGraph(module_ids, offsets, targets, weights, system_count, stops)
+
+    def fold_to_depth(self, depth):
+        '''
+        Fold the model, see AAGraph.ModuleGraph.fold_to_depth.
+
+        Returns
+        -------
+        ArchitectureModel
+        '''
+        return model_from_graph(self.graph().fold_to_depth(depth))
+
+
+def model_from_graph(graph):
+    '''
+    Build an ArchitectureModel from a ModuleGraph.
+
+    Parameters
+    ----------
+    graph : AAGraph.ModuleGraph
+
+    Returns
+    -------
+    ArchitectureModel
+    '''
+    module_ids = graph.module_ids
+    order = sorted(range(graph.size()), key=module_ids.__getitem__)
+    offsets = graph.offsets
+    targets = graph.targets
+    keyed = []
+    for node in range(graph.size()):
+        base = module_ids[node] * EDGE_KEY_BASE
+        keyed.extend((base + module_ids[targets[edge]], graph.weight(edge)) for edge in range(offsets[node], offsets[node + 1]))
+    keyed.sort()
+    stops = sorted(module_ids[node] * EDGE_KEY_BASE + stop_id for node, stop_ids in graph.stops.items() for stop_id in stop_ids)
+    return ArchitectureModel(array("i", [module_ids[node] for node in order]),
+                             array("b", [node >= graph.system_count for node in order]),
+                             array("q", [key for key, _ in keyed]),
+                             array("i", [weight for _, weight in keyed]),
+                             array("q", stops))
+
+
+def model_from_trees(roots, external_module_roots = {}):
+    '''
+    Build an ArchitectureModel of the modules and imports found in the
+    input collection of trees. The imports are resolved like AAGraph.module_graph does.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees, optional
+        Description of the external packages. The default is {}.
+
+    Returns
+    -------
+    ArchitectureModel
+    '''
+    return model_from_graph(AAGraph.module_graph(roots, external_module_roots))
+
+
+def save_model(model, path):
+    '''
+    Write a model to a json file. The names are written instead of the IDs,
+    since the IDs are only valid in the process that made them.
+
+    Parameters
+    ----------
+    model : ArchitectureModel
+    path : string
+
+    Returns
+    -------
+    None.
+    '''
+    positions = {module_id: position for position, module_id in enumerate(model.module_ids)}
+    edges = []
+    for key, weight in zip(model.edges, model.weights):
+        edges.extend([positions[key // EDGE_KEY_BASE], positions[key % EDGE_KEY_BASE], weight])
+    names = AASymbols.SYMBOLS.names
+    stops = []
+    for key in model.stops:
+        stops.extend([positions[key // EDGE_KEY_BASE], names[key % EDGE_KEY_BASE]])
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"format": MODEL_FORMAT,
+                   "modules": AASymbols.SYMBOLS.name_list(model.module_ids),
+                   "external": [position for position, external in enumerate(model.external) if external],
+                   "edges": edges,
+                   "stops": stops}, file)
+
+
+def load_model(path):
+    '''
+    Read a model written by save_model. Its names get IDs in AASymbols.SYMBOLS,
+    so it can be compared with any other model of this process.
+
+    Parameters
+    ----------
+    path : string
+
+    Returns
+    -------
+    ArchitectureModel
+
+    Raises
+    ------
+    ValueError if the file is not a model file of this version.
+    OSError if the file cannot be read.
+    '''
+    with open(path, encoding="utf-8") as file:
+        try:
+            data = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError("AADiff: " + path + " is not a model file: " + str(e)) from e
+    if not isinstance(data, dict) or data.get("format") != MODEL_FORMAT:
+        raise ValueError("AADiff: " + path + " is not a model file of format " + str(MODEL_FORMAT))
+    symbols = AASymbols.SYMBOLS
+    module_ids = [symbols.id(full_module_name) for full_module_name in data["modules"]]
+    external = set(data["external"])
+    edges = data["edges"]
+    keyed = sorted((module_ids[edges[edge]] * EDGE_KEY_BASE + module_ids[edges[edge + 1]], edges[edge + 2]) for edge in range(0, len(edges), 3))
+    stops = data.get("stops", [])
+    stops = sorted(module_ids[stops[stop]] * EDGE_KEY_BASE + symbols.id(stops[stop + 1]) for stop in range(0, len(stops), 2))
+    order = sorted(range(len(module_ids)), key=module_ids.__getitem__)
+    return ArchitectureModel(array("i", [module_ids[position] for position in order]),
+                             array("b", [position in external for position in order]),
+                             array("q", [key for key, _ in keyed]),
+                             array("i", [weight for _, weight in keyed]),
+                             array("q", stops))
+
+
+def sorted_difference(old, new):
+    '''
+    Compare two sorted arrays in one merge walk.
+
+    Parameters
+    ----------
+    old, new : sorted sequences of int without duplicates
+
+    Returns
+    -------
+    list of int, list of int
+        Positions in old of the values not in new, and positions in new
+        of the values not in old.
+    '''
+    removed = []
+    added = []
+    old_position = 0
+    new_position = 0
+    old_size = len(old)
+    new_size = len(new)
+    while old_position < old_size and new_position < new_size:
+        old_value = old[old_position]
+        new_value = new[new_position]
+        if old_value == new_value:
+            old_position += 1
+            new_position += 1
+        elif old_value < new_value:
+            removed.append(old_position)
+            old_position += 1
+        else:
+            added.append(new_position)
+            new_position += 1
+    removed.extend(range(old_position, old_size))
+    added.extend(range(new_position, new_size))
+    return removed, added
+
+
+def diff_models(old, new, package_depth = 1):
+    '''
+    Find the modules and imports that appeared or disappeared between two models.
+
+    Parameters
+    ----------
+    old, new : ArchitectureModel
+        Fold them first to compare at a level, see ArchitectureModel.fold_to_depth.
+    package_depth : int, optional
+        Level of the packages the changes are summarized for. The default is 1.
+
+    Returns
+    -------
+    dict
+        "added_modules", "removed_modules" : sorted full module names.
+        "added_imports", "removed_imports" : (importing module, imported
+            module, number of module imports) of the imports, sorted.
+        "packages" : {package full name: {"added_modules", "removed_modules",
+            "added_imports", "removed_imports": count}}. The imports count for
+            the package of the importing module. Only packages with changes.
+    '''
+    names = AASymbols.SYMBOLS.names
+    index = AASymbols.MODULE_INDEX
+    packages = {}
+    def count(module_id, change):
+        package = names[index.ancestor(module_id, package_depth)]
+        summary = packages.get(package)
+        if summary is None:
+            summary = packages[package] = {"added_modules": 0, "removed_modules": 0, "added_imports": 0, "removed_imports": 0}
+        summary[change] += 1
+
+    result = {}
+    removed, added = sorted_difference(old.module_ids, new.module_ids)
+    for change, model, positions in [("removed_modules", old, removed), ("added_modules", new, added)]:
+        result[change] = [names[model.module_ids[position]] for position in positions]
+        for position in positions:
+            count(model.module_ids[position], change)
+    removed, added = sorted_difference(old.edges, new.edges)
+    for change, model, positions in [("removed_imports", old, removed), ("added_imports", new, added)]:
+        imports = []
+        for position in positions:
+            module_id, imported_module_id = divmod(model.edges[position], EDGE_KEY_BASE)
+            imports.append((names[module_id], names[imported_module_id], model.weights[position]))
+            count(module_id, change)
+        result[change] = sorted(imports)
+    result["added_modules"].sort()
+    result["removed_modules"].sort()
+    result["packages"] = dict(sorted(packages.items()))
+    return result
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    import os
+    import tempfile
+    from AAModuleTree import AAModuleTree
+
+    def model(modules, external = True):
+        roots = AAModuleTree.ModuleRoots()
+        for full_name, imports in modules:
+            module_description = AAModuleTree.ModuleDescription()
+            module_description.full_name = full_name
+            module_description.imports = imports
+            AAModuleTree.add_module_description_to_roots(module_description, roots)
+        external_module_roots = AAModuleTree.ModuleRoots()
+        if external:
+            AAModuleTree.build_external_module_tree(roots, external_module_roots)
+        return model_from_trees(roots, external_module_roots)
+
+    old = model([("app", ["app.a"]), ("app.a", ["app.b.f", "os"]), ("app.b", ["flask"]), ("lib", ["app.a"]), ("lib.x", [])])
+    new = model([("app", ["app.a"]), ("app.a", ["app.c", "os"]), ("app.b", ["flask", "requests"]), ("app.c", []), ("lib", ["app.a", "app.c"])])
+    assert list(old.edges) == sorted(old.edges) and list(old.module_ids) == sorted(old.module_ids)
+    diff = diff_models(old, new)
+    assert diff["added_modules"] == ["app.c", "requests"]
+    assert diff["removed_modules"] == ["lib.x"]
+    assert diff["added_imports"] == [("app.a", "app.c", 1), ("app.b", "requests", 1), ("lib", "app.c", 1)]
+    assert diff["removed_imports"] == [("app.a", "app.b", 1)]
+    assert diff["packages"] == {"app": {"added_modules": 1, "removed_modules": 0, "added_imports": 2, "removed_imports": 1},
+                                "lib": {"added_modules": 0, "removed_modules": 1, "added_imports": 1, "removed_imports": 0},
+                                "requests": {"added_modules": 1, "removed_modules": 0, "added_imports": 0, "removed_imports": 0}}
+    assert diff_models(new, new) == {"removed_modules": [], "added_modules": [], "removed_imports": [], "added_imports": [], "packages": {}}
+
+    # folded to the top level, only the new external package shows. lib -> app now stands for 2 imports, but is no change.
+    folded = diff_models(old.fold_to_depth(1), new.fold_to_depth(1))
+    assert folded["added_modules"] == ["requests"] and folded["removed_modules"] == []
+    assert folded["added_imports"] == [("app", "requests", 1)] and folded["removed_imports"] == []
+    top = new.fold_to_depth(1)
+    names = AASymbols.SYMBOLS.names
+    assert sorted((names[key // EDGE_KEY_BASE], names[key % EDGE_KEY_BASE], weight) for key, weight in zip(top.edges, top.weights)) == \
+        [("app", "flask", 1), ("app", "os", 1), ("app", "requests", 1), ("lib", "app", 2)]
+    assert sorted(names[module_id] for module_id, external in zip(top.module_ids, top.external) if external) == ["flask", "os", "requests"]
+
+    # a saved model compares equal to the original
+    handle, path = tempfile.mkstemp(suffix=".json")
+    os.close(handle)
+    try:
+        save_model(new, path)
+        loaded = load_model(path)
+    finally:
+        os.remove(path)
+    assert (loaded.module_ids, loaded.external, loaded.edges, loaded.weights) == (new.module_ids, new.external, new.edges, new.weights)
+
+    # without the external packages, the import of the namespace package app.ns only shows when folded into app, also when saved
+    namespace = model([("app", []), ("app.ns.m", []), ("lib", ["app.ns"])], False)
+    handle, path = tempfile.mkstemp(suffix=".json")
+    os.close(handle)
+    try:
+        save_model(namespace, path)
+        loaded = load_model(path)
+    finally:
+        os.remove(path)
+    for folded in [namespace.fold_to_depth(1), loaded.fold_to_depth(1)]:
+        assert list(namespace.edges) == [] and [(names[key // EDGE_KEY_BASE], names[key % EDGE_KEY_BASE]) for key in folded.edges] == [("lib", "app")]
@@ -1,157 +1,366 @@
-# -*- coding: utf-8 -*-
-"""
-@author: mlv
-
-Purpose:
-    Functions for processing files and folders.
-"""
-
-# This specifies the location of the target system to analyse
-# Warning: this must end in /
-CODE_ROOT_FOLDER="C:\\Users\\mlv\\.spyder-py3\\content\\Zeeguu-API\\"
-
-import os
-from git import Repo
-from pathlib import Path
-
-cwd = os.getcwd()
-# If the file exists, it means we've already downloaded
-if not os.path.exists(CODE_ROOT_FOLDER):
-  Repo.clone_from("https://github.com/zeeguu-ecosystem/Zeeguu-API", CODE_ROOT_FOLDER)
-
-
-def get_code_root_folder():
-    '''
-    Get the root folder for the target system.
-
-    Returns
-    -------
-    string
-        Full folder path.
-    '''
-    return CODE_ROOT_FOLDER
-
-
-def file_path(file_name):
-    '''
-    Get a file path w/o having to always provide the /content/Zeeguu-API/ prefix  
-
-    Parameters
-    ----------
-    file_name : string
-        File path relative to the target system root
-
-    Returns
-    -------
-    string
-        Full file path.
-    '''
-    return CODE_ROOT_FOLDER+file_name
-assert (file_path("zeeguu_core\\model\\user.py") == "C:\\Users\\mlv\\.spyder-py3\\content\\Zeeguu-API\\zeeguu_core\\model\\user.py")
-
-
-def module_name_from_file_path(full_path):
-    '''
-    Extracting a module name from a file name
-    # e.g. ../zeeguu/core/model/user.py -> zeeguu.core.model.user
-
-    Parameters
-    ----------
-    full_path : string
-        Full file path of the module.
-
-    Returns
-    -------
-    string
-        full module name of the module.
-    '''
-    file_name = full_path[len(CODE_ROOT_FOLDER):]
-    file_name = file_name.replace("\\__init__.py","")
-    file_name = file_name.replace("\\",".")
-    file_name = file_name.replace(".py","")
-    return file_name
-assert 'zeeguu_core.model.user' == module_name_from_file_path(file_path('zeeguu_core\\model\\user.py'))
-
-
-def all_file_paths(extension = ""):
-    '''
-    Get all file paths in a folder structure for files with a specified file extension.
-
-    Parameters
-    ----------
-    extension : string, optional
-        File extension for the desired file type. E.g. "py". The default is "".
-
-    Returns
-    -------
-    A collection of paths.
-    '''
-    return Path(CODE_ROOT_FOLDER).rglob("*" + extension)
-
-
-def LOC(file_path):
-    '''
-    Count the lines in a file.
-
-    Parameters
-    ----------
-    file_path : file path
-        File to measure.
-
-    Returns
-    -------
-    int
-        Number of lines in the file.
-    '''
-    return sum([1 for line in open(file_path)])
-
-
-def module_LOC(module_name):
-    '''
-    Abstraction by aggregating metrics to the module level
-    This is a bit of a hack which uses the rglob to iterate
-    over all the files and uses the file prefix to assume 
-
-    Parameters
-    ----------
-    module_name : string
-        full module name.
-
-    Returns
-    -------
-    int
-        Cummulative number of lines.
-    '''
-    size = 0
-    files = Path(CODE_ROOT_FOLDER).rglob("*.py")
-
-    for file in files:
-        file_path = str(file)
-        full_module_name = module_name_from_file_path(file_path)
-        if full_module_name.startswith(module_name + '.'):
-            size += LOC(file_path)
-
-    return size
-
-
-'''
-    The remainder of this file is not used for the report.
-    It contains experiments that where ultimately not used.
-'''
-'''
-# def count_file_types():
-#     file_type_count = dict()    
-#     for path in Path(CODE_ROOT_FOLDER).rglob("*.*"):
-#         filename, file_extension = os.path.splitext(path)
-#         if file_extension in file_type_count:
-#             file_type_count[file_extension] += 1
-#         else:
-#             file_type_count[file_extension] = 1
-#     return file_type_count
-
-# def dump_file_type_count():
-#     print("Number of files with different file extensions")
-#     file_type_count = sorted(count_file_types().items(), key=lambda x: x[1], reverse=True)
-#     for item in file_type_count:
-#         print(item[0] + ": " + str(item[1]))
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Functions for processing files and folders.
+"""
+
+# This specifies the location of the target system to analyse
+# Warning: this must end in a path separator. Use set_code_root_folder to change it.
+CODE_ROOT_FOLDER="C:\\Users\\mlv\\.spyder-py3\\content\\Zeeguu-API\\"
+
+# Where clone_target_system gets the target system from
+TARGET_SYSTEM_URL = "https://github.com/zeeguu-ecosystem/Zeeguu-API"
+
+import os
+import re
+import fnmatch
+from AAIngest import AAIngest
+
+# Folders that are never walked by all_file_paths. fnmatch patterns for the folder name.
+EXCLUDED_FOLDERS = [".git", ".hg", ".svn", "__pycache__", "node_modules",
+                    ".venv", "venv", ".tox", ".nox", ".eggs", "*.egg-info",
+                    "site-packages", "build", "dist",
+                    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".idea", ".vscode"]
+
+def set_code_root_folder(folder):
+    '''
+    Set the root folder for the target system.
+
+    Parameters
+    ----------
+    folder : string
+        Folder path. A path separator is added at the end if missing.
+
+    Returns
+    -------
+    None.
+    '''
+    global CODE_ROOT_FOLDER
+    CODE_ROOT_FOLDER = os.path.join(os.path.abspath(folder), "")
+
+
+def clone_target_system(repository_url=TARGET_SYSTEM_URL):
+    '''
+    Clone the target system into the root folder, unless it already exists.
+    Only this function needs GitPython.
+
+    Parameters
+    ----------
+    repository_url : string, optional
+        The default is TARGET_SYSTEM_URL.
+
+    Returns
+    -------
+    None.
+    '''
+    # If the folder exists, it means we've already downloaded
+    if not os.path.exists(CODE_ROOT_FOLDER):
+        from git import Repo
+        Repo.clone_from(repository_url, CODE_ROOT_FOLDER)
+
+
+def get_code_root_folder():
+    '''
+    Get the root folder for the target system.
+
+    Returns
+    -------
+    string
+        Full folder path.
+    '''
+    return CODE_ROOT_FOLDER
+
+
+def file_path(file_name):
+    '''
+    Get a file path w/o having to always provide the /content/Zeeguu-API/ prefix  
+
+    Parameters
+    ----------
+    file_name : string
+        File path relative to the target system root
+
+    Returns
+    -------
+    string
+        Full file path.
+    '''
+    return CODE_ROOT_FOLDER+file_name
+
+
+def module_name_from_file_path(full_path):
+    '''
+    Extracting a module name from a file name
+    # e.g. ../zeeguu/core/model/user.py -> zeeguu.core.model.user
+
+    Parameters
+    ----------
+    full_path : string
+        Full file path of the module.
+
+    Returns
+    -------
+    string
+        full module name of the module.
+    '''
+    file_name = full_path[len(CODE_ROOT_FOLDER):].replace("\\", "/") # both / and \\ separators
+    if file_name.endswith("/__init__.py"):
+        file_name = file_name[:-len("/__init__.py")]
+    elif file_name.endswith(".py"):
+        file_name = file_name[:-len(".py")]
+    return file_name.replace("/", ".")
+
+
+def all_file_paths(extension = "", excluded_folders = None, use_gitignore = True):
+    '''
+    Get all file paths in a folder structure for files with a specified file extension.
+    Excluded folders are pruned before they are entered, so e.g. .git and
+    virtualenvs are never walked. Folders reached through symbolic links are
+    only walked once, which also stops symlink loops.
+    The paths are produced while walking, so they can be processed before
+    the walk is complete.
+
+    Parameters
+    ----------
+    extension : string, optional
+        File extension for the desired file type. E.g. "py". The default is "".
+    excluded_folders : list of string, optional
+        fnmatch patterns for folder names to skip. The default is None,
+        which means EXCLUDED_FOLDERS.
+    use_gitignore : bool, optional
+        Also skip the files and folders ignored by the .gitignore files of the
+        target system. The default is True.
+
+    Yields
+    ------
+    string
+        Next full file path.
+    '''
+    if excluded_folders is None:
+        excluded_folders = EXCLUDED_FOLDERS
+    excluded_folder_regex = re.compile("|".join(fnmatch.translate(pattern) for pattern in excluded_folders) or "(?!)")
+    root_folder = CODE_ROOT_FOLDER.rstrip("\\/") or CODE_ROOT_FOLDER
+    root_rules = []
+    if use_gitignore:
+        root_rules = read_gitignore(os.path.join(root_folder, ".git", "info", "exclude"), "")
+    visited_folders = set()
+    # Each entry: folder path, folder path relative to the root with / separators, active ignore rules
+    folders = [(root_folder, "", root_rules)]
+    while folders:
+        folder, relative_folder, rules = folders.pop()
+        try:
+            stat = os.stat(folder)
+            if (stat.st_dev, stat.st_ino) in visited_folders:
+                continue # symlink loop, or a folder linked from several places
+            visited_folders.add((stat.st_dev, stat.st_ino))
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        if use_gitignore:
+            rules = rules + read_gitignore(os.path.join(folder, ".gitignore"), relative_folder)
+        sub_folders = []
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            relative_path = relative_folder + entry.name
+            try:
+                is_folder = entry.is_dir()
+            except OSError:
+                continue
+            if is_folder:
+                if excluded_folder_regex.match(entry.name) or is_ignored(rules, relative_path, True):
+                    continue
+                sub_folders.append((entry.path, relative_path + "/", rules))
+            elif entry.name.endswith(extension) and not is_ignored(rules, relative_path, False):
+                yield entry.path
+        folders.extend(reversed(sub_folders))
+
+
+def read_gitignore(gitignore_path, relative_folder):
+    '''
+    Helper function for all_file_paths.
+    Read the rules in a .gitignore file.
+
+    Parameters
+    ----------
+    gitignore_path : string
+        Full path of the .gitignore file. It is fine if it does not exist.
+    relative_folder : string
+        Path of the folder of the .gitignore file, relative to the root of the
+        target system, with / separators and ending in /. "" for the root.
+
+    Returns
+    -------
+    list of (string, bool, bool, compiled regex)
+        relative_folder, negated, folders only and pattern for each rule, in file order.
+    '''
+    rules = []
+    try:
+        with open(gitignore_path, "r", encoding="utf-8", errors="replace") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        if line.startswith("\\"):
+            line = line[1:]
+        folders_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line # a pattern with a / (except at the end) is relative to the .gitignore folder
+        line = line.lstrip("/")
+        if not line:
+            continue
+        pattern = gitignore_pattern_to_regex(line)
+        if not anchored:
+            pattern = "(?:.*/)?" + pattern
+        rules.append((relative_folder, negated, folders_only, re.compile(pattern + r"\Z", re.DOTALL)))
+    return rules
+
+
+def gitignore_pattern_to_regex(pattern):
+    '''
+    Helper function for read_gitignore.
+    Translate a .gitignore glob pattern to a regular expression.
+    * and ? do not match /, while ** matches across folders.
+    '''
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            char_class = pattern[i + 1:end].replace("\\", "\\\\")
+            if char_class.startswith("!"):
+                char_class = "^" + char_class[1:]
+            regex += "[" + char_class + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+def is_ignored(rules, relative_path, is_folder):
+    '''
+    Helper function for all_file_paths.
+    Test if a path is ignored by .gitignore rules. The last matching rule decides.
+
+    Parameters
+    ----------
+    rules : list of rules from read_gitignore
+    relative_path : string
+        Path relative to the root of the target system, with / separators.
+    is_folder : bool
+        True if the path is a folder.
+
+    Returns
+    -------
+    bool
+        True if the path is ignored.
+    '''
+    for relative_folder, negated, folders_only, pattern in reversed(rules):
+        if folders_only and not is_folder:
+            continue
+        if not relative_path.startswith(relative_folder):
+            continue
+        if pattern.match(relative_path, len(relative_folder)):
+            return not negated
+    return False
+
+
+def LOC(file_path):
+    '''
+    Count the lines in a file.
+
+    Parameters
+    ----------
+    file_path : file path
+        File to measure.
+
+    Returns
+    -------
+    int
+        Number of lines in the file.
+    '''
+    with open(file_path, "rb") as file:
+        return AAIngest.count_lines(file.read())
+
+
+def module_LOC(module_name):
+    '''
+    Abstraction by aggregating metrics to the module level
+    This is a bit of a hack which uses the rglob to iterate
+    over all the files and uses the file prefix to assume 
+
+    Parameters
+    ----------
+    module_name : string
+        full module name.
+
+    Returns
+    -------
+    int
+        Cummulative number of lines.
+    '''
+    size = 0
+    files = all_file_paths(".py")
+
+    for file_path in files:
+        full_module_name = module_name_from_file_path(file_path)
+        if full_module_name.startswith(module_name + '.'):
+            size += LOC(file_path)
+
+    return size
+
+
+
+def self_test():
+    '''
+    Run the tests of this file. Works for any CODE_ROOT_FOLDER.
+    '''
+    assert file_path("zeeguu_core\\model\\user.py") == CODE_ROOT_FOLDER + "zeeguu_core\\model\\user.py"
+    assert 'zeeguu_core.model.user' == module_name_from_file_path(file_path('zeeguu_core\\model\\user.py'))
+    assert 'zeeguu_core.model.user' == module_name_from_file_path(file_path('zeeguu_core/model/user.py'))
+    assert 'zeeguu_core.model' == module_name_from_file_path(file_path(os.path.join('zeeguu_core', 'model', '__init__.py')))
+
+
+'''
+    The remainder of this file is not used for the report.
+    It contains experiments that where ultimately not used.
+'''
+'''
+# def count_file_types():
+#     file_type_count = dict()    
+#     for path in Path(CODE_ROOT_FOLDER).rglob("*.*"):
+#         filename, file_extension = os.path.splitext(path)
+#         if file_extension in file_type_count:
+#             file_type_count[file_extension] += 1
+#         else:
+#             file_type_count[file_extension] = 1
+#     return file_type_count
+
+# def dump_file_type_count():
+#     print("Number of files with different file extensions")
+#     file_type_count = sorted(count_file_types().items(), key=lambda x: x[1], reverse=True)
+#     for item in file_type_count:
+#         print(item[0] + ": " + str(item[1]))
 '''
\ No newline at end of file
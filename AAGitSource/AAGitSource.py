@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Source backend reading the python files of the target system straight
+    from the object database of a local git repository, at any revision,
+    without a checkout.
+    The files are listed with git ls-tree, and their contents are streamed
+    through a single git cat-file --batch process.
+    The blob hash git gives a file is the same as AAIngest.content_hash of its
+    contents. So with an AACache.ParseCache, files that are unchanged between
+    revisions are only parsed once.
+"""
+
+import re
+import fnmatch
+from AAFileSystem import AAFileSystem
+from AAIngest import AAIngest
+
+def git_output(repository_path, *arguments):
+    '''
+    Run a git command in a repository.
+
+    Parameters
+    ----------
+    repository_path : string
+        Folder of the repository, or any folder inside its working tree.
+    *arguments : string
+        Git command and arguments. E.g., "rev-parse", "HEAD".
+
+    Returns
+    -------
+    bytes
+        The output of the command.
+
+    Raises
+    ------
+    subprocess.CalledProcessError if the command fails, e.g., for an unknown revision.
+    '''
+    import subprocess # only loaded when git is used
+    return subprocess.run(["git", "-C", str(repository_path)] + list(arguments),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+def list_blobs(repository_path, revision="HEAD", extension="", excluded_folders=None):
+    '''
+    Generator for the files in the tree of a revision.
+    Symbolic links and submodules are skipped.
+
+    Parameters
+    ----------
+    repository_path : string
+        Folder of the repository.
+    revision : string, optional
+        Any revision git understands. The default is "HEAD".
+    extension : string, optional
+        File extension for the desired file type. E.g. ".py". The default is "".
+    excluded_folders : list of string, optional
+        fnmatch patterns for folder names to skip, like for
+        AAFileSystem.all_file_paths. The default is None, which means
+        AAFileSystem.EXCLUDED_FOLDERS.
+
+    Yields
+    ------
+    (string, string)
+        Path relative to the repository root with / separators, and blob hash.
+    '''
+    if excluded_folders is None:
+        excluded_folders = AAFileSystem.EXCLUDED_FOLDERS
+    excluded_folder_regex = re.compile("|".join(fnmatch.translate(pattern) for pattern in excluded_folders) or "(?!)")
+    output = git_output(repository_path, "ls-tree", "-r", "-z", "--full-tree", revision)
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        mode, object_type, blob_hash = info.split()
+        if object_type != b"blob" or mode == b"120000": # submodule or symbolic link
+            continue
+        relative_path = path.decode("utf-8", "surrogateescape")
+        if not relative_path.endswith(extension):
+            continue
+        if any(excluded_folder_regex.match(folder) for folder in relative_path.split("/")[:-1]):
+            continue
+        yield relative_path, blob_hash.decode("ascii")
+
+
+'''
+    Class for reading blobs through a running git cat-file --batch process
+'''
+class BlobReader:
+    def __init__(self, repository_path):
+        import subprocess
+        self.process = subprocess.Popen(["git", "-C", str(repository_path), "cat-file", "--batch"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, blob_hash):
+        '''
+        Get the contents of a blob.
+
+        Parameters
+        ----------
+        blob_hash : string
+
+        Returns
+        -------
+        bytes
+            The contents. None if the object is not in the repository
+            (e.g., a partial clone).
+        '''
+        self.process.stdin.write(blob_hash.encode("ascii") + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split() # <hash> <type> <size>, or <hash> missing
+        if len(header) != 3:
+            return None
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1) # newline after the contents
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def scan_revision(repository_path, revision="HEAD", cache=None, fast_imports=False):
+    '''
+    Generator scanning the py-files of a revision of a git repository.
+    Blobs found in the cache are not read at all.
+
+    Parameters
+    ----------
+    repository_path : string
+        Folder of the repository.
+    revision : string, optional
+        Any revision git understands. The default is "HEAD".
+    cache : AACache.ParseCache, optional
+        Cache to look the blobs up in and store new scan results in.
+        The caller saves it. The default is None.
+    fast_imports : bool, optional
+        See AAIngest.scan_file. The default is False.
+
+    Yields
+    ------
+    dict
+        Scan result like AAIngest.scan_file, with "full_path" in git
+        notation (revision:relative path), and the additional key
+        "relative_path" (relative to the repository root, / separators).
+    '''
+    with BlobReader(repository_path) as reader:
+        for relative_path, blob_hash in list_blobs(repository_path, revision, ".py"):
+            full_path = revision + ":" + relative_path
+            scan = cache.lookup_contents(full_path, blob_hash) if cache else None
+            if scan is None:
+                data = reader.read(blob_hash)
+                if data is None:
+                    scan = {"full_path": full_path, "content_hash": None, "unchanged": False, "imports": None, "LOC": 0, "SLOC": 0,
+                            "error": "missing git object " + blob_hash}
+                else:
+                    scan = AAIngest.scan_blob(full_path, data, blob_hash, fast_imports)
+                    if cache:
+                        scan = cache.store(scan)
+            scan["relative_path"] = relative_path
+            yield scan
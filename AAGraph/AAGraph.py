@@ -1,194 +1,693 @@
-# -*- coding: utf-8 -*-
-"""
-@author: mlv
-
-Generates networkx graphs to be used by AAView to make graph plots for display.
-
-"""
-
-from AAModuleTree import AAModuleTree
-import networkx as nx
-
-def dependencies_digraph_from_roots(roots, external_module_roots = {}):
-    '''
-    Construct a networkx DiGraph based on the modules and imports found in
-    the input collection of trees.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Description of the target system modules
-    external_module_roots : collection of trees
-        Description of the external packages
-
-    Returns
-    -------
-    networkx.DiGraph.
-    Resulting directed graph.
-    '''
-    G = nx.DiGraph()
-    for module_description in AAModuleTree.traverse_modules(roots):
-        module_name = module_description.full_name
-        if module_name in G.nodes():
-            print("!!!!!!!!!!!!!!! dependencies_digraph_from_roots: Duplicate module name: " + module_name)
-        G.add_node(module_name)
-    for module_description in AAModuleTree.traverse_modules(external_module_roots):
-        module_name = module_description.full_name
-        if module_name in G.nodes():
-            print("!!!!!!!!!!!!!!! dependencies_digraph_from_roots: Duplicate external module name " + module_name)
-        G.add_node(module_name)
-    for module_description in AAModuleTree.traverse_modules(roots):
-        for imported_module_full_name in module_description.imports:
-            if G.has_node(imported_module_full_name):  # Ignore imported modules not in the graph
-                G.add_edge(module_description.full_name, imported_module_full_name)
-    return G
-    
-        
-
-def dump_digraph(G):
-    '''
-    Debug function.
-    Print a list of all nodes and edges in a DiGraph.
-
-    Parameters
-    ----------
-    G : networkx.DiGraph
-        Graph to dump
-
-    Returns
-    -------
-    None.
-    '''
-    print(".................................................")
-    print("Dumping digraph")
-    print("Nodes:")
-    for node in G.nodes():
-        print(node)
-    print("Edges:")
-    for edge in G.edges():
-        print("From " + edge[0] + " To " + edge[1])
-
-
-'''
-    The remainder of this file is not used for the report.
-    It contains experiments that where ultimately not used.
-'''
-'''
-# from AAModule import AAModule
-
-# def rest_api_digraph(modules):
-#     r_a_name = "Rest API"
-#     G = nx.DiGraph()
-#     G.add_node(r_a_name)
-#     for module in modules:
-#         for route in module.rest_api_routes:
-#             print("Adding" + module.full_name)
-#             G.add_node(module.full_name)
-#             if route[0] == "GET":
-#                 G.add_edge(module.full_name, r_a_name)
-#             if route[0] == "POST":
-#                 G.add_edge(r_a_name, module.full_name)
-#     return G
-
-# # Create a graph with all modules and dependencies between them
-# def dependencies_graph(modules):
-#     G = nx.Graph()
-#     for module in modules:
-#         module_name = module.full_name
-#         if module_name not in G.nodes:
-#             G.add_node(module_name)
-#         for each in module.imports:
-#             G.add_edge(module_name, each)
-#     return G
-# # Create a graph with directed dependencies based on imports
-# def dependencies_digraph(modules):
-#     G = nx.DiGraph()
-#     for module in modules:
-#         module_name = module.full_name
-#         if module_name not in G.nodes:
-#             G.add_node(module_name)
-#         for each in module.imports:
-#             G.add_edge(module_name, each)
-#     return G
-
-# # Create a graph of modules in the system with directed dependencies
-# # Dependencies on outside packages are not shown
-# def system_only_dependencies_digraph(modules):
-#     G = nx.DiGraph()
-#     for module in modules:
-#         module_name = module.full_name
-#         if module_name not in G.nodes:
-#             G.add_node(module_name)
-# #    print("+++++++++++++++++++++++++++++++++++++++++++++++")
-# #    print("All known nodes:")
-# #    for node in G.nodes():
-# #        print(node)
-#     for module in modules:
-#         module_name = module.full_name
-#         for each in module.imports:
-#             if G.has_node(each):
-# #                print("Adding " + each)
-#                 G.add_edge(module_name, each)
-# #            else:
-# #                print("Rejected: "+ each)
-#     return G
-
-# def isolation_graph(modules, depth):
-#     G = nx.DiGraph()
-#     for module in modules:
-#         module_name = module.full_name
-#         trunc_module_name = AAModule.top_level_module(module_name, depth)
-#         if trunc_module_name not in G.nodes:
-#             G.add_node(trunc_module_name)
-#     # for module in modules:
-#     #     module_name = module.full_name
-#     #     trunc_module_name = AAModule.top_level_module(module_name, depth)
-#     #     for imported_module in module.imports:
-#     #         trunc_imported_module_name = AAModule.top_level_module(imported_module, depth)
-#     #         if G.has_node(trunc_imported_module_name):
-#     #             print("((((" + module_name + "  -> " + imported_module + " (" + trunc_module_name + " -> " +trunc_imported_module_name + ")")
-#     #             import_depth = AAModule.relative_module_level(trunc_imported_module_name, imported_module)
-#     #             if G.has_edge(trunc_module_name, trunc_imported_module_name):
-#     #                 abe = False
-
-# # a filter takes an DG as input and returns another DG
-# def keep_nodes(inputGraph, condition):
-#     result = nx.DiGraph()
-
-#     for each in inputGraph.edges():
-#         src = each[0]
-#         dst = each[1]
-
-#         if (condition(src)):
-#           result.add_node(src)
-
-#         if (condition(dst)):
-#           result.add_node(dst)
-          
-#         if (condition(src) and condition(dst)):
-#           result.add_edge(src, dst)
-          
-#     return result
-
-
-# def abstracted_to_top_level(G, depth=1):
-#     aG = nx.DiGraph()
-#     for each in G.nodes():
-#         aG.add_node(AAModule.top_level_module(each, depth))
-#     for each in G.edges():
-#         src = AAModule.top_level_module(each[0], depth)
-#         dst = AAModule.top_level_module(each[1], depth)
-
-#         if src != dst:
-#           aG.add_edge(src, dst)
-          
-#     return aG
-
-
-# def does_node_belong_to_module(full_node_name, full_module_name):
-#     return full_node_name.startswith(full_module_name + ".")
-
-# def select_nodes_from_module(G, full_module_name):
-#     return keep_nodes(G, lambda node : does_node_belong_to_module(node, full_module_name))
-'''                    
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Generates networkx graphs to be used by AAView to make graph plots for display.
+Also builds ModuleGraph, a compact integer form of the module graph for
+the graph algorithms in AACycles and AAReach, folded like the trees for
+AACycles, AAMetrics and AADiff.
+
+"""
+
+import bisect
+import collections
+import itertools
+import operator
+from array import array
+from AAModuleTree import AAModuleTree
+from AASymbols import AASymbols
+
+def dependencies_digraph_from_roots(roots, external_module_roots = {}, sparse = False):
+    '''
+    Construct a networkx DiGraph based on the modules and imports found in
+    the input collection of trees.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    sparse : bool, optional
+        Build the graph with the sparse matrix engine, see AASparse. Needs
+        numpy and scipy. The graph is the same, with a "weight" of 1 on the
+        edges. The default is False.
+
+    Returns
+    -------
+    networkx.DiGraph.
+    Resulting directed graph.
+    '''
+    if sparse:
+        from AASparse import AASparse # numpy and scipy are optional
+        return AASparse.dependency_matrix(roots, external_module_roots, resolve_imports=False).digraph()
+    import networkx as nx # only loaded when a graph is needed
+    names = AASymbols.SYMBOLS.names
+    node_ids = set()
+    G = nx.DiGraph()
+    for module_description in AAModuleTree.traverse_modules(roots):
+        if module_description.name_id in node_ids:
+            print("!!!!!!!!!!!!!!! dependencies_digraph_from_roots: Duplicate module name: " + module_description.full_name)
+        node_ids.add(module_description.name_id)
+        G.add_node(module_description.full_name)
+    for module_description in AAModuleTree.traverse_modules(external_module_roots):
+        if module_description.name_id in node_ids:
+            print("!!!!!!!!!!!!!!! dependencies_digraph_from_roots: Duplicate external module name " + module_description.full_name)
+        node_ids.add(module_description.name_id)
+        G.add_node(module_description.full_name)
+    # Match the imports on IDs. The names are only looked up for the edges that are kept.
+    for module_description in AAModuleTree.traverse_modules(roots):
+        module_name = module_description.full_name
+        G.add_edges_from((module_name, names[imported_module_id]) for imported_module_id in module_description.import_ids
+                         if imported_module_id in node_ids)  # Ignore imported modules not in the graph
+    return G
+    
+        
+
+def module_graph(roots, external_module_roots = {}):
+    '''
+    Construct a ModuleGraph based on the modules and imports found in the
+    input collection of trees. Imports are resolved to the module they
+    refer to, like AAModuleTree.fold_modules does. Imports of a module by
+    itself are dropped.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees, optional
+        Description of the external packages. They become nodes without
+        imports. The default is {}.
+
+    Returns
+    -------
+    ModuleGraph
+        Target system modules first, in traverse order, then the external modules.
+    '''
+    system_modules = list(AAModuleTree.traverse_modules(roots))
+    external_modules = list(AAModuleTree.traverse_modules(external_module_roots))
+    module_ids = array("i", [module_description.name_id for module_description in system_modules + external_modules])
+    positions = {module_id: node for node, module_id in enumerate(module_ids)}
+
+    # Resolve each distinct import once. Most imports name a system module exactly, they need no look up.
+    resolved = {module_id: node for module_id, node in zip(module_ids, range(len(system_modules)))}
+    stop_ids = {} # import ID -> ID of the collection it stops in, for the imports that do not stop in the module they refer to
+    def resolve(module_id):
+        module_description = AAModuleTree.resolve_import(roots, module_id)
+        if module_description is None:
+            module_description = AAModuleTree.resolve_import(external_module_roots, module_id)
+        node = resolved[module_id] = -1 if module_description is None else positions.get(module_description.name_id, -1)
+        stop_id = import_stop(roots, external_module_roots, module_id)
+        if stop_id != (-1 if node < 0 else module_ids[node]):
+            stop_ids[module_id] = stop_id
+        return node
+
+    offsets = array("i", [0])
+    targets = array("i")
+    stops = {}
+    for node, module_description in enumerate(system_modules):
+        imported_nodes = set(map(resolved.get, module_description.import_ids))
+        if None in imported_nodes:
+            imported_nodes = set(resolve(module_id) if module_id not in resolved else resolved[module_id] for module_id in module_description.import_ids)
+        if stop_ids and not stop_ids.keys().isdisjoint(module_description.import_ids):
+            node_stops = set(stop_ids.get(module_id, module_ids[resolved[module_id]] if resolved[module_id] >= 0 else -1) for module_id in module_description.import_ids)
+            node_stops.discard(-1)
+            stops[node] = sorted(node_stops)
+        imported_nodes.discard(-1)
+        imported_nodes.discard(node)
+        targets.extend(sorted(imported_nodes))
+        offsets.append(len(targets))
+    offsets.extend([len(targets)] * len(external_modules))
+    return ModuleGraph(module_ids, offsets, targets, system_count=len(system_modules), stops=stops)
+
+
+def folded_module_graph(roots, external_module_roots, fold_target):
+    '''
+    Construct the ModuleGraph of the trees folded with a Folding, without
+    building the unfolded graph first. The same as module_graph followed by
+    ModuleGraph.fold_into, but each import is resolved straight from the
+    collection it stops in to the folded node, so the work is one pass over
+    the imports.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages.
+    fold_target : function taking a name ID
+        See Folding, e.g., depth_fold_target.
+
+    Returns
+    -------
+    ModuleGraph
+        See ModuleGraph.fold_into.
+    '''
+    system_modules = list(AAModuleTree.traverse_modules(roots))
+    module_ids = array("i", [module_description.name_id for module_description in system_modules])
+    module_ids.extend([module_description.name_id for module_description in AAModuleTree.traverse_modules(external_module_roots)])
+    system_ids = module_ids[:len(system_modules)]
+    folding = Folding(module_ids, len(system_modules), fold_target)
+    width = folding.width
+    # The imports of the modules that are not removed, in one array.
+    source_keys = [] # importing module -> (folded node + 1) * width + 1
+    import_ids = array("i")
+    ends = []        # importing module -> end of its imports in import_ids
+    for module_description, folded_node in zip(system_modules, folding.nodes):
+        if folded_node >= 0:
+            source_keys.append((folded_node + 1) * width + 1)
+            import_ids.extend(module_description.import_ids)
+            ends.append(len(import_ids))
+
+    # Resolve each distinct import once, to the collection it stops in and the folded node that
+    # refers to. Most imports name a system module exactly, that is the collection they stop in.
+    stops = dict(zip(system_ids, system_ids)) # import ID -> ID of the collection it stops in
+    resolved = folding.resolved
+    resolved.update((module_id, folded_node) for module_id, folded_node in zip(system_ids, folding.nodes) if folded_node >= 0)
+    for module_id in system_ids:
+        if module_id not in resolved: # folded into a collection without a ModuleDescription
+            folding.resolve(module_id)
+    for module_id in set(import_ids).difference(stops):
+        stop_id = stops[module_id] = import_stop(roots, external_module_roots, module_id)
+        folding.resolve(stop_id)
+    import_stops = list(map(stops.__getitem__, import_ids))
+    edge_source_keys = itertools.chain.from_iterable(map(itertools.repeat, source_keys, map(operator.sub, ends, [0] + ends[:-1])))
+    keys = list(map(operator.add, edge_source_keys, map(resolved.__getitem__, import_stops)))
+    # An import counts once per collection it stops in, like in module_graph. Only the
+    # imports that do not stop in themselves can stop in the same collection as another.
+    inexact = set(bisect.bisect_right(ends, edge) for edge in itertools.compress(itertools.count(), map(operator.ne, import_ids, import_stops)))
+    for module in inexact:
+        start = ends[module - 1] if module else 0
+        keys[start:ends[module]] = itertools.repeat(0, ends[module] - start) # dropped, like the keys of removed modules
+        keys.extend(map(source_keys[module].__add__, map(resolved.__getitem__, set(import_stops[start:ends[module]]))))
+    return folding.graph(collections.Counter(keys))
+
+
+def collection_on_path(roots, module_id):
+    '''
+    Get the ID of the deepest collection on the path of a name, like
+    AAModuleTree.find_stop, also for plain dict trees. -1 if not even the
+    first component exists.
+    '''
+    if isinstance(roots, AAModuleTree.ModuleRoots):
+        return AAModuleTree.find_stop(roots, module_id)
+    return AAModuleTree.find_collection_on_path(roots, AASymbols.SYMBOLS.names[module_id])
+
+
+def import_stop(roots, external_module_roots, module_id):
+    '''
+    Find the collection an import stops in: the deepest collection on the
+    path of the import name in either collection of trees. What the import
+    refers to, in the trees or in any fold of them, only depends on that
+    collection and the modules of the trees, see Folding.resolve.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    module_id : int
+        ID (see AASymbols) of the import name.
+
+    Returns
+    -------
+    int
+        ID of the name of the collection. -1 if not even the first component exists.
+    '''
+    module_description = AAModuleTree.resolve_import(roots, module_id)
+    if module_description is not None:
+        # A target system module. The external packages only hold names that are not below one.
+        return module_description.name_id
+    stop_id = collection_on_path(roots, module_id)
+    external_stop_id = collection_on_path(external_module_roots, module_id)
+    if external_stop_id < 0 or (stop_id >= 0 and AASymbols.MODULE_INDEX.level(stop_id) >= AASymbols.MODULE_INDEX.level(external_stop_id)):
+        return stop_id
+    return external_stop_id
+
+
+def module_collections(module_ids, system_count):
+    '''
+    Get the collections of the trees a list of modules comes from: the
+    modules and their ancestors, since collections that become empty are removed.
+
+    Parameters
+    ----------
+    module_ids : sequence of int
+        Name IDs of the modules, target system modules first.
+    system_count : int
+        Number of target system modules.
+
+    Returns
+    -------
+    set of int, set of int
+        Name IDs of the collections of the target system and of the external packages.
+    '''
+    index = AASymbols.MODULE_INDEX
+    index.refresh()
+    parent = index.parent
+    result = (set(), set())
+    for node, module_id in enumerate(module_ids):
+        tree_collections = result[node >= system_count]
+        while module_id >= 0 and module_id not in tree_collections:
+            tree_collections.add(module_id)
+            module_id = parent[module_id]
+    return result
+
+
+def depth_fold_target(depth):
+    '''
+    Get the fold_target function of Folding that folds all modules below a
+    level into their ancestor at that level, like AAModuleTree.fold_modules_to_depth.
+    '''
+    index = AASymbols.MODULE_INDEX
+    index.refresh()
+    level = index.depth
+    parent = index.parent
+    def fold_target(module_id):
+        for _ in range(level[module_id] - depth):
+            module_id = parent[module_id]
+        return module_id
+    return fold_target
+
+
+'''
+    Class for folding the modules of a graph into other modules, like
+    AAModuleTree.fold_modules does with the trees. A module folded into a
+    collection without a ModuleDescription in its own collection of trees is
+    removed, with its imports. An import is resolved from the collection it
+    stops in (see import_stop): to the module that collection is folded into
+    in the target system, else in the external packages. So an import of a
+    namespace package refers to the module the package is folded into.
+'''
+class Folding:
+    def __init__(self, module_ids, system_count, fold_target, collections = None):
+        '''
+        Parameters
+        ----------
+        module_ids : sequence of int
+            Name IDs of the modules, target system modules first.
+        system_count : int
+            Number of target system modules.
+        fold_target : function taking a name ID
+            Gives the ID of the collection the collection of that name is folded
+            into, the ID itself if it is not folded, -1 for the top.
+        collections : (set of int, set of int), optional
+            The collections of the modules, see module_collections. Computed if not given.
+        '''
+        self.fold_target = fold_target
+        self.collections = module_collections(module_ids, system_count) if collections is None else collections
+        targets = list(map(fold_target, module_ids))
+        self.targets = dict(zip(module_ids, targets)) # memo of fold_target
+        kept = [node for node, module_id, target_id in zip(itertools.count(), module_ids, targets) if target_id == module_id]
+        self.module_ids = array("i", [module_ids[node] for node in kept]) # folded node -> name ID
+        self.system_count = bisect.bisect_left(kept, system_count)
+        # target system and external packages: name ID -> folded node
+        self.positions = (dict(zip(self.module_ids[:self.system_count], itertools.count())),
+                          dict(zip(self.module_ids[self.system_count:], itertools.count(self.system_count))))
+        system_positions, external_positions = self.positions
+        self.nodes = array("i", [system_positions.get(target_id, -1) for target_id in targets[:system_count]]) # node -> folded node, -1 if removed
+        self.nodes.extend([external_positions.get(target_id, -1) for target_id in targets[system_count:]])
+        self.absorbing = bytearray(len(self.module_ids)) # folded node -> 1 if other modules are folded into it
+        for folded_node in [folded_node for module_id, target_id, folded_node in zip(module_ids, targets, self.nodes) if target_id != module_id and folded_node >= 0]:
+            self.absorbing[folded_node] = 1
+        self.resolved = {} # memo of resolve
+        self.width = len(self.module_ids) + 1 # see graph
+
+    def resolve(self, stop_id):
+        '''
+        Get the folded node an import refers to, from the collection it stops in. -1 if none.
+        '''
+        folded_node = self.resolved.get(stop_id)
+        if folded_node is not None:
+            return folded_node
+        folded_node = -1
+        parent = AASymbols.MODULE_INDEX.parent
+        targets = self.targets
+        for tree_collections, positions in zip(self.collections, self.positions):
+            collection_id = stop_id
+            while collection_id >= 0 and collection_id not in tree_collections:
+                collection_id = parent[collection_id]
+            if collection_id >= 0:
+                target_id = targets.get(collection_id)
+                if target_id is None:
+                    target_id = targets[collection_id] = self.fold_target(collection_id)
+                folded_node = positions.get(target_id, -1)
+                if folded_node >= 0:
+                    break
+        self.resolved[stop_id] = folded_node
+        return folded_node
+
+    def graph(self, counts):
+        '''
+        Make the folded ModuleGraph from the number of module level imports on its edges.
+        The edges between modules folded into the same node are dropped, and
+        so are the edges of a node that other modules were folded into to
+        its own sub modules.
+
+        Parameters
+        ----------
+        counts : dict
+            (importing folded node + 1) * width + imported folded node + 1 -> number of imports.
+            Keys with a node of -1, i.e., a removed module or an unresolved import, are dropped.
+            Changed in place.
+
+        Returns
+        -------
+        ModuleGraph
+            Numbered like module_ids.
+        '''
+        width = self.width
+        # A node that other modules were folded into drops its imports of its own
+        # sub modules, like AAModuleTree.discard_folded_modules. Those that are
+        # still nodes are in its pre-order interval.
+        absorbing_nodes = list(itertools.compress(itertools.count(), self.absorbing))
+        if absorbing_nodes:
+            index = AASymbols.MODULE_INDEX
+            index.refresh_intervals()
+            enter = index.enter
+            exit = index.exit
+            ordered = sorted((enter[module_id], folded_node) for folded_node, module_id in enumerate(self.module_ids))
+            ordered_enter = [number for number, _ in ordered]
+            for folded_node in absorbing_nodes:
+                module_id = self.module_ids[folded_node]
+                first = bisect.bisect_left(ordered_enter, enter[module_id])
+                last = bisect.bisect_right(ordered_enter, exit[module_id])
+                for _, imported_node in ordered[first:last]:
+                    counts.pop((folded_node + 1) * width + imported_node + 1, None)
+        keys = sorted(counts)
+        del keys[:bisect.bisect_left(keys, width)] # from a removed module
+        keys = list(itertools.compress(keys, map(operator.mod, keys, itertools.repeat(width)))) # to an unresolved import
+        # (node + 1) * width + node + 1 is the only kind of key divisible by width + 1
+        keys = list(itertools.compress(keys, map(operator.mod, keys, itertools.repeat(width + 1)))) # to itself
+        sources = list(map(operator.floordiv, keys, itertools.repeat(width))) # importing folded node + 1, sorted
+        offsets = array("i", [bisect.bisect_left(sources, source) for source in range(1, width + 1)])
+        targets = array("i", map(operator.sub, map(operator.mod, keys, itertools.repeat(width)), itertools.repeat(1)))
+        return ModuleGraph(self.module_ids, offsets, targets, array("i", map(counts.__getitem__, keys)), self.system_count)
+
+
+'''
+    Class holding a directed module graph as integer arrays.
+    The nodes are numbered 0 .. size - 1. The edges of a node are stored
+    together, sorted on the imported node (compressed sparse rows), so the
+    graph of a system with 100k modules fits in a few MB and can be walked
+    without hashing names. It is folded like the trees, see Folding.
+'''
+class ModuleGraph:
+    def __init__(self, module_ids, offsets, targets, weights = None, system_count = None, stops = None):
+        self.module_ids = module_ids # node -> name ID (see AASymbols) of the module
+        self.offsets = offsets       # node -> index of its first edge in targets. One more entry than nodes.
+        self.targets = targets       # edge -> imported node
+        self.weights = weights       # edge -> number of module imports it stands for. None when all are 1.
+        self.positions = {module_id: node for node, module_id in enumerate(module_ids)} # name ID -> node
+        self.system_count = len(module_ids) if system_count is None else system_count # the nodes from here on are external modules
+        # node -> sorted IDs of the collections its imports stop in (see import_stop), for the nodes
+        # with imports that do not stop in the module they refer to. For the others, the imported modules.
+        self.stops = {} if stops is None else stops
+        self.collections = None # see module_collections, computed with the first fold
+
+    def size(self):
+        '''
+        Get the number of nodes.
+        '''
+        return len(self.module_ids)
+
+    def weight(self, edge):
+        '''
+        Get the number of module imports an edge stands for.
+        '''
+        return 1 if self.weights is None else self.weights[edge]
+
+    def edge_sources(self):
+        '''
+        Get the importing node of each edge.
+
+        Returns
+        -------
+        array of int
+            edge -> importing node.
+        '''
+        offsets = self.offsets
+        degrees = map(operator.sub, offsets[1:], offsets)
+        return array("i", itertools.chain.from_iterable(map(itertools.repeat, range(len(self.module_ids)), degrees)))
+
+    def module_names(self, nodes = None):
+        '''
+        Get the full module names of nodes.
+
+        Parameters
+        ----------
+        nodes : iterable of int, optional
+            The default is None, which means all nodes.
+
+        Returns
+        -------
+        list of string
+        '''
+        module_ids = self.module_ids
+        return AASymbols.SYMBOLS.name_list(module_ids if nodes is None else (module_ids[node] for node in nodes))
+
+    def edges(self):
+        '''
+        Generator for the edges of the graph.
+
+        Yields
+        ------
+        (string, string, int)
+            Full names of the importing and the imported module, and the weight of the edge.
+        '''
+        names = self.module_names()
+        offsets = self.offsets
+        targets = self.targets
+        for node in range(len(names)):
+            for edge in range(offsets[node], offsets[node + 1]):
+                yield names[node], names[targets[edge]], self.weight(edge)
+
+    def folding(self, fold_target):
+        '''
+        Fold the modules, see Folding.
+
+        Parameters
+        ----------
+        fold_target : function taking a name ID
+            See Folding.
+
+        Returns
+        -------
+        Folding
+        '''
+        if self.collections is None:
+            self.collections = module_collections(self.module_ids, self.system_count)
+        return Folding(self.module_ids, self.system_count, fold_target, self.collections)
+
+    def fold_to_depth(self, depth):
+        '''
+        Fold all modules below a level into their ancestor at that level,
+        like AAModuleTree.fold_modules_to_depth. So a module folded into a
+        namespace package is removed, and an import of a namespace package
+        refers to the module the package is folded into.
+
+        Parameters
+        ----------
+        depth : int
+            Level, see AAModule.module_level, to fold to.
+
+        Returns
+        -------
+        ModuleGraph
+            See fold_into.
+        '''
+        return self.fold_into(self.folding(depth_fold_target(depth)))
+
+    def fold_into(self, folding):
+        '''
+        Helper function for fold_to_depth.
+        Fold the graph. The edges between modules folded into the same node are
+        dropped, and so are the edges of a node that other modules were folded
+        into to its own sub modules. Parallel edges are merged, adding their weights.
+
+        Parameters
+        ----------
+        folding : Folding
+            Fold of module_ids, see folding.
+
+        Returns
+        -------
+        ModuleGraph
+            The folded graph, numbered like folding.module_ids.
+        '''
+        resolve = folding.resolve
+        width = folding.width
+        system_count = self.system_count
+        # Each edge as the key (importing folded node + 1) * width + imported folded node + 1,
+        # so the edges of removed modules and of unresolved imports get keys too, and are
+        # dropped after counting. The imports of the nodes with stops are resolved from those.
+        imported_nodes = [folded_node + 1 if node < system_count and folded_node >= 0 else resolve(module_id) + 1
+                          for node, (module_id, folded_node) in enumerate(zip(self.module_ids, folding.nodes))]
+        source_keys = [(folded_node + 1) * width for folded_node in folding.nodes]
+        for node in self.stops:
+            source_keys[node] = 0
+        offsets = self.offsets
+        edge_source_keys = itertools.chain.from_iterable(map(itertools.repeat, source_keys, map(operator.sub, offsets[1:], offsets)))
+        keys = [source_key + imported_nodes[target] for source_key, target in zip(edge_source_keys, self.targets)]
+        weights = self.weights
+        for node, stop_ids in self.stops.items():
+            keys.extend([(folding.nodes[node] + 1) * width + resolve(stop_id) + 1 for stop_id in stop_ids])
+            if weights is not None:
+                weights = weights + array("i", [1] * len(stop_ids))
+        if weights is None:
+            counts = collections.Counter(keys)
+        else:
+            counts = collections.Counter()
+            for key, weight in zip(keys, weights):
+                counts[key] += weight
+        return folding.graph(counts)
+
+
+def dump_digraph(G):
+    '''
+    Debug function.
+    Print a list of all nodes and edges in a DiGraph.
+
+    Parameters
+    ----------
+    G : networkx.DiGraph
+        Graph to dump
+
+    Returns
+    -------
+    None.
+    '''
+    print(".................................................")
+    print("Dumping digraph")
+    print("Nodes:")
+    for node in G.nodes():
+        print(node)
+    print("Edges:")
+    for edge in G.edges():
+        print("From " + edge[0] + " To " + edge[1])
+
+
+'''
+    The remainder of this file is not used for the report.
+    It contains experiments that where ultimately not used.
+'''
+'''
+# from AAModule import AAModule
+
+# def rest_api_digraph(modules):
+#     r_a_name = "Rest API"
+#     G = nx.DiGraph()
+#     G.add_node(r_a_name)
+#     for module in modules:
+#         for route in module.rest_api_routes:
+#             print("Adding" + module.full_name)
+#             G.add_node(module.full_name)
+#             if route[0] == "GET":
+#                 G.add_edge(module.full_name, r_a_name)
+#             if route[0] == "POST":
+#                 G.add_edge(r_a_name, module.full_name)
+#     return G
+
+# # Create a graph with all modules and dependencies between them
+# def dependencies_graph(modules):
+#     G = nx.Graph()
+#     for module in modules:
+#         module_name = module.full_name
+#         if module_name not in G.nodes:
+#             G.add_node(module_name)
+#         for each in module.imports:
+#             G.add_edge(module_name, each)
+#     return G
+# # Create a graph with directed dependencies based on imports
+# def dependencies_digraph(modules):
+#     G = nx.DiGraph()
+#     for module in modules:
+#         module_name = module.full_name
+#         if module_name not in G.nodes:
+#             G.add_node(module_name)
+#         for each in module.imports:
+#             G.add_edge(module_name, each)
+#     return G
+
+# # Create a graph of modules in the system with directed dependencies
+# # Dependencies on outside packages are not shown
+# def system_only_dependencies_digraph(modules):
+#     G = nx.DiGraph()
+#     for module in modules:
+#         module_name = module.full_name
+#         if module_name not in G.nodes:
+#             G.add_node(module_name)
+# #    print("+++++++++++++++++++++++++++++++++++++++++++++++")
+# #    print("All known nodes:")
+# #    for node in G.nodes():
+# #        print(node)
+#     for module in modules:
+#         module_name = module.full_name
+#         for each in module.imports:
+#             if G.has_node(each):
+# #                print("Adding " + each)
+#                 G.add_edge(module_name, each)
+# #            else:
+# #                print("Rejected: "+ each)
+#     return G
+
+# def isolation_graph(modules, depth):
+#     G = nx.DiGraph()
+#     for module in modules:
+#         module_name = module.full_name
+#         trunc_module_name = AAModule.top_level_module(module_name, depth)
+#         if trunc_module_name not in G.nodes:
+#             G.add_node(trunc_module_name)
+#     # for module in modules:
+#     #     module_name = module.full_name
+#     #     trunc_module_name = AAModule.top_level_module(module_name, depth)
+#     #     for imported_module in module.imports:
+#     #         trunc_imported_module_name = AAModule.top_level_module(imported_module, depth)
+#     #         if G.has_node(trunc_imported_module_name):
+#     #             print("((((" + module_name + "  -> " + imported_module + " (" + trunc_module_name + " -> " +trunc_imported_module_name + ")")
+#     #             import_depth = AAModule.relative_module_level(trunc_imported_module_name, imported_module)
+#     #             if G.has_edge(trunc_module_name, trunc_imported_module_name):
+#     #                 abe = False
+
+# # a filter takes an DG as input and returns another DG
+# def keep_nodes(inputGraph, condition):
+#     result = nx.DiGraph()
+
+#     for each in inputGraph.edges():
+#         src = each[0]
+#         dst = each[1]
+
+#         if (condition(src)):
+#           result.add_node(src)
+
+#         if (condition(dst)):
+#           result.add_node(dst)
+          
+#         if (condition(src) and condition(dst)):
+#           result.add_edge(src, dst)
+          
+#     return result
+
+
+# def abstracted_to_top_level(G, depth=1):
+#     aG = nx.DiGraph()
+#     for each in G.nodes():
+#         aG.add_node(AAModule.top_level_module(each, depth))
+#     for each in G.edges():
+#         src = AAModule.top_level_module(each[0], depth)
+#         dst = AAModule.top_level_module(each[1], depth)
+
+#         if src != dst:
+#           aG.add_edge(src, dst)
+          
+#     return aG
+
+
+# def does_node_belong_to_module(full_node_name, full_module_name):
+#     return full_node_name.startswith(full_module_name + ".")
+
+# def select_nodes_from_module(G, full_module_name):
+#     return keep_nodes(G, lambda node : does_node_belong_to_module(node, full_module_name))
+'''                    
         
\ No newline at end of file
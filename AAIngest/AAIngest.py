@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Single pass ingestion of the python files of the target system.
+    Each file is read once, and its imports, LOC, SLOC and content hash are
+    all derived from those bytes.
+    Files can be scanned one by one, or fanned out in chunks over a pool
+    of worker processes. Workers only send back the compact import names,
+    never the AST objects.
+
+    Note: this file must not import anything with side effects, since the
+    worker processes import it.
+"""
+
+import os
+import re
+import hashlib
+from AAAST import AAAST
+
+# Number of files handed to a worker process at a time.
+DEFAULT_CHUNK_SIZE = 64
+
+def content_hash(data):
+    '''
+    Hash the contents of a file.
+    Uses the same hash as git uses for blobs, so files can be matched
+    against git objects without reading them.
+
+    Parameters
+    ----------
+    data : bytes
+        File contents.
+
+    Returns
+    -------
+    string
+        Hex digest.
+    '''
+    hasher = hashlib.sha1(b"blob %d\0" % len(data))
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+# A line with something else than white space and comments
+SOURCE_LINE = re.compile(rb"^[ \t\f]*[^ \t\f\r\n#]", re.MULTILINE)
+
+def count_lines(data):
+    '''
+    Count the lines in the contents of a file, like iterating over the
+    lines of the file opened in text mode does.
+
+    Parameters
+    ----------
+    data : bytes
+        File contents.
+
+    Returns
+    -------
+    int
+        Number of lines.
+    '''
+    if b"\r" in data: # old style or mixed line endings. Rare, so the slow way is fine.
+        return len(data.splitlines())
+    lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        lines += 1
+    return lines
+
+
+def count_source_lines(data):
+    '''
+    Count the source lines (SLOC) in the contents of a python file,
+    i.e., lines that are neither blank nor only a comment.
+    Note: lines inside multi-line strings are counted as source lines.
+
+    Parameters
+    ----------
+    data : bytes
+        File contents.
+
+    Returns
+    -------
+    int
+        Number of source lines.
+    '''
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return len(SOURCE_LINE.findall(data))
+
+
+def scan_source(data, fast_imports=False):
+    '''
+    Derive the imports, LOC and SLOC from the contents of a python file.
+
+    Parameters
+    ----------
+    data : bytes
+        File contents.
+    fast_imports : bool, optional
+        See scan_file. The default is False.
+
+    Returns
+    -------
+    dict
+        "imports", "LOC" and "SLOC" as for scan_file.
+
+    Raises
+    ------
+    SyntaxError, ValueError or RecursionError if the source cannot be parsed.
+    '''
+    if fast_imports:
+        imports = AAAST.get_imports_from_source(data)
+    else:
+        imports = AAAST.get_imports(AAAST.get_ast_for_source(data))
+    return {"imports": tuple(imports),
+            "LOC": count_lines(data),
+            "SLOC": count_source_lines(data)}
+
+
+def scan_file(full_path, known_hash=None, fast_imports=False):
+    '''
+    Read a python file once and derive its imports, LOC, SLOC and content hash.
+    A file that cannot be read or parsed does not raise. The failure is
+    recorded in the result instead, so that one broken file does not abort
+    the scan of the whole system.
+
+    Parameters
+    ----------
+    full_path : string
+        Full file system path of the py file.
+    known_hash : string, optional
+        Content hash from an earlier scan of the file. If the contents
+        still have this hash, the file is not parsed again. The default is None.
+    fast_imports : bool, optional
+        Extract the imports with AAAST.get_imports_from_source instead of
+        the full AST. The default is False.
+
+    Returns
+    -------
+    dict
+        "full_path" : the scanned file path
+        "content_hash" : see content_hash. None if the file could not be read.
+        "unchanged" : True if the contents matched known_hash. Then imports, LOC and SLOC are not set.
+        "imports" : tuple of full module names of the imported modules.
+            None if the file could not be scanned.
+        "LOC" : number of lines in the file.
+        "SLOC" : number of source lines in the file. See count_source_lines.
+        "error" : None, or a description of why the file could not be scanned.
+    '''
+    result = {"full_path": full_path, "content_hash": None, "unchanged": False, "imports": None, "LOC": 0, "SLOC": 0, "error": None}
+    try:
+        with open(full_path, "rb") as file:
+            data = file.read()
+        result["content_hash"] = content_hash(data)
+        if result["content_hash"] == known_hash:
+            result["unchanged"] = True
+            return result
+        result.update(scan_source(data, fast_imports))
+    except (SyntaxError, ValueError, OSError, RecursionError) as e: # ValueError covers UnicodeDecodeError and null bytes
+        result["error"] = type(e).__name__ + ": " + str(e)
+    return result
+
+
+def scan_blob(full_path, data, blob_hash=None, fast_imports=False):
+    '''
+    Derive the imports, LOC and SLOC from contents that have already been
+    read, e.g., a blob from a git repository. Like scan_file, failures are
+    recorded in the result instead of raised.
+
+    Parameters
+    ----------
+    full_path : string
+        Name of the contents in the result.
+    data : bytes
+        File contents.
+    blob_hash : string, optional
+        content_hash of data, if it is already known. The default is None.
+    fast_imports : bool, optional
+        See scan_file. The default is False.
+
+    Returns
+    -------
+    dict
+        Scan result like scan_file.
+    '''
+    result = {"full_path": full_path, "content_hash": blob_hash or content_hash(data), "unchanged": False, "imports": None, "LOC": 0, "SLOC": 0, "error": None}
+    try:
+        result.update(scan_source(data, fast_imports))
+    except (SyntaxError, ValueError, RecursionError) as e:
+        result["error"] = type(e).__name__ + ": " + str(e)
+    return result
+
+
+def scan_file_chunk(tasks):
+    '''
+    Worker function. Scans a chunk of python files.
+
+    Parameters
+    ----------
+    tasks : list of (string, string, bool)
+        Full file system path, known hash (or None) and fast_imports flag
+        of each py file. See scan_file.
+
+    Returns
+    -------
+    list of dict
+        One scan_file result per file, in the same order.
+    '''
+    return [scan_file(full_path, known_hash, fast_imports) for full_path, known_hash, fast_imports in tasks]
+
+
+def chunks(items, chunk_size):
+    '''
+    Generator splitting an iterable into lists of at most chunk_size items.
+
+    Parameters
+    ----------
+    items : iterable
+    chunk_size : int
+
+    Yields
+    ------
+    list
+        Next chunk of items.
+    '''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_files(full_paths, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, known_hashes={}, fast_imports=False):
+    '''
+    Generator scanning a collection of python files.
+    With more than one worker, the files are fanned out in chunks over a
+    pool of processes.
+    Note: on Windows the worker processes re-import the main script, so the
+    calling script must guard its top level code with
+    if __name__ == "__main__":
+
+    Parameters
+    ----------
+    full_paths : iterable of string
+        Full file system paths of the py files.
+    workers : int, optional
+        Number of worker processes. 1 scans in the calling process.
+        None uses one worker per CPU. The default is 1.
+    chunk_size : int, optional
+        Number of files sent to a worker at a time. The default is DEFAULT_CHUNK_SIZE.
+    known_hashes : dict, optional
+        Content hashes from an earlier scan, by full path. See scan_file.
+        Only looked up when a file path is produced, so it may be filled in while
+        full_paths is being iterated. The default is {}.
+    fast_imports : bool, optional
+        See scan_file. The default is False.
+
+    Yields
+    ------
+    dict
+        One scan_file result per file, in the order of full_paths.
+    '''
+    tasks = ((full_path, known_hashes.get(full_path), fast_imports) for full_path in full_paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for task in tasks:
+            yield scan_file(*task)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_result in executor.map(scan_file_chunk, chunks(tasks, chunk_size)):
+            yield from chunk_result
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Coupling metrics for every module at every fold depth.
+    For the modules folded to a level (see AAModuleTree.fold_modules_to_depth):
+        Ca : afferent coupling, the number of other modules importing the module.
+        Ce : efferent coupling, the number of other modules the module imports.
+        instability : Ce / (Ca + Ce), 0 for a module without either.
+    The import counts behind them are given as well. The metrics of a level
+    are computed at once from the edge arrays of the folded AAGraph.ModuleGraph,
+    as counts over the importing and the imported nodes, instead of node by
+    node on a networkx graph.
+    The result is a columnar table, a dict of equally long columns, that can
+    be written as CSV, or as Parquet if pyarrow is installed.
+
+    Note: the trees do not record the classes of the modules, so the
+    abstractness of a module cannot be computed from them.
+"""
+
+import csv
+from AAGraph import AAGraph
+from AAModuleTree import AAModuleTree
+from AASymbols import AASymbols
+
+COLUMNS = ["depth", "module", "external", "LOC", "Ca", "Ce", "instability", "imports_in", "imports_out"]
+
+def load_numpy():
+    '''
+    Import numpy.
+
+    Returns
+    -------
+    numpy
+
+    Raises
+    ------
+    ImportError if numpy is not installed.
+    '''
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("AAMetrics needs numpy for the metrics tables (pip install numpy): " + str(e)) from e
+    return numpy
+
+
+def coupling_metrics(roots, external_module_roots = {}, depths = None):
+    '''
+    Compute the coupling metrics of the modules at a number of fold depths.
+    Needs numpy.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees, optional
+        Description of the external packages. The default is {}.
+    depths : iterable of int, optional
+        Levels to fold to. The default is None, which means every level from
+        1 to the deepest target system module.
+
+    Returns
+    -------
+    dict
+        Table with a numpy array per column, one row per module per depth:
+        "depth" : the level folded to.
+        "module" : full module name.
+        "external" : True for external modules.
+        "LOC" : sum of the LOC of the modules folded into the module.
+        "Ca", "Ce", "instability" : see the top of this file.
+        "imports_in", "imports_out" : number of module level imports into and out of the module.
+    '''
+    np = load_numpy()
+    graph = AAGraph.module_graph(roots, external_module_roots)
+    LOC = np.array([module_description.LOC for module_description in AAModuleTree.traverse_modules(roots)] +
+                   [module_description.LOC for module_description in AAModuleTree.traverse_modules(external_module_roots)], dtype=np.int64)
+    if depths is None:
+        index = AASymbols.MODULE_INDEX
+        index.refresh()
+        level = index.depth
+        depths = range(1, max((level[module_id] for module_id in graph.module_ids[:graph.system_count]), default=0) + 1)
+    parts = []
+    for depth in depths:
+        folding = graph.folding(AAGraph.depth_fold_target(depth))
+        folded = graph.fold_into(folding) # without the imports of a module by itself, they are no coupling
+        size = folded.size()
+        rows = np.repeat(np.arange(size), np.diff(np.frombuffer(folded.offsets, dtype=np.int32)))
+        columns = np.frombuffer(folded.targets, dtype=np.int32)
+        counts = np.frombuffer(folded.weights, dtype=np.int32)
+        nodes = np.frombuffer(folding.nodes, dtype=np.int32)
+        members = nodes >= 0
+        Ce = np.bincount(rows, minlength=size)
+        Ca = np.bincount(columns, minlength=size)
+        coupling = Ca + Ce
+        parts.append({"depth": np.full(size, depth, dtype=np.int64),
+                      "module": np.array(folded.module_names(), dtype=object),
+                      "external": np.arange(size) >= folded.system_count,
+                      "LOC": np.bincount(nodes[members], weights=LOC[members], minlength=size).astype(np.int64),
+                      "Ca": Ca,
+                      "Ce": Ce,
+                      "instability": np.divide(Ce, coupling, out=np.zeros(size), where=coupling > 0),
+                      "imports_in": np.bincount(columns, weights=counts, minlength=size).astype(np.int64),
+                      "imports_out": np.bincount(rows, weights=counts, minlength=size).astype(np.int64)})
+    if not parts:
+        return {column: np.array([]) for column in COLUMNS}
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+def write_csv(table, file):
+    '''
+    Write a table from coupling_metrics as CSV, with a header line.
+
+    Parameters
+    ----------
+    table : dict
+    file : text file object
+        E.g., sys.stdout, or a file opened with newline="".
+
+    Returns
+    -------
+    None.
+    '''
+    writer = csv.writer(file)
+    writer.writerow(COLUMNS)
+    writer.writerows(zip(*(table[column].tolist() for column in COLUMNS)))
+
+
+def write_parquet(table, path):
+    '''
+    Write a table from coupling_metrics as a Parquet file. Needs pyarrow.
+
+    Parameters
+    ----------
+    table : dict
+    path : string
+
+    Returns
+    -------
+    None.
+
+    Raises
+    ------
+    ImportError if pyarrow is not installed.
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("AAMetrics needs pyarrow to write Parquet files (pip install pyarrow): " + str(e)) from e
+    pyarrow.parquet.write_table(pyarrow.table({column: table[column].tolist() if column == "module" else table[column] for column in COLUMNS}), path)
+
+
+def self_test():
+    '''
+    Run the tests of this file. Skipped if numpy is not installed.
+    '''
+    import io
+    try:
+        load_numpy()
+    except ImportError as e:
+        print("AAMetrics.self_test: skipped. " + str(e))
+        return
+    roots = AAModuleTree.ModuleRoots()
+    # app.ns has no ModuleDescription, like a namespace package
+    for full_name, imports in [("app", ["app.a.x", "flask"]), ("app.a", ["app.b", "os"]), ("app.a.x", ["app.b.y.f", "requests.get", "app.a.x"]), ("app.b", ["app.a.x"]), ("app.b.y", ["app.a"]),
+                               ("app.ns.m", ["app.a"]), ("lib", ["app.ns"])]:
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        module_description.LOC = 10
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    external_module_roots = AAModuleTree.ModuleRoots()
+    AAModuleTree.build_external_module_tree(roots, external_module_roots)
+    table = coupling_metrics(roots, external_module_roots)
+    assert sorted(set(table["depth"].tolist())) == [1, 2, 3]
+    for depth in [1, 2, 3]:
+        # the same counts from the folded trees
+        folded_roots, folded_external_module_roots = AAModuleTree.fold_modules_to_depth(roots, external_module_roots, depth)
+        Ca = {}
+        Ce = {}
+        for module_description in AAModuleTree.traverse_modules(folded_roots):
+            imported_module_names = set(module_description.imports) - {module_description.full_name}
+            Ce[module_description.full_name] = len(imported_module_names)
+            for imported_module_name in imported_module_names:
+                Ca[imported_module_name] = Ca.get(imported_module_name, 0) + 1
+        rows = [row for row in zip(*(table[column].tolist() for column in COLUMNS)) if row[0] == depth]
+        assert [row[1] for row in rows] == [module_description.full_name for module_description in AAModuleTree.traverse_modules(folded_roots)] + \
+            [module_description.full_name for module_description in AAModuleTree.traverse_modules(folded_external_module_roots)]
+        for _, module_name, _, _, row_Ca, row_Ce, instability, _, _ in rows:
+            assert (row_Ca, row_Ce) == (Ca.get(module_name, 0), Ce.get(module_name, 0))
+            assert instability == (row_Ce / (row_Ca + row_Ce) if row_Ca + row_Ce else 0.0)
+    rows = {(row[0], row[1]): row for row in zip(*(table[column].tolist() for column in COLUMNS))}
+    assert rows[(2, "app.a")] == (2, "app.a", False, 20, 2, 3, 0.6, 3, 4)
+    assert rows[(3, "app.a.x")][4:6] == (2, 2) # its import of itself is not counted
+    assert rows[(1, "flask")] == (1, "flask", True, 0, 1, 0, 0.0, 1, 0)
+    assert rows[(1, "lib")][4:6] == (0, 1) and rows[(1, "app")][4:6] == (1, 2) # lib imports app through the namespace package
+    output = io.StringIO()
+    write_csv(table, output)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == ",".join(COLUMNS) and len(lines) == len(table["module"]) + 1
+    assert "2,app.a,False,20,2,3,0.6,3,4" in lines
@@ -1,323 +1,477 @@
-# -*- coding: utf-8 -*-
-"""
-@author: mlv
-
-Purpose:
-    Mostly utility functions to analyze the module hierarchy from the module names.
-    Originally collected more information about the modules, but most have moved to AModuleTree.py.
-"""
-
-from AAFileSystem import AAFileSystem
-
- 
-def module_name_from_file_path(full_path):
-    '''
-    Extract a module name from a file name
-    E.g., ../zeeguu_core/model/user.py -> zeeguu_core.model.user
-
-    Parameters
-    ----------
-    full_path : string
-        full file system path of the py file.
-
-    Returns
-    -------
-    string
-        Full module name for the file.
-    '''
-    file_name = full_path[len(AAFileSystem.CODE_ROOT_FOLDER):] # remove root part of the path
-    file_name = file_name.replace("\\__init__.py","") # __init__.py defines a package. The name is the folder name.
-    file_name = file_name.replace("\\",".") # convert backslashes to .
-    file_name = file_name.replace(".py","") # remove the extension for python files
-    return file_name
-assert 'zeeguu_core.model.user' == module_name_from_file_path(AAFileSystem.file_path('zeeguu_core\\model\\user.py'))
-assert 'zeeguu_core.model' == module_name_from_file_path(AAFileSystem.file_path('zeeguu_core\\model\\__init__.py'))
-
-
-# extracts the parent of depth X 
-def top_level_module(module_name, depth=1):
-    '''
-    Extracts the name of a parent of a module
-
-    Parameters
-    ----------
-    module_name : string
-        full module name of the module.
-    depth : number, optional
-        The level of the parent. Use 1 for the top level, 2 for the second level,
-        etc. The default is 1.
-
-    Returns
-    -------
-    string
-        Full module name of the parent.
-    '''
-    components = module_name.split(".")
-    return ".".join(components[:depth])
-assert (top_level_module("zeeguu_core.model.util") == "zeeguu_core")
-assert (top_level_module("zeeguu_core.model.util", 2) == "zeeguu_core.model")
-
-
-def module_contains_module(module_name1, module_name2):
-    '''
-    Test if one module is parent to another module based on their names.
-
-    Parameters
-    ----------
-    module_name1 : string
-        Full module name of the potential parent module.
-    module_name2 : string
-        Full module name of the potential child module.
-
-    Returns
-    -------
-    bool
-        Returns true if module 1 is parent to module 2.
-        Note a module is not considered to containt itself.
-    '''
-    if module_name1 == module_name2:
-        return False
-    components1 = module_name1.split(".")
-    module2_truncated_name = top_level_module(module_name2, len(components1))
-    return module_name1 == module2_truncated_name
-assert module_contains_module("zeeguu_core.model", "zeeguu_core.model.user")
-assert module_contains_module("zeeguu_core.model", "zeeguu_core.model.user.x")
-assert not module_contains_module("zeeguu_core_model", "zeeguu_core_model")
-assert not module_contains_module("zeeguu_core.model.user", "zeeguu_core.model")
-assert not module_contains_module("zeeguu_core.model", "zeeguu_core.model2.user")
-
-
-def any_module_contains_module(module_name_list, module_name):
-    '''
-    Test if any of the modules in a list of modules contain a specified module.
-
-    Parameters
-    ----------
-    module_name_list : list of strings
-        A list full module names of the potiential parent modules.
-    module_name : string
-        Full module name of the potential child module
-
-    Returns
-    -------
-    bool
-        Returns true if any of the modules in the list is parent to module 2.
-        Note a module is not considered to containt itself.
-    '''
-    for module_name_candidate in module_name_list:
-        if module_contains_module(module_name_candidate, module_name):
-            return True
-    return False
-assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.model.x")
-assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user.x")
-assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user.x.y")
-assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user")
-assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core")
-assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu.user.x")
-
-
-def module_is_direct_sub_module(parent_module_full_name, candidate_module_full_name):
-    '''
-    Test if a module is a direct parent of another module
-
-    Parameters
-    ----------
-    module_name1 : string
-        Full module name of the potential parent module.
-    module_name2 : string
-        Full module name of the potential child module.
-
-    Returns
-    -------
-    bool
-        Returns true if module 1 is the immediate parent to module 2.
-    '''
-    if module_contains_module(parent_module_full_name, candidate_module_full_name):
-        if relative_module_level(parent_module_full_name, candidate_module_full_name) == 1:
-            return True
-    return False
-
-
-def module_level(full_module_name):
-    '''
-    Returns the level of a module in the module hiearchy based on its name.
-
-    Parameters
-    ----------
-    full_module_name : string
-        Full module name
-
-    Returns
-    -------
-    int
-        E.g. the level of 'zeeguu' is 1.
-        The level of 'zeeguu.core' is 2.
-    '''
-    components = full_module_name.split(".")
-    return len(components)    
-
-
-def relative_module_level(module_name1, module_name2):
-    '''
-    Calculate how far module 2 is below module 1 in the module hierachy.
-
-    Parameters
-    ----------
-    module_name1 : string
-        Full module name.
-    module_name2 : string
-        Full module name.
-
-    Returns
-    -------
-    int
-        0 if the modules are identical
-        -1 if module 1 is not parent to module 2.
-        Otherwise the number of levels module 2 is below module 1
-    '''
-    if module_name1 == module_name2:
-        return 0
-    if not module_contains_module(module_name1, module_name2):
-        return -1
-    return module_level(module_name2) - module_level(module_name1)
-assert relative_module_level("zeeguu_core", "zeeguu_core") == 0
-assert relative_module_level("zeeguu_core", "zeeguu_core.model") == 1
-assert relative_module_level("zeeguu_core", "zeeguu_core.model.user") == 2
-assert relative_module_level("zeeguu_core.model.user", "zeeguu_core") == -1
-assert relative_module_level("zeeguu_core.model.x", "zeeguu_core.model.y") == -1
-
-
-def module_belongs_to_zeeguu_api(full_module_name):
-    '''
-    Very specific to the zeeguu_api system.
-    Tests if a module belongs to the zeeguu_api system or if
-    it is an external dependency.
-
-    Parameters
-    ----------
-    full_module_name : string
-        Full module name.
-
-    Returns
-    -------
-    bool
-        Returns true if the module belongs to zeeguu_api.
-        Returns false if not (i.e., it is an external package)
-    '''
-    if module_contains_module("zeeguu", full_module_name):
-        return True
-    if module_contains_module("tools", full_module_name):
-        return True
-    if full_module_name in ["env_var_defs_default", "setup", "tools", "zeeguu", "zeeguu_api_dev"]:
-        return True
-    return False
-
-
-def is_significant_external_module(full_module_name):
-    '''
-    Very specific to the report.
-    Tests if an external package is significant
-    (i.e., do we want to display it in our graph plots?)
-
-    Parameters
-    ----------
-    full_module_name : string
-        Full module name.
-
-    Returns
-    -------
-    bool
-        Returns true if the module is significant.
-    '''
-    significant_external_modules = ["apimux",
-                           "bs4",
-                           "elasticsearch",
-                           "feedparser",
-                           "feed_retrieval",
-                           "flask",
-#                           "flask_cors",
-#                           "flask_monitoringdashboard",
-                           "flask_sqlalchemy",
-                           "langdetect",
-                           "MySQLdb",
-                           "newspaper",
-                           "nltk",
-                           "python_translators",
-                           "requests",
-                           "sqlalchemy",
-                           "urllib",
-                           "wordstats"]
-    top_module_name = top_level_module(full_module_name)
-    return top_module_name in significant_external_modules
-
-def is_significant_external_top_level_module(full_module_name):
-    return module_level(full_module_name) == 1 and is_significant_external_module(full_module_name)
-
-'''
-    The remainder of this file is not used for the report.
-    It contains experiments that where ultimately not used.
-'''
-'''
-# from AAAST import AAAST
-
-# def bottom_level_module(module_name, depth=1):
-#     components = module_name.split(".")
-#     return ".".join(components[-depth:])
-
-# # Get a list of all python modules in the system
-# def get_all_modules():
-#     modules = []
-#     for file in AAFileSystem.all_file_paths(".py"):
-#         modules.append(ModuleInfo(file))
-#     return modules
-
-# # Print the module info for all the given modules
-# def dump_modules(modules):
-#     for module in modules:
-#         module.dump()
-# # Print the full_name for all the given modules        
-# def dump_module_names(modules):
-#     for module in modules:
-#         print(module.full_name)
-
-# def lookup_module(modules, local_name):
-#     return next(module for module in modules if module.local_name == local_name)
-
-# def dump_raw_rest_api_data(modules):
-#     for module in modules:
-#         if module.rest_api_routes:
-#             print(module.full_name)
-#             for rest_api_route in module.rest_api_routes:
-#                 print(rest_api_route)
-
-# def dump_rest_routes(modules):
-#     post_routes = []
-#     get_routes = []
-#     for module in modules:
-#         for rest_api_route in module.rest_api_routes:
-#             if rest_api_route[0] == "POST":
-#                 post_routes.append(rest_api_route[1])
-#             if rest_api_route[0] == "GET":
-#                 get_routes.append(rest_api_route[1])
-#     print("Rest API GET:")
-#     for route in get_routes:
-#         print(route)
-#     print("Rest API POST:")
-#     for route in post_routes:
-#         print(route)
-
-# # Class for collection metadata for a module in the system
-# class ModuleInfo:
-#     def __init__(self, full_path):
-#         self.full_path = str(full_path)
-#         self.full_name = module_name_from_file_path(self.full_path)
-#         self.toplevel_module = top_level_module(self.full_name)
-#         self.local_name = bottom_level_module(self.full_name)
-#         module_node = AAAST.get_ast_for_file(full_path)
-#         self.imports = AAAST.get_imports(module_node)
-#         self.rest_api_routes = AAAST.get_rest_api(module_node)
-#         self.churn = 0 # not calculated yet
-        
-#     def dump(self):
-#         print("Module: " + self.full_name + " [" + self.full_path + "] toplevel: " + self.toplevel_module)
-'''
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Mostly utility functions to analyze the module hierarchy from the module names.
+    Originally collected more information about the modules, but most have moved to AModuleTree.py.
+    Names that are in AASymbols.SYMBOLS (i.e., all names in the module trees) are
+    answered from AASymbols.MODULE_INDEX. Other names are split as strings.
+"""
+
+from AAFileSystem import AAFileSystem
+from AASymbols import AASymbols
+
+ 
+def module_name_from_file_path(full_path):
+    '''
+    Extract a module name from a file name
+    E.g., ../zeeguu_core/model/user.py -> zeeguu_core.model.user
+
+    Parameters
+    ----------
+    full_path : string
+        full file system path of the py file.
+
+    Returns
+    -------
+    string
+        Full module name for the file.
+    '''
+    return module_name_from_relative_path(full_path[len(AAFileSystem.CODE_ROOT_FOLDER):]) # remove root part of the path
+
+
+def module_name_from_relative_path(relative_path):
+    '''
+    Extract a module name from a file path relative to the root of the target system.
+    E.g., zeeguu_core/model/user.py -> zeeguu_core.model.user
+    Accepts both / (e.g., paths in a git tree) and \\ as separators.
+
+    Parameters
+    ----------
+    relative_path : string
+        Path of the py file relative to the target system root.
+
+    Returns
+    -------
+    string
+        Full module name for the file.
+    '''
+    file_name = relative_path.replace("\\", "/")
+    if file_name.endswith("/__init__.py"): # __init__.py defines a package. The name is the folder name.
+        file_name = file_name[:-len("/__init__.py")]
+    elif file_name.endswith(".py"):
+        file_name = file_name[:-len(".py")]
+    return file_name.replace("/", ".")
+
+
+# extracts the parent of depth X 
+def top_level_module(module_name, depth=1):
+    '''
+    Extracts the name of a parent of a module
+
+    Parameters
+    ----------
+    module_name : string
+        full module name of the module.
+    depth : number, optional
+        The level of the parent. Use 1 for the top level, 2 for the second level,
+        etc. The default is 1.
+
+    Returns
+    -------
+    string
+        Full module name of the parent.
+    '''
+    module_id = AASymbols.SYMBOLS.lookup(module_name)
+    if module_id is not None and depth >= 1:
+        return AASymbols.SYMBOLS.names[AASymbols.MODULE_INDEX.ancestor(module_id, depth)]
+    components = module_name.split(".")
+    return ".".join(components[:depth])
+
+
+def module_contains_module(module_name1, module_name2):
+    '''
+    Test if one module is parent to another module based on their names.
+
+    Parameters
+    ----------
+    module_name1 : string
+        Full module name of the potential parent module.
+    module_name2 : string
+        Full module name of the potential child module.
+
+    Returns
+    -------
+    bool
+        Returns true if module 1 is parent to module 2.
+        Note a module is not considered to containt itself.
+    '''
+    if module_name1 == module_name2:
+        return False
+    symbol_ids = AASymbols.SYMBOLS.ids
+    module_id2 = symbol_ids.get(module_name2)
+    if module_id2 is not None:
+        index = AASymbols.MODULE_INDEX
+        if index.ordered != len(symbol_ids):
+            index.refresh_intervals() # adds the parents of module 2 to the table
+        module_id1 = symbol_ids.get(module_name1)
+        return module_id1 is not None and index.enter[module_id1] <= index.enter[module_id2] <= index.exit[module_id1]
+    components1 = module_name1.split(".")
+    module2_truncated_name = top_level_module(module_name2, len(components1))
+    return module_name1 == module2_truncated_name
+
+
+def any_module_contains_module(module_name_list, module_name):
+    '''
+    Test if any of the modules in a list of modules contain a specified module.
+
+    Parameters
+    ----------
+    module_name_list : list of strings
+        A list full module names of the potiential parent modules.
+    module_name : string
+        Full module name of the potential child module
+
+    Returns
+    -------
+    bool
+        Returns true if any of the modules in the list is parent to module 2.
+        Note a module is not considered to containt itself.
+    '''
+    return compiled_matcher(module_name_list).contains_module(module_name)
+
+
+def module_is_direct_sub_module(parent_module_full_name, candidate_module_full_name):
+    '''
+    Test if a module is a direct parent of another module
+
+    Parameters
+    ----------
+    module_name1 : string
+        Full module name of the potential parent module.
+    module_name2 : string
+        Full module name of the potential child module.
+
+    Returns
+    -------
+    bool
+        Returns true if module 1 is the immediate parent to module 2.
+    '''
+    if module_contains_module(parent_module_full_name, candidate_module_full_name):
+        if relative_module_level(parent_module_full_name, candidate_module_full_name) == 1:
+            return True
+    return False
+
+
+def module_level(full_module_name):
+    '''
+    Returns the level of a module in the module hiearchy based on its name.
+
+    Parameters
+    ----------
+    full_module_name : string
+        Full module name
+
+    Returns
+    -------
+    int
+        E.g. the level of 'zeeguu' is 1.
+        The level of 'zeeguu.core' is 2.
+    '''
+    module_id = AASymbols.SYMBOLS.lookup(full_module_name)
+    if module_id is not None:
+        return AASymbols.MODULE_INDEX.level(module_id)
+    components = full_module_name.split(".")
+    return len(components)    
+
+
+def relative_module_level(module_name1, module_name2):
+    '''
+    Calculate how far module 2 is below module 1 in the module hierachy.
+
+    Parameters
+    ----------
+    module_name1 : string
+        Full module name.
+    module_name2 : string
+        Full module name.
+
+    Returns
+    -------
+    int
+        0 if the modules are identical
+        -1 if module 1 is not parent to module 2.
+        Otherwise the number of levels module 2 is below module 1
+    '''
+    if module_name1 == module_name2:
+        return 0
+    if not module_contains_module(module_name1, module_name2):
+        return -1
+    symbol_ids = AASymbols.SYMBOLS.ids
+    if module_name2 in symbol_ids: # then module 1 is in the table too
+        depth = AASymbols.MODULE_INDEX.depth
+        return depth[symbol_ids[module_name2]] - depth[symbol_ids[module_name1]]
+    return module_level(module_name2) - module_level(module_name1)
+
+
+MATCH_MODULE_TAG = "__match_module__"
+MATCH_SUB_MODULES_TAG = "__match_sub_modules__"
+
+'''
+    Class for matching module names against a fixed set of modules.
+    The modules are compiled into a tree of name components, so a query walks
+    the components of one name instead of testing every module in the set.
+'''
+class ModuleMatcher:
+    def __init__(self, module_names=(), parent_modules=()):
+        '''
+        Parameters
+        ----------
+        module_names : iterable of string, optional
+            Full module names that match themselves. The default is ().
+        parent_modules : iterable of string, optional
+            Full module names whose sub modules match (not the modules themselves,
+            like module_contains_module). The default is ().
+        '''
+        self.tree = {}
+        for full_module_name in module_names:
+            self.add(full_module_name, MATCH_MODULE_TAG)
+        for full_module_name in parent_modules:
+            self.add(full_module_name, MATCH_SUB_MODULES_TAG)
+
+    def add(self, full_module_name, tag):
+        node = self.tree
+        for component in full_module_name.split("."):
+            node = node.setdefault(component, {})
+        node[tag] = True
+
+    def find(self, full_module_name):
+        '''
+        Helper function for the queries.
+        Walk the components of a name.
+
+        Returns
+        -------
+        (bool, dict)
+            True if one of the parent modules contains the module, and the
+            node of the module itself (None if it is not in the tree).
+        '''
+        node = self.tree
+        contained = False
+        components = full_module_name.split(".")
+        for component in components[:-1]:
+            node = node.get(component)
+            if node is None:
+                return contained, None
+            if MATCH_SUB_MODULES_TAG in node:
+                # Keep walking, the module itself may be one of module_names too
+                contained = True
+        return contained, node.get(components[-1])
+
+    def has_module(self, full_module_name):
+        '''
+        Test if a name is one of module_names.
+        '''
+        node = self.find(full_module_name)[1]
+        return node is not None and MATCH_MODULE_TAG in node
+
+    def contains_module(self, full_module_name):
+        '''
+        Test if one of parent_modules contains a module.
+        Note a module is not considered to containt itself.
+        '''
+        return self.find(full_module_name)[0]
+
+    def matches(self, full_module_name):
+        '''
+        Test if a name is one of module_names or is contained by one of parent_modules.
+        '''
+        contained, node = self.find(full_module_name)
+        return contained or (node is not None and MATCH_MODULE_TAG in node)
+
+
+# Matchers for the module lists passed to any_module_contains_module
+compiled_matchers = {}
+
+def compiled_matcher(parent_modules):
+    '''
+    Get a ModuleMatcher for a list of parent modules, compiled on first use.
+
+    Parameters
+    ----------
+    parent_modules : iterable of string
+        Full module names.
+
+    Returns
+    -------
+    ModuleMatcher
+    '''
+    key = tuple(parent_modules)
+    matcher = compiled_matchers.get(key)
+    if matcher is None:
+        matcher = compiled_matchers[key] = ModuleMatcher(parent_modules=key)
+    return matcher
+
+
+ZEEGUU_API_MODULES = ModuleMatcher(module_names=["env_var_defs_default", "setup", "tools", "zeeguu", "zeeguu_api_dev"],
+                                   parent_modules=["zeeguu", "tools"])
+
+SIGNIFICANT_EXTERNAL_MODULE_NAMES = ["apimux",
+                                     "bs4",
+                                     "elasticsearch",
+                                     "feedparser",
+                                     "feed_retrieval",
+                                     "flask",
+#                                     "flask_cors",
+#                                     "flask_monitoringdashboard",
+                                     "flask_sqlalchemy",
+                                     "langdetect",
+                                     "MySQLdb",
+                                     "newspaper",
+                                     "nltk",
+                                     "python_translators",
+                                     "requests",
+                                     "sqlalchemy",
+                                     "urllib",
+                                     "wordstats"]
+# The packages and everything in them
+SIGNIFICANT_EXTERNAL_MODULES = ModuleMatcher(module_names=SIGNIFICANT_EXTERNAL_MODULE_NAMES, parent_modules=SIGNIFICANT_EXTERNAL_MODULE_NAMES)
+
+def module_belongs_to_zeeguu_api(full_module_name):
+    '''
+    Very specific to the zeeguu_api system.
+    Tests if a module belongs to the zeeguu_api system or if
+    it is an external dependency.
+
+    Parameters
+    ----------
+    full_module_name : string
+        Full module name.
+
+    Returns
+    -------
+    bool
+        Returns true if the module belongs to zeeguu_api.
+        Returns false if not (i.e., it is an external package)
+    '''
+    return ZEEGUU_API_MODULES.matches(full_module_name)
+
+
+def is_significant_external_module(full_module_name):
+    '''
+    Very specific to the report.
+    Tests if an external package is significant
+    (i.e., do we want to display it in our graph plots?)
+
+    Parameters
+    ----------
+    full_module_name : string
+        Full module name.
+
+    Returns
+    -------
+    bool
+        Returns true if the module is significant.
+    '''
+    return SIGNIFICANT_EXTERNAL_MODULES.matches(full_module_name)
+
+def is_significant_external_top_level_module(full_module_name):
+    return SIGNIFICANT_EXTERNAL_MODULES.has_module(full_module_name) # the significant packages are all top level
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    assert 'zeeguu_core.model.user' == module_name_from_file_path(AAFileSystem.file_path('zeeguu_core\\model\\user.py'))
+    assert 'zeeguu_core.model' == module_name_from_file_path(AAFileSystem.file_path('zeeguu_core\\model\\__init__.py'))
+    assert 'zeeguu_core.model.user' == module_name_from_relative_path('zeeguu_core/model/user.py')
+    assert 'zeeguu_core.model' == module_name_from_relative_path('zeeguu_core\\model\\__init__.py')
+    assert (top_level_module("zeeguu_core.model.util") == "zeeguu_core")
+    assert (top_level_module("zeeguu_core.model.util", 2) == "zeeguu_core.model")
+    assert module_contains_module("zeeguu_core.model", "zeeguu_core.model.user")
+    assert module_contains_module("zeeguu_core.model", "zeeguu_core.model.user.x")
+    assert not module_contains_module("zeeguu_core_model", "zeeguu_core_model")
+    assert not module_contains_module("zeeguu_core.model.user", "zeeguu_core.model")
+    assert not module_contains_module("zeeguu_core.model", "zeeguu_core.model2.user")
+    assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.model.x")
+    assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user.x")
+    assert any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user.x.y")
+    assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core.user")
+    assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu_core")
+    assert not any_module_contains_module(["zeeguu_core.model", "zeeguu_core.user"], "zeeguu.user.x")
+    assert relative_module_level("zeeguu_core", "zeeguu_core") == 0
+    assert relative_module_level("zeeguu_core", "zeeguu_core.model") == 1
+    assert relative_module_level("zeeguu_core", "zeeguu_core.model.user") == 2
+    assert relative_module_level("zeeguu_core.model.user", "zeeguu_core") == -1
+    assert relative_module_level("zeeguu_core.model.x", "zeeguu_core.model.y") == -1
+    matcher = ModuleMatcher(module_names=["zeeguu_core.model", "flask"], parent_modules=["zeeguu_core.user", "flask"])
+    assert matcher.has_module("zeeguu_core.model") and not matcher.has_module("zeeguu_core.model.x")
+    assert matcher.contains_module("zeeguu_core.user.x.y") and not matcher.contains_module("zeeguu_core.user")
+    assert matcher.matches("flask") and matcher.matches("flask.app") and matcher.matches("zeeguu_core.model")
+    assert not matcher.matches("zeeguu_core") and not matcher.matches("flask_cors") and not matcher.matches("zeeguu_core.model.x")
+    matcher = ModuleMatcher(["zeeguu.core", "zeeguu.core.model"], ["zeeguu.core"]) # a module under a parent module
+    assert matcher.has_module("zeeguu.core.model") and matcher.contains_module("zeeguu.core.model") and matcher.has_module("zeeguu.core")
+    assert module_belongs_to_zeeguu_api("zeeguu.core.model") and module_belongs_to_zeeguu_api("tools") and not module_belongs_to_zeeguu_api("zeeguu_core")
+    assert is_significant_external_module("sqlalchemy.orm") and not is_significant_external_top_level_module("sqlalchemy.orm")
+
+
+'''
+    The remainder of this file is not used for the report.
+    It contains experiments that where ultimately not used.
+'''
+'''
+# from AAAST import AAAST
+
+# def bottom_level_module(module_name, depth=1):
+#     components = module_name.split(".")
+#     return ".".join(components[-depth:])
+
+# # Get a list of all python modules in the system
+# def get_all_modules():
+#     modules = []
+#     for file in AAFileSystem.all_file_paths(".py"):
+#         modules.append(ModuleInfo(file))
+#     return modules
+
+# # Print the module info for all the given modules
+# def dump_modules(modules):
+#     for module in modules:
+#         module.dump()
+# # Print the full_name for all the given modules        
+# def dump_module_names(modules):
+#     for module in modules:
+#         print(module.full_name)
+
+# def lookup_module(modules, local_name):
+#     return next(module for module in modules if module.local_name == local_name)
+
+# def dump_raw_rest_api_data(modules):
+#     for module in modules:
+#         if module.rest_api_routes:
+#             print(module.full_name)
+#             for rest_api_route in module.rest_api_routes:
+#                 print(rest_api_route)
+
+# def dump_rest_routes(modules):
+#     post_routes = []
+#     get_routes = []
+#     for module in modules:
+#         for rest_api_route in module.rest_api_routes:
+#             if rest_api_route[0] == "POST":
+#                 post_routes.append(rest_api_route[1])
+#             if rest_api_route[0] == "GET":
+#                 get_routes.append(rest_api_route[1])
+#     print("Rest API GET:")
+#     for route in get_routes:
+#         print(route)
+#     print("Rest API POST:")
+#     for route in post_routes:
+#         print(route)
+
+# # Class for collection metadata for a module in the system
+# class ModuleInfo:
+#     def __init__(self, full_path):
+#         self.full_path = str(full_path)
+#         self.full_name = module_name_from_file_path(self.full_path)
+#         self.toplevel_module = top_level_module(self.full_name)
+#         self.local_name = bottom_level_module(self.full_name)
+#         module_node = AAAST.get_ast_for_file(full_path)
+#         self.imports = AAAST.get_imports(module_node)
+#         self.rest_api_routes = AAAST.get_rest_api(module_node)
+#         self.churn = 0 # not calculated yet
+        
+#     def dump(self):
+#         print("Module: " + self.full_name + " [" + self.full_path + "] toplevel: " + self.toplevel_module)
+'''
@@ -1,548 +1,1294 @@
-# -*- coding: utf-8 -*-
-'''
-Purpose:
-    Functions for constructing and operating on two collections
-    of trees describing the modules in the analyzed program
-    and their import dependencies.
-    One collection describes the modules in the program itself
-    The other collection describes the external packages that
-    the program depends on.
-    
-    Each collection looks like this:
-        {
-            ("__module_description__", ModuleDescription<zeeguu>),
-            ("zeeguu.api",
-                 {
-                     ("__module_description__", ModuleDescription<zeeguu.api>),
-                     ("zeeguu.api.api",
-                          {
-                              ("__module_description__", ModuleDescription<zeeguu.api.api>),
-                              ...
-                          }
-                     ("zeeguu.api.test",
-                          {
-                              ("__module_description__", ModuleDescription<zeeguu.test>),
-                              ...
-                          }
-                     )                    
-                  }
-             ),
-             ("zeeguu.core",
-                  {
-                      ...
-                  }
-             ),
-             ...
-        }
-'''
-
-from AAModule import AAModule
-from AAFileSystem import AAFileSystem
-from AAAST import AAAST
-import copy
-
-MODULE_DESCRIPTION_TAG = "__module_description__"
-
-def init_tree_collection():
-    '''
-    Analyzes the folder and file structure of the target system
-
-    Returns
-    -------
-    roots : collection of trees describing modules of the analyzed system
-        and their import dependencies
-    external_module_roots : collection of trees describing external packages
-        imported by the analyzed system.
-    '''
-    roots = build_tree()
-    external_module_roots = {}
-    build_external_module_tree(roots, external_module_roots)
-    return roots, external_module_roots
-
-def get_all_module_descriptions():
-    '''
-    Traverses the folders and files of the target system and creates
-    a ModuleDescription object for each py-file.        
-
-    Returns
-    -------
-    modules : list of ModuleDescription
-
-    '''
-    modules = []
-    for file in AAFileSystem.all_file_paths(".py"):
-        modules.append(ModuleDescription(file))
-    return modules
-
-
-def build_tree():
-    '''
-    Create a collection of trees describing the modules that are part of the
-    target system.    
-    
-    Returns
-    -------
-    roots : collection of trees
-
-    '''
-    modules = get_all_module_descriptions()
-    roots = {}
-    for module_description in modules:
-        components = module_description.full_name.split(".")
-        module_collection = roots
-        for component in components:
-            module_collection = module_collection.setdefault(component, {})
-        module_collection.setdefault(MODULE_DESCRIPTION_TAG, module_description)
-    return roots
-
-def add_module_description_to_roots(module_description, roots):
-    '''
-    Add a module description to the "roots" collection of trees.
-    The module full name is used a path in the appropriate tree,
-    and the module_description is inserted as a value with the key MODULE_DESCRIPTION_TAG
-    at the end of the path.
-
-    Parameters
-    ----------
-    module_description : ModuleDescription
-    roots : collection of trees
-
-    Returns
-    -------
-    Modifies roots
-    '''
-    components = module_description.full_name.split(".")
-    module_collection = roots
-    for component in components:
-        module_collection = module_collection.setdefault(component, {})
-    module_collection.setdefault(MODULE_DESCRIPTION_TAG, module_description)
-
-def build_external_module_tree(roots, external_module_roots):
-    '''
-    Construct a collection of trees describing the external packages
-    imported by the modules in the target system.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Describes the target system.
-    external_module_roots : collection of trees
-        Must be empty. Returns a description of the external packages.
-
-    Returns
-    -------
-    External packages returned in external_module_roots.
-
-    '''
-    for module_description in traverse_modules(roots):
-        for imported_module_full_name in module_description.imports:
-            imported_module_description = get_module_description(roots, imported_module_full_name)
-            if imported_module_description == None:
-                # Ah, an external module
-                imported_module_description = get_module_description(external_module_roots, imported_module_full_name)
-                if imported_module_description == None:
-                    # Add a new external module description.
-                    imported_module_description = ModuleDescription()
-                    imported_module_description.set_as_external(imported_module_full_name)
-                    add_module_description_to_roots(imported_module_description, external_module_roots)
-            
-
-def get_module_description(roots, module_full_name):
-    '''
-    Find the ModuleDescription for module_full_name in the "roots" collection of trees
-    We allow "partial finds", in case module_full_name references something inside a py file,
-    or a module that has been folded into a parent.
-    
-    Parameters
-    ----------
-    roots : collection of trees
-        Can be either the system collection or the external collection
-    module_full_name : string
-        Full name of the module to find.
-
-    Returns
-    -------
-    ModuleDescription object for the module searched for. Or None if not found.
-    '''
-    module_collection = roots
-    components = module_full_name.split(".")
-    for component in components:
-        value = module_collection.get(component)
-        if value == None:
-            # We might be referencing something from within a py file. Try to return the module_description for the py file instead.
-            # Or we might be referencing a module that have been folded into a parent. So we try to return the parent module_description.
-            return module_collection.get(MODULE_DESCRIPTION_TAG)
-        module_collection = value
-    return module_collection.get(MODULE_DESCRIPTION_TAG) # Either it exists or we return None.
-
-def traverse_modules(roots):
-    '''
-    Generator for traversing a collection of module trees.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Can be either the system collection or the external collection.
-
-    Yields
-    ------
-    Next ModuleDescription object from the collection of trees
-    '''
-    for module_name, value in roots.items():
-        if module_name == MODULE_DESCRIPTION_TAG:
-            yield value
-        else:
-            yield from traverse_modules(value)
-
-def fold_modules(roots, external_module_roots, fold_predicate):
-    '''
-    Fold modules into their parent modules.
-    The parent module assimilates all imports from the folded
-    submodules.
-    All imports to folded modules are pruned to point to the parent
-    module instead.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Description of the target system modules
-    external_module_roots : collection of trees
-        Description of the external packages
-    fold_predicate : function that takes a string argument and returns bool
-        Input is a full module name. Output must be true for sub-modules
-        that are to be folded into their parents.
-
-    Returns
-    -------
-    Two collection of trees:
-        The new description of the target system modules
-        The new description of the external packages
-    '''
-    folded_roots = fold_modules_recursive(roots, "", fold_predicate)
-    folded_external_module_roots = fold_modules_recursive(external_module_roots, "", fold_predicate)
-    prune_imports(folded_roots, folded_external_module_roots)
-    return folded_roots, folded_external_module_roots
-
-def fold_modules_recursive(module_collection, parent_module_name, fold_predicate):
-    '''
-    Helper function for fold_modules.
-    Processes one level of a collection of trees. I.e. one collection.
-    Recursive calls itself for collection members of the collection.
-
-    Parameters
-    ----------
-    module_collection : collection of trees
-        One level of a collection of trees. Describes a module with children.
-    parent_module_name : string
-        Full module name of the parent module for the module collection.
-    fold_predicate : function that takes a string argument and returns bool
-        Input is a full module name. Output must be true for sub-modules
-        that are to be folded into their parents.
-
-    Returns
-    -------
-    folded_collection : collection of trees
-        A folded version of module_collection
-    '''
-    folded_collection = {}
-    module_description = None
-    # identify module description if any:
-    for module_name, value in module_collection.items():
-        if module_name == MODULE_DESCRIPTION_TAG:
-            module_description = copy.copy(value)  # Copy to avoid changing the original module description
-            folded_collection[module_name] = module_description
-    # fold what must be folded
-    for module_name, value in module_collection.items():
-        if module_name != MODULE_DESCRIPTION_TAG:
-            module_name_prefix = parent_module_name
-            if module_name_prefix:
-                module_name_prefix = module_name_prefix + "."
-            full_module_name = module_name_prefix + module_name
-            if fold_predicate(full_module_name):
-                # don't add folded collection. Insted collect the imports and add them to the parent.
-                if module_description != None:
-                    folded_imports = collect_folded_imports(value)
-                    combined_imports = module_description.imports.union(folded_imports)
-                    cleaned_imports = discard_folded_modules(combined_imports, parent_module_name) # avoid self-dependency on the folded module
-                    module_description.imports = cleaned_imports
-            else:
-                folded_collection[module_name] = fold_modules_recursive(value, full_module_name, fold_predicate) # value is a sub-collection. Recursively process this.
-
-    return folded_collection
-
-def collect_folded_imports(module_collection):
-    '''
-    Recursive helper function for fold_modules_recursive
-    Collects the imports of all modules in a collection of trees, including those
-    in the sub modules.
-
-    Parameters
-    ----------
-    module_collection : collection of trees
-        One level of a collection of trees. Describes a module with children.
-
-    Returns
-    -------
-    folded_imports : list of string
-        A list of all the collected imports.
-    '''
-    folded_imports = set()
-    for module_name, value in module_collection.items():
-        if module_name == MODULE_DESCRIPTION_TAG:
-            folded_imports = folded_imports.union(value.imports)
-        else:
-            folded_imports = folded_imports.union(collect_folded_imports(value)) # recursively process sub-collection
-    return folded_imports
-
-def discard_folded_modules(module_full_name_collection, folded_parent_module_full_name):
-    '''
-    Helper function for fold_modules_recursive
-    Removes all imports to the folded sub modules from a collection of module
-    names.
-
-    Parameters
-    ----------
-    module_full_name_collection : list of string
-        List of full module names
-    folded_parent_module_full_name : string
-        Full module name of the parent module for the folded sub modules
-
-    Returns
-    -------
-    result : list of string
-        Resulting list with the module names of the sub modules that have been
-        folded removed.
-    '''
-    result = set()
-    for full_module_name in module_full_name_collection:
-        if not AAModule.module_contains_module(folded_parent_module_full_name, full_module_name):
-            result.add(full_module_name)
-    result.discard(folded_parent_module_full_name) # module_contains_module does not detect the parent itself
-    return result
-
-def filter_modules(roots, external_module_roots, keep_predicate):
-    '''
-    Remove the ModuleDescriptions for modules specified by a predicate.
-    Also remove imports to them.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Description of the target system modules
-    external_module_roots : collection of trees
-        Description of the external packages
-    keep_predicate : function that takes a string argument and returns bool
-        Input is a full module name. Output must be true for modules
-        that are NOT to be removed.
-
-    Returns
-    -------
-    Two collection of trees:
-        The new description of the target system modules
-        The new description of the external packages
-    '''
-    filtered_roots = filter_modules_recursive(roots, "", keep_predicate)
-    filtered_external_module_roots = filter_modules_recursive(external_module_roots, "", keep_predicate)
-    prune_imports(filtered_roots, filtered_external_module_roots)
-    return filtered_roots, filtered_external_module_roots
-
-def filter_modules_recursive(roots, parent_module_name, keep_predicate):
-    '''
-    Helper function for filter_modules.
-    Processes one level of a collection of trees. I.e. one collection.
-    Recursive calls itself for collection members of the collection.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        One level of a collection of trees. Describes a module with children.
-    parent_module_name : string
-        Full module name of the parent module for the module collection.
-    keep_predicate : function that takes a string argument and returns bool
-        Input is a full module name. Output must be true for sub-modules
-        that are to NOT be removed
-
-    Returns
-    -------
-        A filtered version of module_collection
-    '''
-    result = {}
-    for module_name, value in roots.items():
-        if module_name == MODULE_DESCRIPTION_TAG:
-            module_description = copy.copy(value)  # Copy to avoid changing the original module description
-            module_description.imports = filter_module_collection(module_description.imports, keep_predicate)
-            result[MODULE_DESCRIPTION_TAG] = value
-        else:
-            module_name_prefix = parent_module_name
-            if module_name_prefix:
-                module_name_prefix = module_name_prefix + "."
-            full_module_name = module_name_prefix + module_name
-            if not keep_predicate(full_module_name):
-                value = copy.copy(value) # we do not want to modify the input. Shallow copy is intended.
-                value.pop(MODULE_DESCRIPTION_TAG, None) # remove the module description if it exists. Keep doing recursive processing in case we want to keep a sub module.
-            result[module_name] = filter_modules_recursive(value, full_module_name, keep_predicate)
-    return result
-
-
-def filter_module_collection(module_collection, keep_predicate):
-    '''
-    Helper function for filter_modules_recursive
-    Filter a list of module names
-
-    Parameters
-    ----------
-    module_collection : list of string
-        List of full module names
-    keep_predicate : function that takes a string argument and returns bool
-        Input is a full module name. Output must be true for module names
-        that are to NOT be removed
-
-    Returns
-    -------
-    result : list of string
-        The resulting filtered list.
-    '''
-    result = []
-    for full_module_name in module_collection:
-        if keep_predicate(full_module_name):
-            result.append(full_module_name)
-    return result
-assert filter_module_collection(["1", "2", "3"], lambda str : str == "2") == ["2"]
-
-
-# Prune the imports for all module_descriptions to account for module folding, module filtering and for
-# imports of objects inside py files.
-def prune_imports(roots, imported_module_roots):
-    '''
-    Helper function for fold_modules and filter_modules
-    Prune the imports for all module_descriptions to account for module folding, module filtering and for
-    imports of objects inside py files.
-    Note: modifies the input.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Description of the target system modules
-    external_module_roots : collection of trees
-        Description of the external packages
-
-    Returns
-    -------
-    Modifies the imports member of the ModuleDescriptions in roots and external_module_roots.
-    '''
-    prune_imports_in_collection(roots, roots, imported_module_roots)
-    prune_imports_in_collection(imported_module_roots, roots, imported_module_roots)
-
-def prune_imports_in_collection(module_collection, roots, imported_module_roots):
-    '''
-    Helper function for prune_imports
-    Prunes the imports in a collection of trees
-
-    Parameters
-    ----------
-    module_collection : collection of trees
-        The description to prune, either the target system
-        description or the imported packages description.
-    roots : collection of trees
-        Description of the target system modules
-    external_module_roots : collection of trees
-        Description of the external packages
-
-    Returns
-    -------
-    Modifies the imports member of the ModuleDescriptions in module_collection.
-    Note: if module_collection aliases either roorts or external_module_roots,
-    the alias is modified also.
-    '''
-    for module_description in traverse_modules(module_collection):
-        new_imports = []
-        for module_import_full_name in module_description.imports:
-            # lookup the name in roots and imported_module_roots. If found, keep it. Note that
-            # the module found might have a truncated name (see get_module_description). This is desired.
-            import_module_description = get_module_description(roots, module_import_full_name)
-            if import_module_description:
-                new_imports.append(import_module_description.full_name)
-            else:
-                import_module_description = get_module_description(imported_module_roots, module_import_full_name)
-                if import_module_description:
-                    new_imports.append(import_module_description.full_name)
-        module_description.imports = new_imports
-        
-def is_module_referenced(roots, full_module_name):
-    '''
-    Test if a module is imported by any modules in a collection of trees.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        E.g., either the target system description or the imported packages description.
-    full_module_name : string
-        Full module name of the module to find a reference to
-
-    Returns
-    -------
-    bool
-        Returns true if at least one module in roots imports the specified module.
-    '''
-    for module_description in traverse_modules(roots):
-        for imported_module_full_name in module_description.imports:
-            if imported_module_full_name == full_module_name:
-                return True
-    return False
-    
-# Note: modifies roots
-def stript_external_imports(roots, modules_to_strip):
-    '''
-    Remove imports to modules not in the Zeeguu system.
-
-    Parameters
-    ----------
-    roots : collection of trees
-        Only makes sense for the description of the target system
-    modules_to_strip : list of strings
-        Full module names for the modules to strip external imports from.
-
-    Returns
-    -------
-    Modifies the imports member of the ModuleDescriptions in roots.
-    '''
-    for full_module_name in modules_to_strip:
-        module_description = get_module_description(roots, full_module_name)
-        if not module_description:
-            print("stript_external_imports: failed to find module_description for: " + full_module_name)
-        if module_description:
-            new_imports = set()
-            for imported_module in module_description.imports:
-                if AAModule.module_belongs_to_zeeguu_api(imported_module):
-                    new_imports.add(imported_module)
-            module_description.imports = new_imports
-
-
-'''
-    Class for collecting metadata for a module
-'''            
-class ModuleDescription:
-    def __init__(self, full_path=None):
-        if full_path:
-            self.full_path = str(full_path)
-            self.full_name = AAModule.module_name_from_file_path(self.full_path)
-            module_node = AAAST.get_ast_for_file(full_path)
-            self.imports = AAAST.get_imports(module_node)
-        else:
-            self.full_path = ""
-            self.full_name = ""
-            self.local_name = ""
-            self.imports = set()
-    def set_as_external(self, full_name):
-        self.full_name = full_name
-        
-    def dump(self):
-        print("Module: " + self.full_name + " [" + self.full_path + "] local_name: " + self.local_name)
-        print("-- imports: ", end=" ")
-        print(*self.imports)
-
-
-def dump_modules(roots):
-    for module_description in traverse_modules(roots):
-        module_description.dump()
-
+# -*- coding: utf-8 -*-
+'''
+Purpose:
+    Functions for constructing and operating on two collections
+    of trees describing the modules in the analyzed program
+    and their import dependencies.
+    One collection describes the modules in the program itself
+    The other collection describes the external packages that
+    the program depends on.
+    
+    Each collection looks like this:
+        {
+            ("__module_description__", ModuleDescription<zeeguu>),
+            ("zeeguu.api",
+                 {
+                     ("__module_description__", ModuleDescription<zeeguu.api>),
+                     ("zeeguu.api.api",
+                          {
+                              ("__module_description__", ModuleDescription<zeeguu.api.api>),
+                              ...
+                          }
+                     ("zeeguu.api.test",
+                          {
+                              ("__module_description__", ModuleDescription<zeeguu.test>),
+                              ...
+                          }
+                     )                    
+                  }
+             ),
+             ("zeeguu.core",
+                  {
+                      ...
+                  }
+             ),
+             ...
+        }
+
+    The collections made here are ModuleRoots, which also memoize where
+    import names resolve to (see resolve_import). Plain dicts work too,
+    just without the memo.
+
+    The trees made by fold_modules, filter_modules and snapshot share the
+    sub trees and ModuleDescriptions that do not change with the trees they
+    were made from. So shared parts are never changed in place. The functions
+    here that change a ModuleRoots replace the shared parts on the way to the
+    change by copies first (see owned_path).
+'''
+
+from AAModule import AAModule
+from AAFileSystem import AAFileSystem
+from AAIngest import AAIngest
+from AACache import AACache
+from AAGitSource import AAGitSource
+from AASymbols import AASymbols
+import itertools
+import sys
+
+MODULE_DESCRIPTION_TAG = "__module_description__"
+
+# Source of the ModuleRoots versions. Never gives the same version twice.
+VERSIONS = itertools.count(1)
+
+# Files that could not be parsed by the last scan of the target system.
+# Maps the full file path to a description of the error.
+parse_errors = {}
+
+def init_tree_collection(workers=1, cache_path=None, fast_imports=False):
+    '''
+    Analyzes the folder and file structure of the target system
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes used to parse the py-files. None uses one per CPU.
+        See AAIngest.scan_files. The default is 1.
+    cache_path : string, optional
+        File for caching the parse results between runs. See AACache.
+        The default is None (no caching).
+    fast_imports : bool, optional
+        Extract the imports with the fast scanner in AAAST.get_imports_from_source
+        instead of the full AST. The default is False.
+
+    Returns
+    -------
+    roots : collection of trees describing modules of the analyzed system
+        and their import dependencies
+    external_module_roots : collection of trees describing external packages
+        imported by the analyzed system.
+    '''
+    roots = build_tree(workers, cache_path, fast_imports)
+    external_module_roots = ModuleRoots()
+    build_external_module_tree(roots, external_module_roots)
+    return roots, external_module_roots
+
+def init_tree_collection_from_git(repository_path, revision="HEAD", cache_path=None, fast_imports=False):
+    '''
+    Analyzes the py-files of a revision of a git repository, read straight
+    from the git objects. The working tree is not used, so any revision can
+    be analyzed without checking it out.
+
+    Parameters
+    ----------
+    repository_path : string
+        Folder of a local git repository of the target system.
+    revision : string, optional
+        Any revision git understands, e.g., a commit hash, branch or tag.
+        The default is "HEAD".
+    cache_path : string, optional
+        File for caching the parse results between runs. The cache is keyed by
+        the git blob hashes, so files that are unchanged between revisions
+        are only parsed once. The default is None (no caching).
+    fast_imports : bool, optional
+        Extract the imports with AAAST.get_imports_from_source. The default is False.
+
+    Returns
+    -------
+    roots : collection of trees describing modules of the analyzed revision
+        and their import dependencies
+    external_module_roots : collection of trees describing external packages
+        imported by the analyzed revision.
+    '''
+    parse_errors.clear()
+    cache = AACache.ParseCache(cache_path, fast_imports) if cache_path else None
+    modules = []
+    for scan in AAGitSource.scan_revision(repository_path, revision, cache, fast_imports):
+        if scan["error"]:
+            print("init_tree_collection_from_git: skipping " + scan["full_path"] + ": " + scan["error"])
+            parse_errors[scan["full_path"]] = scan["error"]
+        else:
+            full_name = AAModule.module_name_from_relative_path(scan["relative_path"])
+            modules.append(ModuleDescription(scan["full_path"], scan, full_name))
+    if cache:
+        cache.save()
+    roots = build_tree_from_module_descriptions(modules)
+    external_module_roots = ModuleRoots()
+    build_external_module_tree(roots, external_module_roots)
+    return roots, external_module_roots
+
+def get_all_module_descriptions(workers=1, cache_path=None, fast_imports=False):
+    '''
+    Traverses the folders and files of the target system and creates
+    a ModuleDescription object for each py-file.        
+    Files that cannot be parsed are skipped and recorded in parse_errors.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes used to parse the py-files. None uses one per CPU.
+        See AAIngest.scan_files. The default is 1.
+    cache_path : string, optional
+        File for caching the parse results between runs. Only files that
+        have changed since the last run are parsed. The default is None (no caching).
+    fast_imports : bool, optional
+        Extract the imports with AAAST.get_imports_from_source. The default is False.
+
+    Returns
+    -------
+    modules : list of ModuleDescription
+
+    '''
+    parse_errors.clear()
+    cache = AACache.ParseCache(cache_path, fast_imports) if cache_path else None
+    full_path_order = []
+    scans = {}
+    known_hashes = {}
+
+    def file_paths_to_scan():
+        for file in AAFileSystem.all_file_paths(".py"):
+            full_path = str(file)
+            full_path_order.append(full_path)
+            if cache:
+                scan = cache.lookup(full_path)
+                if scan:
+                    scans[full_path] = scan
+                    continue
+                known_hashes[full_path] = cache.known_hash(full_path)
+            yield full_path
+
+    for scan in AAIngest.scan_files(file_paths_to_scan(), workers, known_hashes=known_hashes, fast_imports=fast_imports):
+        if cache:
+            scan = cache.store(scan)
+        scans[scan["full_path"]] = scan
+    if cache:
+        cache.save()
+
+    modules = []
+    for full_path in full_path_order:
+        scan = scans[full_path]
+        if scan["error"]:
+            print("get_all_module_descriptions: skipping " + full_path + ": " + scan["error"])
+            parse_errors[full_path] = scan["error"]
+        else:
+            modules.append(ModuleDescription(full_path, scan))
+    return modules
+
+
+def build_tree(workers=1, cache_path=None, fast_imports=False):
+    '''
+    Create a collection of trees describing the modules that are part of the
+    target system.    
+    
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes used to parse the py-files. The default is 1.
+    cache_path : string, optional
+        File for caching the parse results between runs. The default is None.
+    fast_imports : bool, optional
+        Extract the imports with AAAST.get_imports_from_source. The default is False.
+
+    Returns
+    -------
+    roots : collection of trees
+
+    '''
+    modules = get_all_module_descriptions(workers, cache_path, fast_imports)
+    return build_tree_from_module_descriptions(modules)
+
+def build_tree_from_module_descriptions(modules):
+    '''
+    Construct a collection of trees from ModuleDescriptions.
+
+    Parameters
+    ----------
+    modules : iterable of ModuleDescription
+
+    Returns
+    -------
+    roots : collection of trees
+
+    '''
+    roots = ModuleRoots()
+    for module_description in modules:
+        add_module_description_to_roots(module_description, roots)
+    rollup_LOC(roots)
+    return roots
+
+def rollup_LOC(module_collection):
+    '''
+    Sum up the LOC of all modules in each sub tree of a collection of trees.
+    The sum is stored as subtree_LOC in the ModuleDescription at the top of
+    each sub tree. It includes the module itself and all its sub modules,
+    also those below folders without a ModuleDescription.
+    The sums follow the ModuleDescriptions into the trees made by
+    fold_modules and filter_modules, so they only need to be computed once.
+
+    Parameters
+    ----------
+    module_collection : collection of trees
+
+    Returns
+    -------
+    int
+        Total LOC of the collection.
+    Sets subtree_LOC in the ModuleDescriptions. Only for trees that are not
+    shared yet, e.g., while building them.
+    '''
+    total = 0
+    for module_name, value in module_collection.items():
+        if module_name != MODULE_DESCRIPTION_TAG:
+            total += rollup_LOC(value)
+    module_description = module_collection.get(MODULE_DESCRIPTION_TAG)
+    if module_description:
+        total += module_description.LOC
+        module_description.subtree_LOC = total
+    return total
+
+def add_to_subtree_LOC(roots, full_module_name, delta):
+    '''
+    Adjust subtree_LOC of a module and all its parents after the LOC of
+    the module changed.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    full_module_name : string
+        Full name of the module whose LOC changed.
+    delta : int
+        Change in LOC.
+
+    Returns
+    -------
+    Modifies the ModuleDescriptions in roots.
+    '''
+    for module_collection in owned_path(roots, full_module_name.split("."))[1:]:
+        module_description = owned_description(roots, module_collection)
+        if module_description:
+            module_description.subtree_LOC += delta
+    new_version(roots)
+
+def get_module_LOC_function(*module_roots):
+    '''
+    Get a weight function for the cumulative LOC of the sub modules of a module.
+    Gives the same numbers as AAFileSystem.module_LOC, but looks them up in
+    the subtree_LOC sums instead of reading all files for each module.
+
+    Parameters
+    ----------
+    *module_roots : collections of trees
+        E.g., a (folded and/or filtered) description of the target system
+        and of the external packages.
+
+    Returns
+    -------
+    Function that takes a full module name and returns the number of lines.
+    '''
+    module_LOC = {}
+    for roots in module_roots:
+        for module_description in traverse_modules(roots):
+            module_LOC[module_description.full_name] = module_description.subtree_LOC - module_description.LOC
+    return lambda full_module_name : module_LOC.get(full_module_name, 0)
+
+def add_module_description_to_roots(module_description, roots):
+    '''
+    Add a module description to the "roots" collection of trees.
+    The module full name is used a path in the appropriate tree,
+    and the module_description is inserted as a value with the key MODULE_DESCRIPTION_TAG
+    at the end of the path.
+
+    Parameters
+    ----------
+    module_description : ModuleDescription
+    roots : collection of trees
+
+    Returns
+    -------
+    Modifies roots
+    '''
+    module_collection = owned_path(roots, module_description.full_name.split("."), create=True)[-1]
+    if module_collection.setdefault(MODULE_DESCRIPTION_TAG, module_description) is module_description:
+        if isinstance(roots, ModuleRoots):
+            roots.owned[id(module_description)] = module_description
+            if roots.importers is not None:
+                add_reverse_imports(roots.importers, module_description.name_id, module_description.import_ids, 1)
+    forget_resolved_imports(roots)
+
+def remove_module_description_from_roots(full_module_name, roots):
+    '''
+    Remove a module description from the "roots" collection of trees.
+    Collections that become empty are removed too.
+
+    Parameters
+    ----------
+    full_module_name : string
+        Full name of the module to remove.
+    roots : collection of trees
+
+    Returns
+    -------
+    The removed ModuleDescription, or None if it was not found.
+    Modifies roots
+    '''
+    components = full_module_name.split(".")
+    path = owned_path(roots, components)
+    if len(path) <= len(components):
+        return None
+    module_description = path[-1].pop(MODULE_DESCRIPTION_TAG, None)
+    owned = roots.owned if isinstance(roots, ModuleRoots) else {}
+    if module_description is not None:
+        owned.pop(id(module_description), None)
+        if isinstance(roots, ModuleRoots) and roots.importers is not None:
+            add_reverse_imports(roots.importers, module_description.name_id, module_description.import_ids, -1)
+    while len(path) > 1 and not path[-1]:
+        owned.pop(id(path.pop()), None)
+        del path[-1][components[len(path) - 1]]
+    forget_resolved_imports(roots)
+    return module_description
+
+def build_external_module_tree(roots, external_module_roots):
+    '''
+    Construct a collection of trees describing the external packages
+    imported by the modules in the target system.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Describes the target system.
+    external_module_roots : collection of trees
+        Must be empty. Returns a description of the external packages.
+
+    Returns
+    -------
+    External packages returned in external_module_roots.
+
+    '''
+    names = AASymbols.SYMBOLS.names
+    external_module_full_names = set()
+    for module_description in traverse_modules(roots):
+        for imported_module_id in module_description.import_ids:
+            if resolve_import(roots, imported_module_id) == None:
+                # Ah, an external module
+                external_module_full_names.add(names[imported_module_id])
+    # Sorted, so that "numpy" is added before "numpy.ndarray" whatever the order of the imports,
+    # and the partial find folds "numpy.ndarray" into it.
+    for imported_module_full_name in sorted(external_module_full_names):
+        if get_module_description(external_module_roots, imported_module_full_name) == None:
+            # Add a new external module description.
+            imported_module_description = ModuleDescription()
+            imported_module_description.set_as_external(imported_module_full_name)
+            add_module_description_to_roots(imported_module_description, external_module_roots)
+            
+
+def get_module_description(roots, module_full_name, folded_collections=None):
+    '''
+    Find the ModuleDescription for module_full_name in the "roots" collection of trees
+    We allow "partial finds", in case module_full_name references something inside a py file,
+    or a module that has been folded into a parent.
+    
+    Parameters
+    ----------
+    roots : collection of trees
+        Can be either the system collection or the external collection
+    module_full_name : string
+        Full name of the module to find.
+    folded_collections : dict, optional
+        Collections to treat as folded into their parents, see find_folded_modules.
+        The default is None.
+
+    Returns
+    -------
+    ModuleDescription object for the module searched for. Or None if not found.
+    '''
+    module_collection = roots
+    components = module_full_name.split(".")
+    for component in components:
+        value = module_collection.get(component)
+        if value == None or (folded_collections and id(value) in folded_collections):
+            # We might be referencing something from within a py file. Try to return the module_description for the py file instead.
+            # Or we might be referencing a module that have been folded into a parent. So we try to return the parent module_description.
+            return module_collection.get(MODULE_DESCRIPTION_TAG)
+        module_collection = value
+    return module_collection.get(MODULE_DESCRIPTION_TAG) # Either it exists or we return None.
+
+'''
+    Class for a collection of trees that memoizes import resolution.
+    For each import name ID, stops holds the ID of the deepest collection
+    on the path of the name (-1 for the top), i.e., where get_module_description
+    stops walking. That only changes when collections are added or removed,
+    so filter_modules shares it. A collection made by fold_modules looks
+    the stops up in the collection it was folded from, and maps them through
+    the IDs of the folded collections instead of walking the names again.
+    importers is the reverse of the imports of the modules in the collection,
+    see reverse_imports.
+    version is new after every change made through the functions in this file,
+    so together with snapshot it can be used as a cache key for the contents.
+'''
+class ModuleRoots(dict):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.stops = {}          # import name ID -> collection name ID
+        self.descriptions = None # collection name ID -> ModuleDescription. Built on demand.
+        self.version = next(VERSIONS)
+        self.source = None       # the ModuleRoots this was folded from, if any
+        self.source_version = 0  # version of source when it was folded
+        self.representatives = None # see find_folded_modules
+        self.importers = None    # see reverse_imports. Built on demand.
+        self.owned = {}          # id -> the collections and ModuleDescriptions not shared with other trees
+
+def new_version(roots):
+    '''
+    Give a collection of trees a new version after a change.
+    '''
+    if isinstance(roots, ModuleRoots):
+        roots.version = next(VERSIONS)
+
+def forget_resolved_imports(roots):
+    '''
+    Drop the resolution memo of a collection of trees after modules were added or removed.
+    '''
+    if isinstance(roots, ModuleRoots):
+        roots.stops = {} # a new dict, since it may be shared with filtered collections
+        roots.descriptions = None
+        roots.version = next(VERSIONS)
+
+def share(roots):
+    '''
+    Mark all collections and ModuleDescriptions of a collection of trees as
+    shared, before trees are derived from it.
+    '''
+    if isinstance(roots, ModuleRoots):
+        roots.owned = {}
+
+def owned_path(roots, components, create=False):
+    '''
+    Get the collections on the path of a name for changing them.
+    Shared collections on the path are replaced by copies first.
+    For plain dicts, the collections themselves are returned.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    components : list of string
+        The components of a full module name.
+    create : bool, optional
+        Add missing collections. The default is False.
+
+    Returns
+    -------
+    list of collections
+        roots and the collections on the path. Shorter than components + 1
+        if the path does not exist and create is False.
+    '''
+    owned = roots.owned if isinstance(roots, ModuleRoots) else None
+    path = [roots]
+    for component in components:
+        module_collection = path[-1].get(component)
+        if module_collection is None:
+            if not create:
+                break
+            module_collection = path[-1][sys.intern(component)] = {} # the same few components occur in many module names
+            if owned is not None:
+                owned[id(module_collection)] = module_collection
+        elif owned is not None and id(module_collection) not in owned:
+            module_collection = path[-1][component] = dict(module_collection)
+            owned[id(module_collection)] = module_collection
+        path.append(module_collection)
+    return path
+
+def owned_description(roots, module_collection):
+    '''
+    Get the ModuleDescription of a collection from owned_path for changing it.
+    A shared ModuleDescription is replaced by a copy first.
+    '''
+    module_description = module_collection.get(MODULE_DESCRIPTION_TAG)
+    if module_description is None or not isinstance(roots, ModuleRoots) or id(module_description) in roots.owned:
+        return module_description
+    module_description = module_collection[MODULE_DESCRIPTION_TAG] = module_description.copy()
+    roots.owned[id(module_description)] = module_description
+    roots.descriptions = None
+    return module_description
+
+def writable_module_description(roots, full_module_name):
+    '''
+    Get a ModuleDescription in a collection of trees for changing it in place,
+    without changing the trees that share it.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    full_module_name : string
+        Full name of the module. Must match exactly.
+
+    Returns
+    -------
+    ModuleDescription, or None if there is no module with that name.
+    Note: it can be a copy of the ModuleDescription that was in roots before.
+    '''
+    components = full_module_name.split(".")
+    path = owned_path(roots, components)
+    if len(path) <= len(components):
+        return None
+    new_version(roots)
+    return owned_description(roots, path[-1])
+
+def snapshot(roots):
+    '''
+    Take a snapshot of a collection of trees. Only the top level is copied.
+    Changes made afterwards to either roots or the snapshot through the
+    functions in this file do not show in the other.
+
+    Parameters
+    ----------
+    roots : collection of trees
+
+    Returns
+    -------
+    ModuleRoots
+        Has the same version as roots, if roots is a ModuleRoots.
+    '''
+    snapshot_roots = ModuleRoots(roots)
+    if isinstance(roots, ModuleRoots):
+        share(roots)
+        snapshot_roots.stops = roots.stops
+        snapshot_roots.descriptions = roots.descriptions
+        snapshot_roots.version = roots.version
+        snapshot_roots.source = roots.source
+        snapshot_roots.source_version = roots.source_version
+        snapshot_roots.representatives = roots.representatives
+    return snapshot_roots
+
+def resolve_import(roots, module_id):
+    '''
+    Like get_module_description, but for the ID of a name, and memoized
+    if roots is a ModuleRoots.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    module_id : int
+        ID (see AASymbols) of the full module name to find.
+
+    Returns
+    -------
+    ModuleDescription object for the module searched for. Or None if not found.
+    '''
+    if not isinstance(roots, ModuleRoots):
+        return get_module_description(roots, AASymbols.SYMBOLS.names[module_id])
+    stop_id = find_stop(roots, module_id)
+    if stop_id < 0:
+        return roots.get(MODULE_DESCRIPTION_TAG)
+    return description_map(roots).get(stop_id)
+
+def description_map(roots):
+    '''
+    Map the name IDs of the modules in a collection of trees to their ModuleDescriptions.
+    Memoized if roots is a ModuleRoots.
+    '''
+    if isinstance(roots, ModuleRoots) and roots.descriptions is not None:
+        return roots.descriptions
+    descriptions = {module_description.name_id: module_description for module_description in traverse_modules(roots)}
+    if isinstance(roots, ModuleRoots):
+        roots.descriptions = descriptions
+    return descriptions
+
+def find_stop(roots, module_id):
+    '''
+    Helper function for resolve_import.
+    Get the ID of the deepest collection on the path of a name in a ModuleRoots, memoized.
+    '''
+    stop_id = roots.stops.get(module_id)
+    if stop_id is None:
+        source = roots.source
+        if source is not None and source.version == roots.source_version:
+            stop_id = representative(find_stop(source, module_id), roots.representatives)
+        else:
+            stop_id = find_collection_on_path(roots, AASymbols.SYMBOLS.names[module_id])
+        roots.stops[module_id] = stop_id
+    return stop_id
+
+def representative(module_id, representatives):
+    '''
+    Helper function for find_stop.
+    Get the ID of the collection that a collection was folded into.
+
+    Parameters
+    ----------
+    module_id : int
+        ID of the name of a collection, -1 for the top.
+    representatives : dict
+        Maps the IDs of the top folded collections, see find_folded_modules.
+
+    Returns
+    -------
+    int
+        module_id if the collection was not folded.
+    '''
+    index = AASymbols.MODULE_INDEX
+    index.refresh()
+    parent = index.parent
+    ancestor_id = module_id
+    while ancestor_id >= 0:
+        if ancestor_id in representatives:
+            return representatives[ancestor_id]
+        ancestor_id = parent[ancestor_id]
+    return module_id
+
+def find_collection_on_path(roots, module_full_name):
+    '''
+    Helper function for resolve_import.
+    Walk the path of a name like get_module_description.
+
+    Returns
+    -------
+    int
+        ID of the name of the deepest collection on the path. -1 if not even the first component exists.
+    '''
+    module_collection = roots
+    length = -1
+    for component in module_full_name.split("."):
+        value = module_collection.get(component)
+        if value == None:
+            break
+        module_collection = value
+        length += len(component) + 1
+    if length < 0:
+        return -1
+    return AASymbols.SYMBOLS.id(module_full_name[:length])
+
+def changed_collection(roots, module_full_name):
+    '''
+    Get the highest collection below which get_module_description may find
+    something else after a module has been added to or removed from a
+    collection of trees. The parents without a ModuleDescription may have
+    been created or removed along with the module, so it is the collection
+    right below the deepest parent that has one.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Can be either the system collection or the external collection.
+    module_full_name : string
+        Full name of the added or removed module.
+
+    Returns
+    -------
+    string
+        Full name of the collection. The names it contains and the name
+        itself are the ones to look up again.
+    '''
+    components = module_full_name.split(".")
+    module_collection = roots
+    length = 1 # number of components in the result
+    for level, component in enumerate(components[:-1], 1):
+        module_collection = module_collection.get(component)
+        if module_collection == None:
+            break
+        if MODULE_DESCRIPTION_TAG in module_collection:
+            length = level + 1
+    return ".".join(components[:length])
+
+def traverse_modules(roots):
+    '''
+    Generator for traversing a collection of module trees.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Can be either the system collection or the external collection.
+
+    Yields
+    ------
+    Next ModuleDescription object from the collection of trees
+    '''
+    for module_name, value in roots.items():
+        if module_name == MODULE_DESCRIPTION_TAG:
+            yield value
+        else:
+            yield from traverse_modules(value)
+
+def fold_modules(roots, external_module_roots, fold_predicate):
+    '''
+    Fold modules into their parent modules.
+    The parent module assimilates all imports from the folded
+    submodules.
+    All imports to folded modules are pruned to point to the parent
+    module instead.
+    Sub trees and ModuleDescriptions that do not change are shared with
+    the input instead of copied. The input is not changed.
+    For very large systems, AASparse.fold_modules computes the same folded
+    modules and imports as a sparse matrix, with import counts.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    fold_predicate : function that takes a string argument and returns bool
+        Input is a full module name. Output must be true for sub-modules
+        that are to be folded into their parents.
+
+    Returns
+    -------
+    Two collection of trees:
+        The new description of the target system modules
+        The new description of the external packages
+    '''
+    representatives = {}
+    external_representatives = {}
+    folded_collections = {}
+    external_folded_collections = {}
+    find_folded_modules(roots, "", fold_predicate, representatives, folded_collections)
+    find_folded_modules(external_module_roots, "", fold_predicate, external_representatives, external_folded_collections)
+    resolve = import_resolver(roots, folded_collections, (), external_module_roots, external_folded_collections, ())
+    folded_roots = ModuleRoots(rebuild_modules(roots, "", folded_collections, (), resolve))
+    folded_external_module_roots = ModuleRoots(rebuild_modules(external_module_roots, "", external_folded_collections, (), resolve))
+    for source, folded, folded_representatives in [(roots, folded_roots, representatives),
+                                                   (external_module_roots, folded_external_module_roots, external_representatives)]:
+        if isinstance(source, ModuleRoots):
+            share(source)
+            folded.source = source
+            folded.source_version = source.version
+            folded.representatives = folded_representatives
+    return folded_roots, folded_external_module_roots
+
+def fold_modules_to_depth(roots, external_module_roots, depth):
+    '''
+    Fold all modules below a level into their ancestor at that level.
+    E.g., depth 1 folds everything into the top level modules.
+    The levels come from AASymbols.MODULE_INDEX, so the names are not split.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    depth : int
+        Level of the deepest modules to keep.
+
+    Returns
+    -------
+    Two collection of trees, like fold_modules.
+    '''
+    return fold_modules(roots, external_module_roots, lambda full_module_name : AAModule.module_level(full_module_name) > depth)
+
+def find_folded_modules(module_collection, parent_module_name, fold_predicate, representatives, folded_collections):
+    '''
+    Helper function for fold_modules.
+    Find the collections to fold. Sub collections of folded collections
+    are not visited.
+
+    Parameters
+    ----------
+    module_collection : collection of trees
+        One level of a collection of trees. Describes a module with children.
+    parent_module_name : string
+        Full module name of the parent module for the module collection.
+    fold_predicate : function that takes a string argument and returns bool
+        See fold_modules.
+    representatives : dict
+        The ID of each folded collection (not its sub collections) is mapped
+        to the ID of the collection it is folded into (-1 for the top).
+    folded_collections : dict
+        Like representatives, but keyed by the id() of the folded collections.
+
+    Returns
+    -------
+    Adds to representatives and folded_collections.
+    '''
+    parent_module_id = AASymbols.SYMBOLS.id(parent_module_name) if parent_module_name else -1
+    for module_name, value in module_collection.items():
+        if module_name != MODULE_DESCRIPTION_TAG:
+            full_module_name = parent_module_name + "." + module_name if parent_module_name else module_name
+            if fold_predicate(full_module_name):
+                representatives[AASymbols.SYMBOLS.id(full_module_name)] = parent_module_id
+                folded_collections[id(value)] = parent_module_id
+            else:
+                find_folded_modules(value, full_module_name, fold_predicate, representatives, folded_collections)
+
+def find_removed_modules(module_collection, parent_module_name, keep_predicate, removed):
+    '''
+    Helper function for filter_modules.
+    Find the ModuleDescriptions to remove.
+
+    Parameters
+    ----------
+    module_collection : collection of trees
+        One level of a collection of trees. Describes a module with children.
+    parent_module_name : string
+        Full module name of the parent module for the module collection.
+    keep_predicate : function that takes a string argument and returns bool
+        See filter_modules.
+    removed : set of int
+        The name IDs of the modules to remove are added to this.
+
+    Returns
+    -------
+    Adds to removed.
+    '''
+    for module_name, value in module_collection.items():
+        if module_name != MODULE_DESCRIPTION_TAG:
+            full_module_name = parent_module_name + "." + module_name if parent_module_name else module_name
+            if not keep_predicate(full_module_name) and MODULE_DESCRIPTION_TAG in value:
+                removed.add(AASymbols.SYMBOLS.id(full_module_name))
+            find_removed_modules(value, full_module_name, keep_predicate, removed) # keep doing recursive processing in case we want to keep a sub module
+
+def import_resolver(roots, folded_collections, removed, external_module_roots, external_folded_collections, external_removed):
+    '''
+    Helper function for fold_modules and filter_modules.
+    Make a function that finds the module an import refers to in the trees
+    derived from roots and external_module_roots, like resolve_import on them,
+    but before they are built.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    folded_collections : dict
+        Folded collections of roots, see find_folded_modules.
+    removed : set of int
+        Removed modules of roots, see find_removed_modules.
+    external_module_roots : collection of trees
+        Description of the external packages
+    external_folded_collections : dict
+        Like folded_collections, for external_module_roots.
+    external_removed : set of int
+        Like removed, for external_module_roots.
+
+    Returns
+    -------
+    Function that takes the ID of an import name, and returns the ID of
+    the full name of the module it refers to (None if not found). Memoized.
+    '''
+    trees = [(roots, folded_collections, removed), (external_module_roots, external_folded_collections, external_removed)]
+    resolved = {}
+    def resolve(module_id):
+        if module_id in resolved:
+            return resolved[module_id]
+        resolved_id = None
+        for module_roots, folded, removed_ids in trees:
+            if folded:
+                module_description = get_module_description(module_roots, AASymbols.SYMBOLS.names[module_id], folded)
+            else:
+                module_description = resolve_import(module_roots, module_id)
+            if module_description is not None and module_description.name_id not in removed_ids:
+                resolved_id = module_description.name_id
+                break
+        resolved[module_id] = resolved_id
+        return resolved_id
+    return resolve
+
+def rebuild_modules(module_collection, module_name, folded_collections, removed, resolve):
+    '''
+    Helper function for fold_modules and filter_modules.
+    Make the folded and/or filtered version of one collection, with the
+    imports pruned to the modules they refer to in the new trees.
+    Recursive calls itself for collection members of the collection.
+
+    Parameters
+    ----------
+    module_collection : collection of trees
+        One level of a collection of trees. Describes a module with children.
+    module_name : string
+        Full module name of the module the collection describes. "" for the top.
+    folded_collections : dict
+        Collections to fold, see find_folded_modules. Their imports are added
+        to the ModuleDescription of module_collection.
+    removed : set of int
+        Modules to remove, see find_removed_modules.
+    resolve : function
+        See import_resolver.
+
+    Returns
+    -------
+    collection of trees
+        module_collection itself if nothing in it changes. Otherwise a new
+        collection, sharing the sub collections and ModuleDescriptions that
+        do not change.
+    '''
+    symbol_ids = AASymbols.SYMBOLS.ids
+    module_description = module_collection.get(MODULE_DESCRIPTION_TAG)
+    if module_description is not None and removed and symbol_ids.get(module_name) in removed:
+        module_description = None
+    changed = module_description is not module_collection.get(MODULE_DESCRIPTION_TAG)
+    folded_import_ids = None
+    result = {}
+    for name, value in module_collection.items():
+        if name == MODULE_DESCRIPTION_TAG:
+            if module_description is not None:
+                result[MODULE_DESCRIPTION_TAG] = module_description
+            continue
+        full_module_name = module_name + "." + name if module_name else name
+        if folded_collections and id(value) in folded_collections:
+            # don't add folded collection. Insted collect the imports and add them to the parent.
+            changed = True
+            if module_description is not None:
+                if folded_import_ids is None:
+                    folded_import_ids = list(module_description.import_ids)
+                collect_folded_imports(value, folded_import_ids)
+        else:
+            rebuilt = rebuild_modules(value, full_module_name, folded_collections, removed, resolve)
+            changed = changed or rebuilt is not value
+            result[name] = rebuilt
+    if module_description is not None:
+        import_ids = module_description.import_ids
+        if folded_import_ids is not None:
+            import_ids = discard_folded_modules(folded_import_ids, module_name) # avoid self-dependency on the folded module
+        resolved_ids = AASymbols.id_array(resolved_id for resolved_id in map(resolve, import_ids) if resolved_id is not None)
+        if resolved_ids != module_description.import_ids:
+            module_description = module_description.copy()  # Copy to avoid changing the original module description
+            module_description.import_ids = resolved_ids
+            result[MODULE_DESCRIPTION_TAG] = module_description
+            changed = True
+    return result if changed else module_collection
+
+def collect_folded_imports(module_collection, folded_import_ids):
+    '''
+    Recursive helper function for rebuild_modules
+    Collects the imports of all modules in a collection of trees, including those
+    in the sub modules. The imports are appended to one list, so each import
+    is only copied once however deep the tree is.
+
+    Parameters
+    ----------
+    module_collection : collection of trees
+        One level of a collection of trees. Describes a module with children.
+    folded_import_ids : list of int
+        The IDs (see AASymbols) of the collected imports are appended to this.
+
+    Returns
+    -------
+    Appends to folded_import_ids.
+    '''
+    for module_name, value in module_collection.items():
+        if module_name == MODULE_DESCRIPTION_TAG:
+            folded_import_ids.extend(value.import_ids)
+        else:
+            collect_folded_imports(value, folded_import_ids) # recursively process sub-collection
+
+def discard_folded_modules(module_id_collection, folded_parent_module_full_name):
+    '''
+    Helper function for rebuild_modules
+    Removes all imports to the folded sub modules from a collection of module
+    IDs.
+
+    Parameters
+    ----------
+    module_id_collection : collection of int
+        IDs (see AASymbols) of full module names
+    folded_parent_module_full_name : string
+        Full module name of the parent module for the folded sub modules
+
+    Returns
+    -------
+    result : set of int
+        The module IDs, with the IDs of the sub modules that have been
+        folded removed.
+    '''
+    parent_module_id = AASymbols.SYMBOLS.id(folded_parent_module_full_name)
+    index = AASymbols.MODULE_INDEX
+    index.refresh_intervals()
+    enter = index.enter
+    first, last = enter[parent_module_id], index.exit[parent_module_id] # the parent and its sub modules
+    return set(module_id for module_id in module_id_collection if not first <= enter[module_id] <= last)
+
+def filter_modules(roots, external_module_roots, keep_predicate):
+    '''
+    Remove the ModuleDescriptions for modules specified by a predicate.
+    Also remove imports to them.
+    Sub trees and ModuleDescriptions that do not change are shared with
+    the input instead of copied. The input is not changed.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    keep_predicate : function that takes a string argument and returns bool
+        Input is a full module name. Output must be true for modules
+        that are NOT to be removed.
+
+    Returns
+    -------
+    Two collection of trees:
+        The new description of the target system modules
+        The new description of the external packages
+    '''
+    removed = set()
+    external_removed = set()
+    find_removed_modules(roots, "", keep_predicate, removed)
+    find_removed_modules(external_module_roots, "", keep_predicate, external_removed)
+    resolve = import_resolver(roots, None, removed, external_module_roots, None, external_removed)
+    filtered_roots = ModuleRoots(rebuild_modules(roots, "", None, removed, resolve))
+    filtered_external_module_roots = ModuleRoots(rebuild_modules(external_module_roots, "", None, external_removed, resolve))
+    # Filtering keeps all collections, so the imports still stop in the same ones
+    for source, filtered in [(roots, filtered_roots), (external_module_roots, filtered_external_module_roots)]:
+        if isinstance(source, ModuleRoots):
+            share(source)
+            filtered.stops = source.stops
+    return filtered_roots, filtered_external_module_roots
+
+
+def reverse_imports(roots):
+    '''
+    Get the reverse of the imports of the modules in a collection of trees.
+    For a ModuleRoots it is built once, and then kept up to date by
+    add_module_description_to_roots, remove_module_description_from_roots
+    and set_module_imports.
+
+    Parameters
+    ----------
+    roots : collection of trees
+
+    Returns
+    -------
+    dict
+        Maps the ID (see AASymbols) of each imported name to a dict from the name IDs
+        of the importing modules to their number of ModuleDescriptions (normally 1).
+        Do not modify.
+    '''
+    if isinstance(roots, ModuleRoots) and roots.importers is not None:
+        return roots.importers
+    importers = {}
+    for module_description in traverse_modules(roots):
+        add_reverse_imports(importers, module_description.name_id, module_description.import_ids, 1)
+    if isinstance(roots, ModuleRoots):
+        roots.importers = importers
+    return importers
+
+def add_reverse_imports(importers, module_id, import_ids, count):
+    '''
+    Helper function for reverse_imports.
+    Add (count 1) or remove (count -1) the imports of one module.
+    '''
+    for import_id in import_ids:
+        references = importers.setdefault(import_id, {})
+        references[module_id] = references.get(module_id, 0) + count
+        if references[module_id] <= 0:
+            del references[module_id]
+            if not references:
+                del importers[import_id]
+
+def set_module_imports(roots, full_module_name, full_module_names):
+    '''
+    Change the imports of a module in a collection of trees, and
+    keep the reverse imports of the collection up to date.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    full_module_name : string
+        Full name of the module. Must match exactly.
+    full_module_names : iterable of string
+        Full module names of the new imports.
+
+    Returns
+    -------
+    The changed ModuleDescription, see writable_module_description. None if
+    there is no module with that name.
+    '''
+    module_description = writable_module_description(roots, full_module_name)
+    if module_description is None:
+        return None
+    importers = roots.importers if isinstance(roots, ModuleRoots) else None
+    if importers is not None:
+        add_reverse_imports(importers, module_description.name_id, module_description.import_ids, -1)
+    module_description.imports = full_module_names
+    if importers is not None:
+        add_reverse_imports(importers, module_description.name_id, module_description.import_ids, 1)
+    return module_description
+
+def importers_of(roots, full_module_name):
+    '''
+    Find the modules in a collection of trees that import a module.
+
+    Parameters
+    ----------
+    roots : collection of trees
+    full_module_name : string
+        Full module name of the imported module. Must match the import exactly.
+
+    Returns
+    -------
+    list of string
+        Full module names of the importing modules.
+    '''
+    module_id = AASymbols.SYMBOLS.lookup(full_module_name)
+    if module_id is None: # no module has ever imported it
+        return []
+    return AASymbols.SYMBOLS.name_list(reverse_imports(roots).get(module_id, ()))
+
+def is_module_referenced(roots, full_module_name):
+    '''
+    Test if a module is imported by any modules in a collection of trees.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        E.g., either the target system description or the imported packages description.
+    full_module_name : string
+        Full module name of the module to find a reference to
+
+    Returns
+    -------
+    bool
+        Returns true if at least one module in roots imports the specified module.
+    '''
+    module_id = AASymbols.SYMBOLS.lookup(full_module_name)
+    if module_id is None: # no module has ever imported it
+        return False
+    return module_id in reverse_imports(roots)
+    
+def stript_external_imports(roots, modules_to_strip):
+    '''
+    Remove imports to modules not in the Zeeguu system.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Only makes sense for the description of the target system
+    modules_to_strip : list of strings
+        Full module names for the modules to strip external imports from.
+
+    Returns
+    -------
+    ModuleRoots
+        A snapshot of roots with the imports removed. roots is not changed.
+    '''
+    stripped_roots = snapshot(roots)
+    for full_module_name in modules_to_strip:
+        module_description = get_module_description(stripped_roots, full_module_name)
+        if not module_description:
+            print("stript_external_imports: failed to find module_description for: " + full_module_name)
+        if module_description:
+            new_imports = set()
+            for imported_module in module_description.imports:
+                if AAModule.module_belongs_to_zeeguu_api(imported_module):
+                    new_imports.add(imported_module)
+            set_module_imports(stripped_roots, module_description.full_name, new_imports)
+    return stripped_roots
+
+
+'''
+    Class for collecting metadata for a module.
+    The name and the imports are kept as IDs in AASymbols.SYMBOLS, and the
+    fixed set of attributes in __slots__, since there is one instance per module
+    in every tree made by fold_modules and filter_modules.
+'''
+class ModuleDescription:
+    __slots__ = ("full_path", "name_id", "import_ids", "content_hash", "LOC", "SLOC", "subtree_LOC")
+
+    def __init__(self, full_path=None, scan=None, full_name=None):
+        # scan is the result of AAIngest.scan_file for full_path, if the file has already been scanned
+        # full_name is only needed when full_path is not below AAFileSystem.CODE_ROOT_FOLDER, e.g., for a git blob
+        self.content_hash = ""
+        self.LOC = 0
+        self.SLOC = 0
+        self.subtree_LOC = 0 # see rollup_LOC
+        if full_path:
+            self.full_path = str(full_path)
+            self.full_name = full_name or AAModule.module_name_from_file_path(self.full_path)
+            if scan is None:
+                with open(self.full_path, "rb") as file:
+                    data = file.read()
+                scan = AAIngest.scan_source(data)
+                scan["content_hash"] = AAIngest.content_hash(data)
+            self.imports = scan["imports"]
+            self.content_hash = scan["content_hash"]
+            self.LOC = scan["LOC"]
+            self.SLOC = scan["SLOC"]
+        else:
+            self.full_path = ""
+            self.full_name = ""
+            self.import_ids = AASymbols.id_array(())
+
+    @property
+    def full_name(self):
+        return AASymbols.SYMBOLS.names[self.name_id]
+
+    @full_name.setter
+    def full_name(self, full_name):
+        self.name_id = AASymbols.SYMBOLS.id(full_name)
+
+    @property
+    def imports(self):
+        '''
+        Full module names of the imported modules.
+        A new set is made on each access. Use import_ids in loops.
+        '''
+        return set(AASymbols.SYMBOLS.name_list(self.import_ids))
+
+    @imports.setter
+    def imports(self, full_module_names):
+        self.import_ids = AASymbols.SYMBOLS.id_array(full_module_names)
+
+    def copy(self):
+        '''
+        Shallow copy. Faster than copy.copy for a class with __slots__.
+        '''
+        module_description = ModuleDescription.__new__(ModuleDescription)
+        module_description.full_path = self.full_path
+        module_description.name_id = self.name_id
+        module_description.import_ids = self.import_ids
+        module_description.content_hash = self.content_hash
+        module_description.LOC = self.LOC
+        module_description.SLOC = self.SLOC
+        module_description.subtree_LOC = self.subtree_LOC
+        return module_description
+
+    def set_as_external(self, full_name):
+        self.full_name = full_name
+
+    def dump(self):
+        print("Module: " + self.full_name + " [" + self.full_path + "]")
+        print("-- imports: ", end=" ")
+        print(*AASymbols.SYMBOLS.name_list(self.import_ids))
+
+
+def dump_modules(roots):
+    for module_description in traverse_modules(roots):
+        module_description.dump()
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    roots = ModuleRoots()
+    for full_name, imports in [("app.a", ["app.b"]), ("app.b", []), ("app.c.d", ["app.b", "os"])]:
+        module_description = ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        add_module_description_to_roots(module_description, roots)
+    filtered_roots, _ = filter_modules(roots, {}, lambda full_module_name : full_module_name != "app.c.d")
+    assert filtered_roots["app"]["a"] is roots["app"]["a"] # unchanged sub trees are shared
+    assert MODULE_DESCRIPTION_TAG in roots["app"]["c"]["d"] and MODULE_DESCRIPTION_TAG not in filtered_roots["app"]["c"]["d"]
+    snapshot_roots = snapshot(roots)
+    assert snapshot_roots.version == roots.version
+    set_module_imports(roots, "app.b", ["app.a"])
+    assert get_module_description(snapshot_roots, "app.b").imports == set() and get_module_description(roots, "app.b").imports == {"app.a"}
+    assert snapshot_roots.version != roots.version
+    assert importers_of(roots, "app.a") == ["app.b"] and not is_module_referenced(snapshot_roots, "app.a")
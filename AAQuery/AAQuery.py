@@ -0,0 +1,860 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Declarative view queries over the module trees from AAModuleTree.
+    A ViewQuery describes a view as a fold, a keep predicate, modules that are
+    only shown when something imports them, and excluded modules.
+    Executing it gives the same modules and dependencies as running
+    AAModuleTree.fold_modules and a chain of AAModuleTree.filter_modules, but
+    in one traversal of each tree and one resolution of the imports, without
+    copying any trees.
+    A RollupCache keeps the folds of the sub modules of packages, so that
+    views of the sub modules of a package are looked up instead of folded.
+    A LiveView keeps a view up to date from the changes to single modules.
+"""
+
+import bisect
+from collections import OrderedDict
+from AAModule import AAModule
+from AAModuleTree import AAModuleTree
+from AASymbols import AASymbols
+
+# Number of roll ups below RollupCache.precomputed_level kept by a RollupCache
+DEFAULT_ROLLUP_CACHE_SIZE = 256
+
+'''
+    Class describing a view of the module trees
+'''
+class ViewQuery:
+    def __init__(self, fold=None, keep=None, referenced_only=None, exclude=(), package=None):
+        '''
+        The parts are applied in this order: fold, keep, referenced_only, exclude.
+
+        Parameters
+        ----------
+        fold : function that takes a string argument and returns bool, or int, optional
+            Fold predicate like for AAModuleTree.fold_modules, or a level to
+            fold to like for AAModuleTree.fold_modules_to_depth.
+            The default is None (no folding).
+        keep : function that takes a string argument and returns bool, optional
+            Input is a full module name. Output must be true for modules
+            that are NOT to be removed. The default is None (keep all).
+        referenced_only : function that takes a string argument and returns bool, optional
+            Modules for which this is true are removed unless a target system
+            module kept by keep imports them. The default is None.
+        exclude : iterable of string, optional
+            Full module names of modules to remove. The default is ().
+        package : string, optional
+            Full module name of a package. If given, only its sub modules are
+            folded, and a fold level is relative to the package. Such a fold can
+            be looked up in a RollupCache. The default is None.
+        '''
+        self.fold = fold
+        self.keep = keep
+        self.referenced_only = referenced_only
+        self.exclude = set(exclude)
+        self.package = package
+
+    def fold_predicate(self):
+        if self.fold is None:
+            return lambda full_module_name : False
+        if isinstance(self.fold, int):
+            depth = self.fold
+            if self.package is not None:
+                package = self.package
+                return lambda full_module_name : AAModule.relative_module_level(package, full_module_name) > depth
+            return lambda full_module_name : AAModule.module_level(full_module_name) > depth
+        if self.package is not None:
+            package = self.package
+            fold = self.fold
+            return lambda full_module_name : AAModule.module_contains_module(package, full_module_name) and fold(full_module_name)
+        return self.fold
+
+    def execute(self, roots, external_module_roots, rollups=None):
+        '''
+        Compute the view.
+
+        Parameters
+        ----------
+        roots : collection of trees
+            Description of the target system modules
+        external_module_roots : collection of trees
+            Description of the external packages
+        rollups : RollupCache, optional
+            Used for the fold if the query folds the sub modules of a package
+            to a level, and the cache is for roots and external_module_roots.
+            The default is None.
+
+        Returns
+        -------
+        ViewResult
+        '''
+        if rollups is not None and self.package is not None and isinstance(self.fold, int) and rollups.covers(roots, external_module_roots):
+            modules, imports, resolve = rollups.fold(self.package, self.fold)
+        else:
+            system = FoldedModules(roots, self.fold_predicate())
+            external = FoldedModules(external_module_roots, self.fold_predicate())
+            modules = system.modules + external.modules
+            imports = system.imports
+            # Resolve each distinct import once, like AAModuleTree.fold_modules does
+            resolved = {}
+            def resolve(module_id):
+                if module_id not in resolved:
+                    module_description = system.resolve(module_id) or external.resolve(module_id)
+                    resolved[module_id] = module_description.name_id if module_description else None
+                return resolved[module_id]
+        return self.select(modules, imports, resolve)
+
+    def select(self, modules, imports, resolve=None):
+        '''
+        Helper function for execute. Apply keep, referenced_only and exclude to the folded modules.
+
+        Parameters
+        ----------
+        modules : list of ModuleDescription
+            The folded modules, target system modules first.
+        imports : list of (ModuleDescription, collection of int)
+            The target system modules and the IDs of their imports.
+        resolve : function, optional
+            Maps an import ID to the ID of the module it refers to, or None.
+            The default is None, which means that the imports are already resolved.
+
+        Returns
+        -------
+        ViewResult
+        '''
+        names = AASymbols.SYMBOLS.names
+        keep = self.keep
+        kept = set(module_description.name_id for module_description in modules if keep is None or keep(module_description.full_name))
+        dependencies = {}
+        for module_description, import_ids in imports:
+            if module_description.name_id in kept:
+                if resolve is not None:
+                    import_ids = map(resolve, import_ids)
+                dependencies[module_description.name_id] = [resolved_id for resolved_id in import_ids if resolved_id in kept]
+        if self.referenced_only:
+            referenced = set()
+            for resolved_ids in dependencies.values():
+                referenced.update(resolved_ids)
+            kept = set(module_id for module_id in kept if module_id in referenced or not self.referenced_only(names[module_id]))
+        kept = set(module_id for module_id in kept if names[module_id] not in self.exclude)
+
+        result_modules = [module_description for module_description in modules if module_description.name_id in kept]
+        edges = []
+        for module_description, _ in imports:
+            module_id = module_description.name_id
+            if module_id in kept:
+                edges.extend((module_id, resolved_id) for resolved_id in sorted(set(dependencies[module_id])) if resolved_id in kept)
+        return ViewResult(result_modules, edges)
+
+
+'''
+    Class for the modules of one collection of trees as fold_modules would leave them,
+    without building the folded trees
+'''
+class FoldedModules:
+    def __init__(self, roots, fold_predicate):
+        self.roots = roots
+        self.modules = []         # ModuleDescriptions that are not folded, in traversal order
+        self.imports = []         # (ModuleDescription, import IDs) before the imports are resolved
+        self.representatives = {} # see AAModuleTree.find_folded_modules
+        self.walk(roots, "", fold_predicate)
+        self.descriptions = {module_description.name_id: module_description for module_description in self.modules}
+        if roots.get(AAModuleTree.MODULE_DESCRIPTION_TAG) is not None:
+            self.descriptions[-1] = roots[AAModuleTree.MODULE_DESCRIPTION_TAG]
+
+    def walk(self, module_collection, parent_module_name, fold_predicate):
+        '''
+        Helper function for __init__. Like AAModuleTree.rebuild_modules for a fold.
+        '''
+        module_description = module_collection.get(AAModuleTree.MODULE_DESCRIPTION_TAG)
+        if module_description is not None:
+            self.modules.append(module_description)
+            entry = len(self.imports)
+            self.imports.append((module_description, module_description.import_ids))
+        folded_import_ids = None
+        parent_module_id = AASymbols.SYMBOLS.id(parent_module_name) if parent_module_name else -1
+        for module_name, value in module_collection.items():
+            if module_name != AAModuleTree.MODULE_DESCRIPTION_TAG:
+                full_module_name = parent_module_name + "." + module_name if parent_module_name else module_name
+                if fold_predicate(full_module_name):
+                    if module_description is not None:
+                        if folded_import_ids is None:
+                            folded_import_ids = list(module_description.import_ids)
+                        AAModuleTree.collect_folded_imports(value, folded_import_ids)
+                    self.representatives[AASymbols.SYMBOLS.id(full_module_name)] = parent_module_id
+                else:
+                    self.walk(value, full_module_name, fold_predicate)
+        if folded_import_ids is not None:
+            self.imports[entry] = (module_description, AAModuleTree.discard_folded_modules(folded_import_ids, parent_module_name))
+
+    def resolve(self, module_id):
+        '''
+        Find the ModuleDescription an import refers to in the folded trees,
+        like AAModuleTree.resolve_import on the result of fold_modules.
+        '''
+        if isinstance(self.roots, AAModuleTree.ModuleRoots):
+            stop_id = AAModuleTree.find_stop(self.roots, module_id)
+        else:
+            stop_id = AAModuleTree.find_collection_on_path(self.roots, AASymbols.SYMBOLS.names[module_id])
+        return self.descriptions.get(AAModuleTree.representative(stop_id, self.representatives))
+
+
+'''
+    Class caching the folds of the sub modules of packages ("roll ups").
+    The imports of the trees are resolved to the collections they stop in once,
+    when the cache is built. The roll up of a package to a depth holds the
+    imports of the package and its sub modules, with the sub modules more than
+    depth levels below the package replaced by their ancestor at that level,
+    and the number of module level imports for each. Together with the imports
+    of the other modules, resolved through the same fold, it gives the same view as folding the package with
+    ViewQuery(package=..., fold=depth), so ViewQuery.execute looks it up.
+    The roll ups down to precomputed_level (counted from the top) are computed
+    when the cache is built and always kept. Deeper ones are computed when they
+    are first asked for, and only the max_entries most recently used are kept.
+    The cache is rebuilt when the version of a tree changes (see
+    AAModuleTree.ModuleRoots). Plain dict trees must not be changed.
+'''
+class RollupCache:
+    def __init__(self, roots, external_module_roots, max_entries=DEFAULT_ROLLUP_CACHE_SIZE, precomputed_level=2):
+        '''
+        Parameters
+        ----------
+        roots : collection of trees
+            Description of the target system modules, e.g., from AAModuleTree.init_tree_collection
+        external_module_roots : collection of trees
+            Description of the external packages
+        max_entries : int, optional
+            Number of roll ups below precomputed_level to keep. The default is DEFAULT_ROLLUP_CACHE_SIZE.
+        precomputed_level : int, optional
+            The roll ups of the packages at level 1 to precomputed_level - 1
+            to the depths down to this level are computed up front.
+            The default is 2, i.e., the sub modules of each top level module.
+        '''
+        self.roots = roots
+        self.external_module_roots = external_module_roots
+        self.max_entries = max_entries
+        self.precomputed_level = precomputed_level
+        self.hits = 0
+        self.misses = 0
+        self.build()
+
+    def versions(self):
+        return (getattr(self.roots, "version", None), getattr(self.external_module_roots, "version", None))
+
+    def covers(self, roots, external_module_roots):
+        '''
+        Test if the cache is for a pair of trees, e.g., snapshots of the trees it was built from.
+        '''
+        if roots is self.roots and external_module_roots is self.external_module_roots:
+            return True
+        return isinstance(roots, AAModuleTree.ModuleRoots) and isinstance(external_module_roots, AAModuleTree.ModuleRoots) and \
+            (roots.version, external_module_roots.version) == self.versions()
+
+    def build(self):
+        '''
+        Resolve the imports of the trees, index them and compute the roll ups down to precomputed_level.
+        '''
+        roots, external_module_roots = self.roots, self.external_module_roots
+        self.built_versions = self.versions()
+        # The modules in the order of ViewQuery.execute
+        never_fold = lambda full_module_name : False
+        system_modules = FoldedModules(roots, never_fold).modules
+        self.modules = system_modules + FoldedModules(external_module_roots, never_fold).modules
+        self.system_ids = set(module_description.name_id for module_description in system_modules)
+        self.external_ids = set(module_description.name_id for module_description in self.modules[len(system_modules):])
+        # Each import is resolved to the deepest collection on its path in each collection of trees (see AAModuleTree.find_stop),
+        # since the module it refers to depends on the fold: a collection without a ModuleDescription, e.g., a
+        # namespace package, refers to the module it is folded into.
+        self.targets = [] # target -> (stop in roots, stop in external_module_roots), -1 where not even the first component exists
+        target_of = {}    # import ID -> target
+        def target(module_id):
+            target = target_of.get(module_id)
+            if target is None:
+                target = target_of[module_id] = len(self.targets)
+                self.targets.append((self.find_stop(roots, module_id), self.find_stop(external_module_roots, module_id)))
+            return target
+        # The imports of each target system module as targets
+        self.imports = []
+        for module_description in system_modules:
+            self.imports.append((module_description, sorted(set(map(target, module_description.import_ids)))))
+        # The modules and imports in pre-order, so that the sub modules of a package are a range (see AASymbols.ModuleIndex).
+        # The index arrays are kept, since the pre-order numbers change when the index is rebuilt for new names.
+        index = AASymbols.MODULE_INDEX
+        index.refresh_intervals()
+        self.enter, self.exit, self.level, self.parent = index.enter, index.exit, index.depth, index.parent
+        enter = self.enter
+        self.ordered_modules = sorted((enter[module_description.name_id], module_description.name_id) for module_description in self.modules)
+        self.outgoing = sorted((enter[module_description.name_id], module_description.name_id, target)
+                               for module_description, targets in self.imports for target in targets)
+        self.pinned = {}            # (package ID, depth) -> Rollup down to precomputed_level
+        self.recent = OrderedDict() # (package ID, depth) -> Rollup, least recently used first
+        for _, module_id in self.ordered_modules:
+            level = self.level[module_id]
+            for depth in range(1, self.precomputed_level - level + 1):
+                self.pinned[(module_id, depth)] = self.compute(module_id, depth)
+
+    def find_stop(self, roots, module_id):
+        '''
+        Helper function for build. Get the ID of the deepest collection on the path of an import name.
+        '''
+        if isinstance(roots, AAModuleTree.ModuleRoots):
+            return AAModuleTree.find_stop(roots, module_id)
+        return AAModuleTree.find_collection_on_path(roots, AASymbols.SYMBOLS.names[module_id])
+
+    def rollup(self, package_full_name, depth):
+        '''
+        Look up the roll up of a package to a depth, computing it if needed.
+
+        Parameters
+        ----------
+        package_full_name : string
+            Full module name of the package.
+        depth : int
+            Levels below the package to keep.
+
+        Returns
+        -------
+        Rollup
+        '''
+        if self.versions() != self.built_versions:
+            self.build()
+        key = (AASymbols.SYMBOLS.id(package_full_name), depth)
+        rollup = self.pinned.get(key)
+        if rollup is None:
+            rollup = self.recent.get(key)
+            if rollup is not None:
+                self.recent.move_to_end(key)
+        if rollup is not None:
+            self.hits += 1
+            return rollup
+        self.misses += 1
+        rollup = self.compute(*key)
+        if key[0] < len(self.level) and self.level[key[0]] + depth <= self.precomputed_level:
+            self.pinned[key] = rollup
+        else:
+            self.recent[key] = rollup
+            while len(self.recent) > self.max_entries:
+                self.recent.popitem(last=False)
+        return rollup
+
+    def compute(self, package_id, depth):
+        '''
+        Helper function for build and rollup. Roll up the sub modules of a package.
+        '''
+        if package_id >= len(self.enter): # not a name when the cache was built, so there are no sub modules
+            return Rollup(self, package_id, 0, -1, 0)
+        rollup = Rollup(self, package_id, self.enter[package_id], self.exit[package_id], self.level[package_id] + depth)
+        level, deepest, roll = self.level, rollup.deepest, rollup.roll
+        start = bisect.bisect_left(self.ordered_modules, (rollup.first,))
+        end = bisect.bisect_right(self.ordered_modules, (rollup.last, float("inf")))
+        rollup.modules = set(module_id for _, module_id in self.ordered_modules[start:end] if level[module_id] <= deepest)
+        start = bisect.bisect_left(self.outgoing, (rollup.first,))
+        end = bisect.bisect_right(self.outgoing, (rollup.last, float("inf")))
+        resolve = rollup.resolve
+        for _, module_id, target in self.outgoing[start:end]:
+            folded_id = roll(module_id)
+            imported_folded_id = resolve(target)
+            if folded_id is None or imported_folded_id is None:
+                continue
+            if imported_folded_id == folded_id and level[folded_id] == deepest and self.has_sub_modules(folded_id):
+                continue # like AAModuleTree.discard_folded_modules
+            counts = rollup.imports.setdefault(folded_id, {})
+            counts[imported_folded_id] = counts.get(imported_folded_id, 0) + 1
+        return rollup
+
+    def has_sub_modules(self, module_id):
+        '''
+        Helper function for compute. Test if there are modules below a module.
+        '''
+        position = bisect.bisect_right(self.ordered_modules, (self.enter[module_id], float("inf")))
+        return position < len(self.ordered_modules) and self.ordered_modules[position][0] <= self.exit[module_id]
+
+    def fold(self, package_full_name, depth):
+        '''
+        Get the folded modules and their imports for ViewQuery.select.
+        The imports of the modules outside the package are resolved with Rollup.resolve.
+
+        Returns
+        -------
+        list of ModuleDescription, list of (ModuleDescription, collection of int), None
+        '''
+        rollup = self.rollup(package_full_name, depth)
+        contains = rollup.contains
+        resolve = rollup.resolve
+        modules = [module_description for module_description in self.modules
+                   if module_description.name_id in rollup.modules or not contains(module_description.name_id)]
+        imports = []
+        for module_description, targets in self.imports:
+            module_id = module_description.name_id
+            if not contains(module_id):
+                imports.append((module_description, [resolve(target) for target in targets]))
+            elif module_id in rollup.modules:
+                imports.append((module_description, rollup.imports.get(module_id, ())))
+        return modules, imports, None
+
+
+'''
+    Class for the roll up of a package in a RollupCache
+'''
+class Rollup:
+    def __init__(self, rollups, package_id, first, last, deepest):
+        self.rollups = rollups
+        self.package_id = package_id
+        self.first = first     # pre-order range of the package, see AASymbols.ModuleIndex
+        self.last = last
+        self.deepest = deepest # level of the deepest sub modules that are not folded
+        self.modules = set()   # IDs of the package and its sub modules that are not folded
+        self.imports = {}      # module ID in the package -> {imported module ID: number of module level imports}
+        self.resolved = {}     # target (see RollupCache.build) -> module ID or None
+
+    def contains(self, module_id):
+        '''
+        Test if a module is the package or one of its sub modules.
+        '''
+        return self.first <= self.rollups.enter[module_id] <= self.last
+
+    def fold_target(self, module_id):
+        '''
+        Get the ID of the collection a collection is folded into, the collection itself if it is not folded.
+        '''
+        rollups = self.rollups
+        level = rollups.level[module_id]
+        if level <= self.deepest or not self.first <= rollups.enter[module_id] <= self.last:
+            return module_id
+        parent = rollups.parent
+        for _ in range(level - self.deepest):
+            module_id = parent[module_id]
+        return module_id
+
+    def roll(self, module_id):
+        '''
+        Get the ID of the module a module is folded into. None if that has no
+        ModuleDescription in the same collection of trees.
+        '''
+        rollups = self.rollups
+        same_tree = rollups.system_ids if module_id in rollups.system_ids else rollups.external_ids
+        folded_id = self.fold_target(module_id)
+        return folded_id if folded_id in same_tree else None
+
+    def resolve(self, target):
+        '''
+        Get the ID of the module an import refers to in the folded trees, like
+        AAModuleTree.import_resolver: the module its deepest collection is folded
+        into in the target system, else in the external packages. None if
+        neither has a ModuleDescription. Memoized.
+        '''
+        resolved_id = self.resolved.get(target, -1)
+        if resolved_id != -1:
+            return resolved_id
+        resolved_id = None
+        rollups = self.rollups
+        for stop_id, described_ids in zip(rollups.targets[target], (rollups.system_ids, rollups.external_ids)):
+            if stop_id >= 0:
+                folded_id = self.fold_target(stop_id)
+                if folded_id in described_ids:
+                    resolved_id = folded_id
+                    break
+        self.resolved[target] = resolved_id
+        return resolved_id
+
+
+'''
+    Class for a ViewQuery that is kept up to date while the module trees change.
+    The fold is maintained from the changes to single modules, e.g., by
+    subscribing to an AAWatch.TreeWatcher: the imports of the changed module,
+    and the imports of the names that now refer to another module, are moved
+    between the folded modules by adjusting the number of imports on each
+    folded edge. So the work per change is proportional to the size of the
+    change, not to the size of the system. The external modules are the ones
+    in the external tree, so additions and removals there are changes too.
+    keep, referenced_only and exclude are applied when the result is asked for.
+'''
+class LiveView:
+    def __init__(self, query, roots, external_module_roots):
+        '''
+        Parameters
+        ----------
+        query : ViewQuery
+            The view to maintain.
+        roots : collection of trees
+            Description of the target system modules. Must only be changed
+            in the ways that are reported to module_added, module_removed and
+            module_changed, like AAWatch.TreeWatcher does.
+        external_module_roots : collection of trees
+            Description of the external packages. Must only be changed in the
+            ways that are reported to external_module_added and
+            external_module_removed, like AAWatch.TreeWatcher does.
+        '''
+        self.query = query
+        self.roots = roots
+        self.external_module_roots = external_module_roots
+        self.fold_predicate = query.fold_predicate()
+        self.folded = {}            # full module name -> result of fold_predicate
+        # The modules are keyed by (name ID, True for external modules)
+        self.present = set()        # the modules in the trees
+        self.order = {}             # module -> position in the result
+        self.node_of = {}           # present module -> the module it is folded into. None if that is not present.
+        self.members = {}           # folded module -> the present modules folded into it, including itself
+        self.orphans = {}           # module that is not present -> the present modules that would be folded into it
+        self.importers = {}         # import name ID -> IDs of the target system modules importing it
+        self.import_names = []      # the names in importers, sorted
+        self.resolved = {}          # import name ID -> the module it refers to, or None
+        self.targets = {}           # target system module -> {imported module: number of import names referring to it}
+        self.target_importers = {}  # imported module -> the target system modules importing it
+        self.imports = {}           # folded module -> {imported folded module: number of module level imports}
+        for module_description in FoldedModules(external_module_roots, lambda full_module_name : False).modules:
+            self.attach((module_description.name_id, True))
+        system_modules = FoldedModules(roots, lambda full_module_name : False).modules
+        for module_description in system_modules: # the trees are complete, so nothing needs to be resolved again
+            self.attach((module_description.name_id, False))
+        for module_description in system_modules:
+            for module_id in module_description.import_ids:
+                self.add_import((module_description.name_id, False), module_id)
+
+    def fold_target(self, module):
+        '''
+        Get the module a module is folded into, like FoldedModules.walk, whether it is present or not.
+        None if it is folded into the top.
+        '''
+        full_module_name = AASymbols.SYMBOLS.names[module[0]]
+        prefix = ""
+        for component in full_module_name.split("."):
+            parent_module_name = prefix
+            prefix = prefix + "." + component if prefix else component
+            if self.is_folded(prefix):
+                return (AASymbols.SYMBOLS.id(parent_module_name), module[1]) if parent_module_name else None
+        return module
+
+    def count(self, module, imported_module, delta):
+        '''
+        Add to the number of imports between the modules that two modules are folded into.
+        '''
+        folded_module = self.node_of.get(module)
+        imported_folded_module = self.node_of.get(imported_module)
+        if folded_module is None or imported_folded_module is None:
+            return
+        counts = self.imports.setdefault(folded_module, {})
+        counts[imported_folded_module] = counts.get(imported_folded_module, 0) + delta
+        if counts[imported_folded_module] == 0:
+            del counts[imported_folded_module]
+            if not counts:
+                del self.imports[folded_module]
+
+    def move(self, module, folded_module):
+        '''
+        Change the module a present module is folded into, and move its imports along.
+        '''
+        for imported_module in self.targets.get(module, ()):
+            self.count(module, imported_module, -1)
+        for importing_module in self.target_importers.get(module, ()):
+            self.count(importing_module, module, -1)
+        self.node_of[module] = folded_module
+        for imported_module in self.targets.get(module, ()):
+            self.count(module, imported_module, 1)
+        for importing_module in self.target_importers.get(module, ()):
+            self.count(importing_module, module, 1)
+
+    def attach(self, module):
+        '''
+        Make a module present, and fold the modules waiting for it into it.
+        '''
+        self.present.add(module)
+        self.order.setdefault(module, len(self.order))
+        folded_module = self.fold_target(module)
+        if folded_module == module:
+            self.members[module] = {module}
+            self.move(module, module) # counts the imports that already refer to it
+            for orphan in self.orphans.pop(module, ()):
+                self.members[module].add(orphan)
+                self.move(orphan, module)
+        elif folded_module in self.members:
+            self.members[folded_module].add(module)
+            self.move(module, folded_module)
+        else:
+            if folded_module is not None:
+                self.orphans.setdefault(folded_module, set()).add(module)
+            self.move(module, None)
+
+    def detach(self, module):
+        '''
+        Make a module absent. The modules folded into it wait for it to come back.
+        '''
+        self.move(module, None)
+        self.present.discard(module)
+        del self.node_of[module]
+        folded_module = self.fold_target(module)
+        if folded_module == module:
+            others = self.members.pop(module) - {module}
+            for other in others:
+                self.move(other, None)
+            if others:
+                self.orphans[module] = others
+        elif folded_module in self.members:
+            self.members[folded_module].discard(module)
+        elif folded_module is not None:
+            self.orphans[folded_module].discard(module)
+            if not self.orphans[folded_module]:
+                del self.orphans[folded_module]
+
+    def is_folded(self, full_module_name):
+        folded = self.folded.get(full_module_name)
+        if folded is None:
+            folded = self.folded[full_module_name] = self.fold_predicate(full_module_name)
+        return folded
+
+    def resolve(self, module_id):
+        '''
+        Find the module an import name refers to in the folded trees, like
+        AAModuleTree.import_resolver. Only the collections on the path of the name are looked at.
+        '''
+        components = AASymbols.SYMBOLS.names[module_id].split(".")
+        for module_roots, external in [(self.roots, False), (self.external_module_roots, True)]:
+            module_collection = module_roots
+            full_module_name = ""
+            for component in components:
+                full_module_name = full_module_name + "." + component if full_module_name else component
+                value = module_collection.get(component)
+                if value is None or self.is_folded(full_module_name):
+                    break
+                module_collection = value
+            module_description = module_collection.get(AAModuleTree.MODULE_DESCRIPTION_TAG)
+            if module_description is not None:
+                return (module_description.name_id, external)
+        return None
+
+    def retarget(self, module, previous_imported_module, imported_module):
+        '''
+        One import name of a target system module now refers to another module.
+        '''
+        if previous_imported_module == imported_module:
+            return
+        targets = self.targets.setdefault(module, {})
+        if previous_imported_module is not None:
+            targets[previous_imported_module] -= 1
+            if targets[previous_imported_module] == 0:
+                del targets[previous_imported_module]
+                self.count(module, previous_imported_module, -1)
+                self.target_importers[previous_imported_module].discard(module)
+                if not self.target_importers[previous_imported_module]:
+                    del self.target_importers[previous_imported_module]
+        if imported_module is not None:
+            targets[imported_module] = targets.get(imported_module, 0) + 1
+            if targets[imported_module] == 1:
+                self.target_importers.setdefault(imported_module, set()).add(module)
+                self.count(module, imported_module, 1)
+
+    def add_import(self, module, module_id):
+        importers = self.importers.get(module_id)
+        if importers is None:
+            importers = self.importers[module_id] = set()
+            self.resolved[module_id] = self.resolve(module_id)
+            bisect.insort(self.import_names, AASymbols.SYMBOLS.names[module_id])
+        importers.add(module)
+        self.retarget(module, None, self.resolved[module_id])
+
+    def remove_import(self, module, module_id):
+        self.retarget(module, self.resolved[module_id], None)
+        importers = self.importers[module_id]
+        importers.discard(module)
+        if not importers:
+            del self.importers[module_id]
+            del self.resolved[module_id]
+            full_module_name = AASymbols.SYMBOLS.names[module_id]
+            del self.import_names[bisect.bisect_left(self.import_names, full_module_name)]
+
+    def re_resolve_related_imports(self, module_roots, full_module_name):
+        '''
+        A module was added to or removed from one of the trees. The import names
+        in the collections added or removed along with it may now refer to
+        another module, see AAModuleTree.changed_collection.
+        '''
+        changed_module_name = AAModuleTree.changed_collection(module_roots, full_module_name)
+        start = bisect.bisect_left(self.import_names, changed_module_name + ".")
+        end = bisect.bisect_left(self.import_names, changed_module_name + "/") # "/" comes right after "."
+        related = [changed_module_name] + self.import_names[start:end]
+        for related_full_module_name in related:
+            module_id = AASymbols.SYMBOLS.lookup(related_full_module_name)
+            if module_id in self.importers:
+                imported_module = self.resolve(module_id)
+                previous_imported_module = self.resolved[module_id]
+                if imported_module != previous_imported_module:
+                    self.resolved[module_id] = imported_module
+                    for module in list(self.importers[module_id]):
+                        self.retarget(module, previous_imported_module, imported_module)
+
+    def module_added(self, module_description):
+        '''
+        A target system module has been added to roots.
+        '''
+        module = (module_description.name_id, False)
+        self.attach(module)
+        self.re_resolve_related_imports(self.roots, module_description.full_name)
+        for module_id in module_description.import_ids:
+            self.add_import(module, module_id)
+
+    def module_removed(self, module_description):
+        '''
+        A target system module has been removed from roots.
+        '''
+        module = (module_description.name_id, False)
+        for module_id in module_description.import_ids:
+            self.remove_import(module, module_id)
+        self.targets.pop(module, None)
+        self.detach(module)
+        self.re_resolve_related_imports(self.roots, module_description.full_name)
+
+    def external_module_added(self, module_description):
+        '''
+        An external module has been added to external_module_roots.
+        '''
+        self.attach((module_description.name_id, True))
+        self.re_resolve_related_imports(self.external_module_roots, module_description.full_name)
+
+    def external_module_removed(self, module_description):
+        '''
+        An external module has been removed from external_module_roots.
+        '''
+        self.detach((module_description.name_id, True))
+        self.re_resolve_related_imports(self.external_module_roots, module_description.full_name)
+
+    def module_changed(self, previous_module_description, module_description):
+        '''
+        The imports or the LOC of a target system module in roots have changed.
+        '''
+        module = (module_description.name_id, False)
+        previous_import_ids = set(previous_module_description.import_ids)
+        import_ids = set(module_description.import_ids)
+        for module_id in previous_import_ids - import_ids:
+            self.remove_import(module, module_id)
+        for module_id in import_ids - previous_import_ids:
+            self.add_import(module, module_id)
+
+    def result(self):
+        '''
+        Get the current view, like ViewQuery.execute on the current trees.
+        The ModuleDescriptions are looked up in the trees, so their LOC are current.
+
+        Returns
+        -------
+        ViewResult
+        '''
+        names = AASymbols.SYMBOLS.names
+        modules = []
+        imports = []
+        for module in sorted(self.members, key=lambda module : (module[1], self.order[module])):
+            module_description = AAModuleTree.get_module_description(self.external_module_roots if module[1] else self.roots, names[module[0]])
+            modules.append(module_description)
+            if not module[1]:
+                import_ids = [imported_module[0] for imported_module in self.imports.get(module, ())]
+                if len(self.members[module]) > 1: # like AAModuleTree.discard_folded_modules
+                    full_module_name = names[module[0]]
+                    import_ids = [module_id for module_id in import_ids
+                                  if names[module_id] != full_module_name and not names[module_id].startswith(full_module_name + ".")]
+                imports.append((module_description, import_ids))
+        return self.query.select(modules, imports)
+
+
+'''
+    Class holding the modules and dependencies of an executed ViewQuery
+'''
+class ViewResult:
+    def __init__(self, modules, edges):
+        self.modules = modules # ModuleDescriptions, target system modules first
+        self.edges = edges     # (importing module ID, imported module ID)
+
+    def digraph(self):
+        '''
+        Construct a networkx DiGraph of the view, like AAGraph.dependencies_digraph_from_roots.
+
+        Returns
+        -------
+        networkx.DiGraph.
+        '''
+        import networkx as nx # only loaded when a graph is needed
+        names = AASymbols.SYMBOLS.names
+        G = nx.DiGraph()
+        for module_description in self.modules:
+            if G.has_node(module_description.full_name):
+                print("!!!!!!!!!!!!!!! ViewResult.digraph: Duplicate module name: " + module_description.full_name)
+            G.add_node(module_description.full_name)
+        G.add_edges_from((names[module_id], names[imported_module_id]) for module_id, imported_module_id in self.edges)
+        return G
+
+    def module_LOC_function(self):
+        '''
+        Get a weight function for the cumulative LOC of the sub modules of a
+        module, like AAModuleTree.get_module_LOC_function.
+        '''
+        module_LOC = {module_description.full_name: module_description.subtree_LOC - module_description.LOC for module_description in self.modules}
+        return lambda full_module_name : module_LOC.get(full_module_name, 0)
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    roots = AAModuleTree.ModuleRoots()
+    for full_name, imports in [("app", ["app.a.x", "flask"]), ("app.a", ["app.b", "os"]), ("app.a.x", ["app.b.y.f", "requests.get"]), ("app.b", []), ("app.b.y", ["app.a"])]:
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    external_module_roots = AAModuleTree.ModuleRoots()
+    AAModuleTree.build_external_module_tree(roots, external_module_roots)
+    query = ViewQuery(fold=2, keep=lambda full_module_name : full_module_name != "app", referenced_only=lambda full_module_name : not full_module_name.startswith("app"), exclude=["os"])
+    view = query.execute(roots, external_module_roots)
+    names = AASymbols.SYMBOLS.names
+    assert [module_description.full_name for module_description in view.modules] == ["app.a", "app.b", "requests.get"]
+    assert sorted((names[module_id], names[imported_module_id]) for module_id, imported_module_id in view.edges) == \
+        [("app.a", "app.b"), ("app.a", "requests.get"), ("app.b", "app.a")]
+    folded_roots, folded_external_module_roots = AAModuleTree.fold_modules_to_depth(roots, external_module_roots, 2)
+    assert [module_description.full_name for module_description in AAModuleTree.traverse_modules(folded_roots)] == \
+        [module_description.full_name for module_description in FoldedModules(roots, query.fold_predicate()).modules]
+    rollups = RollupCache(roots, external_module_roots, max_entries=2, precomputed_level=1)
+    for package, depth in [("app", 1), ("app.a", 0), ("app", 1), ("app.b", 1)]:
+        query = ViewQuery(fold=depth, package=package, keep=lambda full_module_name : full_module_name != "app.b")
+        view = query.execute(roots, external_module_roots)
+        rolled_up_view = query.execute(roots, external_module_roots, rollups)
+        assert [module_description.full_name for module_description in view.modules] == [module_description.full_name for module_description in rolled_up_view.modules]
+        assert sorted(view.edges) == sorted(rolled_up_view.edges)
+    assert (rollups.hits, rollups.misses, len(rollups.pinned), len(rollups.recent)) == (1, 3, 0, 2)
+    assert rollups.rollup("app", 1).imports[AASymbols.SYMBOLS.id("app.a")] == {AASymbols.SYMBOLS.id("app.b"): 2, AASymbols.SYMBOLS.id("os"): 1, AASymbols.SYMBOLS.id("requests.get"): 1}
+    # app.core.ns has no ModuleDescription, so an import of it refers to the module it is folded into, if any
+    gap_roots = AAModuleTree.ModuleRoots()
+    for full_name, imports in [("app", []), ("app.api", ["app.core.ns.m"]), ("app.api.x", ["app.core.ns"]), ("app.core", []), ("app.core.ns.m", ["flask"]), ("lib", ["app.core.ns", "app.core.ns.m.f"])]:
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        AAModuleTree.add_module_description_to_roots(module_description, gap_roots)
+    gap_external_module_roots = AAModuleTree.ModuleRoots()
+    AAModuleTree.build_external_module_tree(gap_roots, gap_external_module_roots)
+    gap_rollups = RollupCache(gap_roots, gap_external_module_roots, precomputed_level=1)
+    for package, depth in [("app", 0), ("app", 1), ("app", 2), ("app.core", 0), ("app.core", 1), ("app.api", 0)]:
+        query = ViewQuery(fold=depth, package=package)
+        view = query.execute(gap_roots, gap_external_module_roots)
+        rolled_up_view = query.execute(gap_roots, gap_external_module_roots, gap_rollups)
+        assert [module_description.full_name for module_description in view.modules] == [module_description.full_name for module_description in rolled_up_view.modules]
+        assert sorted(view.edges) == sorted(rolled_up_view.edges), (package, depth)
+    view = ViewQuery(fold=1, package="app").execute(gap_roots, gap_external_module_roots, gap_rollups)
+    assert sorted((names[module_id], names[imported_module_id]) for module_id, imported_module_id in view.edges) == \
+        [("app.api", "app.core"), ("app.core", "flask"), ("lib", "app.core")]
+    live_view = LiveView(query, roots, external_module_roots)
+    def same_view():
+        view, live = query.execute(roots, external_module_roots), live_view.result()
+        return sorted(module_description.full_name for module_description in view.modules) == sorted(module_description.full_name for module_description in live.modules) and \
+            sorted(view.edges) == sorted(live.edges)
+    assert same_view()
+    module_description = AAModuleTree.ModuleDescription()
+    module_description.full_name = "app.c"
+    module_description.imports = ["app.a.x", "requests.get"]
+    AAModuleTree.add_module_description_to_roots(module_description, roots)
+    live_view.module_added(module_description)
+    assert same_view()
+    previous_module_description = AAModuleTree.get_module_description(roots, "app.b.y").copy()
+    live_view.module_changed(previous_module_description, AAModuleTree.set_module_imports(roots, "app.b.y", ["app.c", "os"]))
+    assert same_view()
+    live_view.module_removed(AAModuleTree.remove_module_description_from_roots("app.a", roots))
+    assert same_view()
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Reachability index over the module graph.
+    Answers "which modules does this module depend on transitively",
+    "which modules depend on this module transitively" and "how deep is
+    the chain of imports below this module" without walking the graph for
+    every question.
+    The graph from AAGraph.module_graph is condensed into its strongly
+    connected components (see AACycles), which form a DAG. Each component
+    gets a bitset, a python int with one bit per component, of the
+    components it reaches, and one of the components that reach it. A bitset
+    is computed the first time it is needed, from the bitsets of the next
+    components, and then kept. A query is then a dict look up and a bit test.
+    When an import is added or removed, only the components on the changed
+    path are merged or split again. A new import that closes no cycle only
+    adds bits, so the kept bitsets are extended in place. Otherwise the kept
+    bitsets of the components that could reach, or be reached through, the
+    changed import are dropped.
+
+    Note: a bitset has as many bits as there are components, so for very
+    large systems with long import chains the bitsets can take a lot of memory.
+"""
+
+from array import array
+from AAGraph import AAGraph
+from AACycles import AACycles
+from AASymbols import AASymbols
+
+def reachability_index(roots, external_module_roots = {}):
+    '''
+    Build a ReachabilityIndex for the modules and imports found in the
+    input collection of trees.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees, optional
+        Description of the external packages. The default is {}.
+
+    Returns
+    -------
+    ReachabilityIndex
+    '''
+    return ReachabilityIndex(AAGraph.module_graph(roots, external_module_roots))
+
+
+def bit_numbers(bits):
+    '''
+    Get the numbers of the bits that are set in a bitset.
+
+    Parameters
+    ----------
+    bits : int
+
+    Returns
+    -------
+    list of int
+        Ascending.
+    '''
+    numbers = []
+    while bits:
+        lowest = bits & -bits
+        numbers.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return numbers
+
+
+'''
+    Class answering reachability and dependency depth questions about a module graph
+'''
+class ReachabilityIndex:
+    def __init__(self, graph):
+        '''
+        Parameters
+        ----------
+        graph : AAGraph.ModuleGraph
+            The modules and imports. Not changed, the index keeps its own copy of the edges.
+        '''
+        self.module_ids = list(graph.module_ids) # node -> name ID
+        self.positions = dict(graph.positions)   # name ID -> node
+        offsets = graph.offsets
+        targets = graph.targets
+        self.imports = [set(targets[offsets[node]:offsets[node + 1]]) for node in range(graph.size())] # node -> imported nodes
+        self.importers = [set() for _ in self.module_ids]                                              # node -> importing nodes
+        for node, imported_nodes in enumerate(self.imports):
+            for imported_node in imported_nodes:
+                self.importers[imported_node].add(node)
+        self.component_of = [-1] * len(self.module_ids) # node -> component. -1 while it is being moved.
+        self.members = {}      # component -> nodes
+        self.successors = {}   # component -> {imported component: number of node imports}
+        self.predecessors = {} # component -> {importing component: number of node imports}
+        self.free = []         # numbers of components that were merged or split away, reused first
+        self.reached = {}      # component -> bitset of the components it reaches, itself included. Built on demand.
+        self.reaching = {}     # component -> bitset of the components that reach it, itself included. Built on demand.
+        self.depths = {}       # component -> length of the longest chain of component imports below it. Built on demand.
+        self.heights = {}      # component -> length of the longest chain of component imports above it. Built on demand.
+        for component, nodes in enumerate(AACycles.strongly_connected_components(graph)):
+            self.add_component(nodes, component)
+
+    def add_component(self, nodes, component = None):
+        '''
+        Helper function.
+        Record a group of nodes as a component, with its edges to the other components.
+        '''
+        if component is None:
+            component = self.free.pop() if self.free else len(self.members)
+        self.members[component] = nodes
+        for node in nodes:
+            self.component_of[node] = component
+        self.successors[component] = {}
+        self.predecessors[component] = {}
+        component_of = self.component_of
+        for node in nodes:
+            for imported_node in self.imports[node]:
+                imported_component = component_of[imported_node]
+                if imported_component != component and imported_component in self.members:
+                    self.link(component, imported_component, 1)
+            for importing_node in self.importers[node]:
+                importing_component = component_of[importing_node]
+                if importing_component != component and importing_component in self.members:
+                    self.link(importing_component, component, 1)
+        return component
+
+    def remove_component(self, component):
+        '''
+        Helper function.
+        Drop a component and its edges. Its nodes must be added to other components.
+        '''
+        for node in self.members[component]:
+            self.component_of[node] = -1
+        for imported_component, count in list(self.successors[component].items()):
+            self.link(component, imported_component, -count)
+        for importing_component, count in list(self.predecessors[component].items()):
+            self.link(importing_component, component, -count)
+        del self.members[component]
+        del self.successors[component]
+        del self.predecessors[component]
+        self.free.append(component)
+
+    def link(self, component, imported_component, count):
+        '''
+        Helper function.
+        Change the number of node imports from one component to another.
+        '''
+        successors = self.successors[component]
+        count += successors.get(imported_component, 0)
+        if count > 0:
+            successors[imported_component] = count
+            self.predecessors[imported_component][component] = count
+        else:
+            successors.pop(imported_component, None)
+            self.predecessors[imported_component].pop(component, None)
+
+    def closure(self, component, memo, next_components):
+        '''
+        Helper function.
+        Get the bitset of the components reachable from a component,
+        computing the missing bitsets of the components on the way.
+        '''
+        bits = memo.get(component)
+        if bits is not None:
+            return bits
+        pending = [component]
+        while pending:
+            current = pending[-1]
+            if current in memo:
+                pending.pop()
+                continue
+            missing = [next_component for next_component in next_components[current] if next_component not in memo]
+            if missing:
+                pending.extend(missing)
+                continue
+            bits = 1 << current
+            for next_component in next_components[current]:
+                bits |= memo[next_component]
+            memo[current] = bits
+            pending.pop()
+        return memo[component]
+
+    def longest_chain(self, component, memo, next_components):
+        '''
+        Helper function.
+        Get the length of the longest chain of components from a component,
+        computing the missing lengths of the components on the way.
+        '''
+        pending = [component]
+        while pending:
+            current = pending[-1]
+            if current in memo:
+                pending.pop()
+                continue
+            missing = [next_component for next_component in next_components[current] if next_component not in memo]
+            if missing:
+                pending.extend(missing)
+                continue
+            memo[current] = 1 + max((memo[next_component] for next_component in next_components[current]), default=-1)
+            pending.pop()
+        return memo[component]
+
+    def extend_closure(self, component, memo, next_components, bits, bit):
+        '''
+        Helper function.
+        Add a bitset to the memoized bitset of a component and of the components
+        whose bitsets were built from it, after a new import. The walk stops at
+        components that already have the bit, since they already have all of the bitset.
+        '''
+        pending = [component]
+        while pending:
+            current = pending.pop()
+            current_bits = memo.get(current)
+            if current_bits is not None and not (current_bits >> bit) & 1:
+                memo[current] = current_bits | bits
+                pending.extend(next_components[current])
+
+    def extend_chain(self, component, memo, next_components, length):
+        '''
+        Helper function.
+        Raise the memoized chain length of a component, and of the components
+        whose lengths were built from it, after a new import.
+        '''
+        pending = [(component, length)]
+        while pending:
+            current, length = pending.pop()
+            current_length = memo.get(current)
+            if current_length is not None and current_length < length:
+                memo[current] = length
+                pending.extend((next_component, length + 1) for next_component in next_components[current])
+
+    def invalidate(self, component, memo, next_components):
+        '''
+        Helper function.
+        Drop the memoized result of a component and of the components whose
+        results were built from it. A result is only kept if the results of
+        all its next components are kept, so the walk stops at components
+        without a result.
+        '''
+        pending = [component]
+        while pending:
+            current = pending.pop()
+            if memo.pop(current, None) is not None:
+                pending.extend(next_components[current])
+
+    def invalidate_around(self, importing_component, imported_component):
+        '''
+        Helper function.
+        Drop the results that an import from one component to another can change.
+        '''
+        self.invalidate(importing_component, self.reached, self.predecessors)
+        self.invalidate(importing_component, self.depths, self.predecessors)
+        self.invalidate(imported_component, self.reaching, self.successors)
+        self.invalidate(imported_component, self.heights, self.successors)
+
+    def node(self, full_module_name):
+        '''
+        Helper function.
+        Get the node of a module.
+
+        Raises
+        ------
+        KeyError if the module is not in the index.
+        '''
+        module_id = AASymbols.SYMBOLS.lookup(full_module_name)
+        if module_id is None or module_id not in self.positions:
+            raise KeyError("ReachabilityIndex: unknown module " + full_module_name)
+        return self.positions[module_id]
+
+    def names(self, bits, excluded_node):
+        '''
+        Helper function.
+        Get the sorted full names of the modules of the components in a bitset.
+        '''
+        names = AASymbols.SYMBOLS.names
+        module_ids = self.module_ids
+        return sorted(names[module_ids[node]] for component in bit_numbers(bits) for node in self.members[component] if node != excluded_node)
+
+    def depends_on(self, full_module_name, imported_module_full_name):
+        '''
+        Test if a module depends on another module, directly or transitively.
+        A module only depends on itself if it is part of an import cycle.
+
+        Parameters
+        ----------
+        full_module_name : string
+        imported_module_full_name : string
+
+        Returns
+        -------
+        bool
+        '''
+        node = self.node(full_module_name)
+        imported_node = self.node(imported_module_full_name)
+        component = self.component_of[node]
+        imported_component = self.component_of[imported_node]
+        if component == imported_component:
+            return node != imported_node or len(self.members[component]) > 1
+        return (self.closure(component, self.reached, self.successors) >> imported_component) & 1 == 1
+
+    def dependencies(self, full_module_name):
+        '''
+        Get the modules a module depends on, directly or transitively.
+
+        Returns
+        -------
+        list of string
+            Sorted full module names.
+        '''
+        node = self.node(full_module_name)
+        return self.names(self.closure(self.component_of[node], self.reached, self.successors), node)
+
+    def dependents(self, full_module_name):
+        '''
+        Get the modules that depend on a module, directly or transitively.
+
+        Returns
+        -------
+        list of string
+            Sorted full module names.
+        '''
+        node = self.node(full_module_name)
+        return self.names(self.closure(self.component_of[node], self.reaching, self.predecessors), node)
+
+    def dependency_depth(self, full_module_name):
+        '''
+        Get the length of the longest chain of imports starting at a module.
+        The modules of an import cycle count as one step.
+
+        Returns
+        -------
+        int
+            0 for a module that imports no other modules.
+        '''
+        return self.longest_chain(self.component_of[self.node(full_module_name)], self.depths, self.successors)
+
+    def dependent_depth(self, full_module_name):
+        '''
+        Get the length of the longest chain of imports ending at a module.
+        The modules of an import cycle count as one step.
+
+        Returns
+        -------
+        int
+            0 for a module that no other module imports.
+        '''
+        return self.longest_chain(self.component_of[self.node(full_module_name)], self.heights, self.predecessors)
+
+    def add_module(self, full_module_name):
+        '''
+        Add a module without imports to the index. Nothing happens if it is already there.
+        '''
+        module_id = AASymbols.SYMBOLS.id(full_module_name)
+        if module_id in self.positions:
+            return
+        node = self.positions[module_id] = len(self.module_ids)
+        self.module_ids.append(module_id)
+        self.imports.append(set())
+        self.importers.append(set())
+        self.component_of.append(-1)
+        self.add_component([node])
+
+    def add_import(self, full_module_name, imported_module_full_name):
+        '''
+        Record that a module imports another module. If that closes a cycle,
+        the components on the cycle are merged.
+        '''
+        node = self.node(full_module_name)
+        imported_node = self.node(imported_module_full_name)
+        if node == imported_node or imported_node in self.imports[node]:
+            return
+        component = self.component_of[node]
+        imported_component = self.component_of[imported_node]
+        self.imports[node].add(imported_node)
+        self.importers[imported_node].add(node)
+        if component == imported_component:
+            return
+        if not (self.closure(imported_component, self.reached, self.successors) >> component) & 1:
+            # no new cycle, so the results only grow and can be updated in place
+            if component in self.reached:
+                self.extend_closure(component, self.reached, self.predecessors, self.reached[imported_component], imported_component)
+            if imported_component in self.reaching:
+                self.extend_closure(imported_component, self.reaching, self.successors, self.closure(component, self.reaching, self.predecessors), component)
+            if component in self.depths:
+                self.extend_chain(component, self.depths, self.predecessors, 1 + self.longest_chain(imported_component, self.depths, self.successors))
+            if imported_component in self.heights:
+                self.extend_chain(imported_component, self.heights, self.successors, 1 + self.longest_chain(component, self.heights, self.predecessors))
+            self.link(component, imported_component, 1)
+            return
+        # the components on the new cycle: reached from the imported component, and reaching the importing component
+        on_cycle = self.reached[imported_component] & self.closure(component, self.reaching, self.predecessors)
+        self.invalidate_around(component, imported_component)
+        merged = bit_numbers(on_cycle)
+        nodes = [node for merged_component in merged for node in self.members[merged_component]]
+        for merged_component in merged:
+            self.invalidate_around(merged_component, merged_component)
+            self.remove_component(merged_component)
+        self.add_component(nodes)
+
+    def remove_import(self, full_module_name, imported_module_full_name):
+        '''
+        Record that a module no longer imports another module. If that breaks
+        a cycle, the component of the cycle is split again.
+        '''
+        node = self.node(full_module_name)
+        imported_node = self.node(imported_module_full_name)
+        if imported_node not in self.imports[node]:
+            return
+        component = self.component_of[node]
+        imported_component = self.component_of[imported_node]
+        self.invalidate_around(component, imported_component)
+        self.imports[node].discard(imported_node)
+        self.importers[imported_node].discard(node)
+        if component != imported_component:
+            self.link(component, imported_component, -1)
+            return
+        # find the components among the nodes of the old component only
+        nodes = self.members[component]
+        local = {node: position for position, node in enumerate(nodes)}
+        offsets = array("i", [0])
+        targets = array("i")
+        for member in nodes:
+            targets.extend(sorted(local[imported_member] for imported_member in self.imports[member] if imported_member in local))
+            offsets.append(len(targets))
+        split = AACycles.strongly_connected_components(AAGraph.ModuleGraph(array("i", [self.module_ids[member] for member in nodes]), offsets, targets))
+        if len(split) == 1:
+            return
+        self.remove_component(component)
+        for positions in split:
+            self.add_component([nodes[position] for position in positions])
+
+    def set_imports(self, full_module_name, imported_module_full_names):
+        '''
+        Replace the imports of a module, adding and removing only the changed ones.
+
+        Parameters
+        ----------
+        full_module_name : string
+        imported_module_full_names : iterable of string
+            Full names of the modules it now imports. Must be in the index.
+        '''
+        node = self.node(full_module_name)
+        imported_nodes = set(self.node(imported_module_full_name) for imported_module_full_name in imported_module_full_names)
+        imported_nodes.discard(node)
+        names = AASymbols.SYMBOLS.names
+        for imported_node in self.imports[node] - imported_nodes:
+            self.remove_import(full_module_name, names[self.module_ids[imported_node]])
+        for imported_node in imported_nodes - self.imports[node]:
+            self.add_import(full_module_name, names[self.module_ids[imported_node]])
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    import random
+    from AAModuleTree import AAModuleTree
+    roots = AAModuleTree.ModuleRoots()
+    for full_name, imports in [("app", ["app.a", "flask"]), ("app.a", ["app.b.f"]), ("app.b", ["app.c"]), ("app.c", ["app.a", "app.d"]), ("app.d", []), ("lib", ["app.d"])]:
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.imports = imports
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    external_module_roots = AAModuleTree.ModuleRoots()
+    AAModuleTree.build_external_module_tree(roots, external_module_roots)
+    index = reachability_index(roots, external_module_roots)
+    assert index.dependencies("app") == ["app.a", "app.b", "app.c", "app.d", "flask"]
+    assert index.dependencies("app.a") == ["app.b", "app.c", "app.d"]
+    assert index.dependents("app.d") == ["app", "app.a", "app.b", "app.c", "lib"]
+    assert index.depends_on("app.b", "app.b") and not index.depends_on("app", "app") and not index.depends_on("lib", "app")
+    assert [index.dependency_depth(name) for name in ["app", "app.a", "app.d", "lib", "flask"]] == [2, 1, 0, 1, 0]
+    assert [index.dependent_depth(name) for name in ["app", "app.a", "app.d", "flask"]] == [0, 1, 2, 1]
+
+    # breaking and closing cycles only changes the components involved
+    index.remove_import("app.c", "app.a")
+    assert not index.depends_on("app.b", "app.a") and index.dependency_depth("app") == 4
+    index.add_import("app.d", "app")
+    assert index.dependents("lib") == [] and index.dependencies("lib") == ["app", "app.a", "app.b", "app.c", "app.d", "flask"]
+    assert index.depends_on("app.d", "app.d") and index.dependency_depth("lib") == 2
+    index.add_module("app.e")
+    index.set_imports("app.e", ["app.d"])
+    assert index.dependents("app.e") == [] and "app.e" in index.dependents("app.d")
+
+    # random changes give the same answers as an index built from scratch
+    random.seed(3)
+    size = 40
+    names = ["reach.m" + str(node) for node in range(size)]
+    edges = set()
+    def fresh_index():
+        module_ids = array("i", [AASymbols.SYMBOLS.id(name) for name in names])
+        offsets = array("i", [0])
+        targets = array("i")
+        for node in range(size):
+            targets.extend(sorted(target for source, target in edges if source == node))
+            offsets.append(len(targets))
+        return ReachabilityIndex(AAGraph.ModuleGraph(module_ids, offsets, targets))
+    index = fresh_index()
+    for step in range(300):
+        source, target = random.sample(range(size), 2)
+        if (source, target) in edges:
+            edges.discard((source, target))
+            index.remove_import(names[source], names[target])
+        else:
+            edges.add((source, target))
+            index.add_import(names[source], names[target])
+        if step % 20 == 0:
+            fresh = fresh_index()
+            for name in random.sample(names, 5):
+                assert index.dependencies(name) == fresh.dependencies(name)
+                assert index.dependents(name) == fresh.dependents(name)
+                assert index.dependency_depth(name) == fresh.dependency_depth(name)
+                assert index.dependent_depth(name) == fresh.dependent_depth(name)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Layering rules for the target system, e.g., for gating commits in CI.
+    The rules are read from a json file like:
+        {
+            "groups": {"api": ["zeeguu.api"], "core": ["zeeguu.core"]},
+            "rules": [
+                {"type": "forbidden", "from": "core", "to": "api"},
+                {"type": "allowed", "from": "tools", "to": "elasticsearch",
+                 "name": "only tools may use elasticsearch"}
+            ]
+        }
+    "from" and "to" are a group, a module name prefix, or a list of those.
+    A prefix covers the module of that name and all its sub modules.
+    A forbidden rule is violated by every import from a module covered by
+    "from" of a module covered by "to". An allowed rule is violated by every
+    import of a module covered by "to" from a module that is covered by
+    neither "from" nor "to".
+    All rules are checked in one pass over the resolved imports of
+    AAGraph.module_graph. Each module gets a bitmask of the prefixes that
+    cover it, so a rule is a couple of integer tests per import.
+    Only the files with violations are parsed again, to find the line
+    numbers of the violating import statements.
+"""
+
+import json
+from AAAST import AAAST
+from AAGraph import AAGraph
+from AAModuleTree import AAModuleTree
+from AASymbols import AASymbols
+
+RULE_TYPES = ["forbidden", "allowed"]
+
+def parse_rules(config):
+    '''
+    Check a rule configuration and expand its groups.
+
+    Parameters
+    ----------
+    config : dict
+        Configuration, see the top of this file.
+
+    Returns
+    -------
+    list of dict
+        One per rule:
+        "name" : the name given in the configuration, or a description of the rule.
+        "type" : "forbidden" or "allowed".
+        "from", "to" : lists of module name prefixes.
+
+    Raises
+    ------
+    ValueError if the configuration is not valid.
+    '''
+    if not isinstance(config, dict):
+        raise ValueError("AARules: the configuration must be a json object")
+    groups = config.get("groups", {})
+    if not isinstance(groups, dict) or not all(isinstance(prefixes, list) and all(isinstance(prefix, str) for prefix in prefixes) for prefixes in groups.values()):
+        raise ValueError("AARules: \"groups\" must map group names to lists of module name prefixes")
+
+    def prefixes(value, where):
+        values = [value] if isinstance(value, str) else value
+        if not isinstance(values, list) or not values or not all(isinstance(each, str) and each for each in values):
+            raise ValueError("AARules: " + where + " must be a group, a module name prefix or a list of those")
+        result = []
+        for each in values:
+            result.extend(groups.get(each, [each]))
+        return result
+
+    rules = []
+    for number, rule in enumerate(config.get("rules", []), 1):
+        where = "rule " + str(number)
+        if not isinstance(rule, dict) or rule.get("type") not in RULE_TYPES:
+            raise ValueError("AARules: " + where + " must have a \"type\" of " + " or ".join(RULE_TYPES))
+        parsed = {"type": rule["type"], "from": prefixes(rule.get("from"), where + " \"from\""), "to": prefixes(rule.get("to"), where + " \"to\"")}
+        if "name" in rule:
+            parsed["name"] = str(rule["name"])
+        elif rule["type"] == "forbidden":
+            parsed["name"] = ", ".join(parsed["from"]) + " must not import " + ", ".join(parsed["to"])
+        else:
+            parsed["name"] = "only " + ", ".join(parsed["from"]) + " may import " + ", ".join(parsed["to"])
+        rules.append(parsed)
+    return rules
+
+
+def load_rules(path):
+    '''
+    Read and check a rule configuration file.
+
+    Parameters
+    ----------
+    path : string
+        Path of the json file.
+
+    Returns
+    -------
+    list of dict
+        See parse_rules.
+
+    Raises
+    ------
+    ValueError if the file is not valid json or not a valid configuration.
+    OSError if the file cannot be read.
+    '''
+    with open(path, encoding="utf-8") as file:
+        try:
+            config = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError("AARules: " + path + " is not valid json: " + str(e)) from e
+    return parse_rules(config)
+
+
+def read_file(module_description):
+    '''
+    Get the contents of the file of a module from the file system.
+
+    Returns
+    -------
+    bytes
+        The contents. None if the file cannot be read.
+    '''
+    try:
+        with open(module_description.full_path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def import_lines(module_description, imported_module_ids, resolve, read_source):
+    '''
+    Helper function for check_rules.
+    Find the lines of a module's file that import some modules.
+
+    Parameters
+    ----------
+    module_description : ModuleDescription
+    imported_module_ids : collection of int
+        Name IDs of the imported modules.
+    resolve : function taking a name ID
+        Gives the name ID of the module an import name refers to, or None.
+    read_source : function taking a ModuleDescription
+        Gives the contents of its file, or None.
+
+    Returns
+    -------
+    dict
+        Sorted line numbers by imported module name ID. Empty if the file
+        cannot be read or parsed, e.g., because it changed since it was analyzed.
+    '''
+    source = read_source(module_description)
+    if source is None:
+        return {}
+    try:
+        imports = AAAST.get_import_lines(AAAST.get_ast_for_source(source))
+    except (SyntaxError, ValueError, RecursionError):
+        return {}
+    lines = {}
+    for imported_module_full_name, line in imports:
+        imported_module_id = resolve(AASymbols.SYMBOLS.id(imported_module_full_name))
+        if imported_module_id in imported_module_ids:
+            lines.setdefault(imported_module_id, set()).add(line)
+    return {imported_module_id: sorted(module_lines) for imported_module_id, module_lines in lines.items()}
+
+
+def check_rules(rules, roots, external_module_roots = {}, read_source = read_file):
+    '''
+    Find the imports that violate a set of rules.
+
+    Parameters
+    ----------
+    rules : list of dict
+        See parse_rules.
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees, optional
+        Description of the external packages. The default is {}.
+    read_source : function taking a ModuleDescription, optional
+        Gives the contents of its file, or None. Only called for the modules
+        with violations. The default is read_file.
+
+    Returns
+    -------
+    list of dict
+        One per violating import, sorted on the path:
+        "rule" : name of the violated rule.
+        "module" : full name of the importing module.
+        "imported_module" : full name of the imported module.
+        "path" : full_path of the importing module.
+        "lines" : line numbers of the import statements. Empty if they could not be found.
+    '''
+    symbols = AASymbols.SYMBOLS
+    prefix_bits = {} # name ID of a prefix -> its bit
+    def bits(prefixes):
+        result = 0
+        for prefix in prefixes:
+            result |= prefix_bits.setdefault(symbols.id(prefix), 1 << len(prefix_bits))
+        return result
+    # Each rule as (name, forbidden, bits of "from", bits of "to"). An allowed rule also allows
+    # the imports inside "to", and is violated by the importers that have none of its "from" bits.
+    rule_bits = []
+    for rule in rules:
+        from_bits = bits(rule["from"])
+        to_bits = bits(rule["to"])
+        rule_bits.append((rule["name"], rule["type"] == "forbidden", from_bits if rule["type"] == "forbidden" else from_bits | to_bits, to_bits))
+    target_bits = 0
+    for _, _, _, to_bits in rule_bits:
+        target_bits |= to_bits
+
+    graph = AAGraph.module_graph(roots, external_module_roots)
+    index = AASymbols.MODULE_INDEX
+    index.refresh()
+    parent = index.parent
+    masks = [] # node -> bits of the prefixes covering the module
+    for module_id in graph.module_ids:
+        mask = 0
+        while module_id >= 0:
+            mask |= prefix_bits.get(module_id, 0)
+            module_id = parent[module_id]
+        masks.append(mask)
+
+    offsets = graph.offsets
+    targets = graph.targets
+    violations = {} # node -> {imported node: names of violated rules}
+    for node in range(graph.size()):
+        mask = masks[node]
+        for edge in range(offsets[node], offsets[node + 1]):
+            imported_mask = masks[targets[edge]]
+            if not imported_mask & target_bits:
+                continue
+            for rule_name, forbidden, from_bits, to_bits in rule_bits:
+                if imported_mask & to_bits and bool(mask & from_bits) == forbidden:
+                    violations.setdefault(node, {}).setdefault(targets[edge], []).append(rule_name)
+
+    names = symbols.names
+    def resolve(module_id):
+        module_description = AAModuleTree.resolve_import(roots, module_id)
+        if module_description is None:
+            module_description = AAModuleTree.resolve_import(external_module_roots, module_id)
+        return None if module_description is None else module_description.name_id
+    report = []
+    for node, imported_nodes in violations.items():
+        module_description = AAModuleTree.get_module_description(roots, names[graph.module_ids[node]])
+        lines = import_lines(module_description, set(graph.module_ids[imported_node] for imported_node in imported_nodes), resolve, read_source)
+        for imported_node, rule_names in imported_nodes.items():
+            imported_module_id = graph.module_ids[imported_node]
+            for rule_name in rule_names:
+                report.append({"rule": rule_name,
+                               "module": module_description.full_name,
+                               "imported_module": names[imported_module_id],
+                               "path": module_description.full_path,
+                               "lines": lines.get(imported_module_id, [])})
+    report.sort(key=lambda violation: (violation["path"], violation["lines"], violation["imported_module"], violation["rule"]))
+    return report
+
+
+def self_test():
+    '''
+    Run the tests of this file.
+    '''
+    sources = {"zeeguu.core.model": b"import os\nfrom zeeguu.api.endpoints import user\n\nimport zeeguu.api\n",
+               "zeeguu.core.search": b"import elasticsearch\n",
+               "zeeguu.api.endpoints": b"from zeeguu.core.model import User\n",
+               "tools.reindex": b"from elasticsearch import helpers\n"}
+    roots = AAModuleTree.ModuleRoots()
+    for full_name, source in sources.items():
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.full_path = full_name.replace(".", "/") + ".py"
+        module_description.imports = AAAST.get_imports(AAAST.get_ast_for_source(source))
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    for full_name in ["zeeguu", "zeeguu.api"]: # the packages have no imports, but the api package is imported
+        module_description = AAModuleTree.ModuleDescription()
+        module_description.full_name = full_name
+        module_description.full_path = full_name.replace(".", "/") + "/__init__.py"
+        AAModuleTree.add_module_description_to_roots(module_description, roots)
+    external_module_roots = AAModuleTree.ModuleRoots()
+    AAModuleTree.build_external_module_tree(roots, external_module_roots)
+    rules = parse_rules({"groups": {"core": ["zeeguu.core"], "search": ["elasticsearch", "whoosh"]},
+                         "rules": [{"type": "forbidden", "from": "core", "to": "zeeguu.api"},
+                                   {"type": "allowed", "from": ["tools"], "to": "search", "name": "search"},
+                                   {"type": "forbidden", "from": "tools", "to": "core"}]})
+    assert [rule["name"] for rule in rules] == ["zeeguu.core must not import zeeguu.api", "search", "tools must not import zeeguu.core"]
+    read_source = lambda module_description: sources.get(module_description.full_name)
+    report = check_rules(rules, roots, external_module_roots, read_source)
+    assert [(violation["path"], violation["lines"], violation["imported_module"], violation["rule"]) for violation in report] == [
+        ("zeeguu/core/model.py", [2], "zeeguu.api.endpoints", "zeeguu.core must not import zeeguu.api"),
+        ("zeeguu/core/model.py", [4], "zeeguu.api", "zeeguu.core must not import zeeguu.api"),
+        ("zeeguu/core/search.py", [1], "elasticsearch", "search")]
+    assert check_rules(rules, roots, external_module_roots, lambda module_description: None)[0]["lines"] == []
+    assert check_rules(parse_rules({"rules": [{"type": "allowed", "from": "zeeguu", "to": "elasticsearch"}]}), roots, external_module_roots, read_source)[0]["module"] == "tools.reindex"
+    # The external tree, and so the imported module of a violation, must not depend on the import order.
+    for first, second in [("numpy.linalg", "numpy"), ("numpy", "numpy.linalg")]:
+        order_roots = AAModuleTree.ModuleRoots()
+        for full_name, imported_module_full_name in [("stats.first", first), ("stats.second", second)]:
+            module_description = AAModuleTree.ModuleDescription()
+            module_description.full_name = full_name
+            module_description.full_path = full_name.replace(".", "/") + ".py"
+            module_description.imports = AAAST.get_imports(AAAST.get_ast_for_source(("import " + imported_module_full_name + "\n").encode()))
+            AAModuleTree.add_module_description_to_roots(module_description, order_roots)
+        order_external_module_roots = AAModuleTree.ModuleRoots()
+        AAModuleTree.build_external_module_tree(order_roots, order_external_module_roots)
+        report = check_rules(parse_rules({"rules": [{"type": "forbidden", "from": "stats", "to": "numpy"}]}), order_roots, order_external_module_roots, lambda module_description: None)
+        assert sorted((violation["module"], violation["imported_module"]) for violation in report) == [("stats.first", "numpy"), ("stats.second", "numpy")], report
+    for config in [[], {"rules": [{"type": "required", "from": "a", "to": "b"}]}, {"rules": [{"type": "forbidden", "from": "a"}]}, {"groups": {"a": "b"}}]:
+        try:
+            parse_rules(config)
+            assert False, config
+        except ValueError:
+            pass
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Sparse matrix engine for the module import graph.
+    The modules of both collections of trees from AAModuleTree are numbered,
+    target system modules first, and the imports are stored once as a sparse
+    adjacency matrix A in CSR form, with A[i, j] = 1 when module i imports module j.
+    Folding is one sparse product P.T @ S @ R. S holds the imports as the
+    collections they stop in (see AAGraph.import_stop), the membership matrix
+    P has P[i, g] = 1 when module i is folded into module g, and R maps each
+    collection to the module its imports refer to after the fold (see
+    AAGraph.Folding). So an import of a namespace package counts for the
+    module the package is folded into, like in AAModuleTree.fold_modules. The
+    entries of the product count the module level imports between the folded
+    modules, so the edge weights come for free.
+    It is an opt-in fast path for AAModuleTree.fold_modules and
+    AAGraph.dependencies_digraph_from_roots on very large systems. The trees
+    stay the model, the matrix is built from them and is never changed.
+
+    numpy and scipy are optional. They are only imported when a matrix is
+    built, see load_sparse.
+"""
+
+from AAGraph import AAGraph
+from AAModuleTree import AAModuleTree
+from AASymbols import AASymbols
+
+def load_sparse():
+    '''
+    Import numpy and scipy.sparse.
+
+    Returns
+    -------
+    numpy, scipy.sparse
+
+    Raises
+    ------
+    ImportError if numpy or scipy is not installed.
+    '''
+    try:
+        import numpy
+        import scipy.sparse
+    except ImportError as e:
+        raise ImportError("AASparse needs numpy and scipy for the sparse matrix engine (pip install numpy scipy): " + str(e)) from e
+    return numpy, scipy.sparse
+
+
+def dependency_matrix(roots, external_module_roots = {}, resolve_imports = True):
+    '''
+    Build the adjacency matrix of the modules and imports found in the
+    input collection of trees.
+
+    Parameters
+    ----------
+    roots : collection of trees
+        Description of the target system modules
+    external_module_roots : collection of trees
+        Description of the external packages
+    resolve_imports : bool, optional
+        Resolve the imports to the modules they refer to, like
+        AAModuleTree.fold_modules does. If False, only the imports that name a
+        module exactly count, like in AAGraph.dependencies_digraph_from_roots.
+        The default is True.
+
+    Returns
+    -------
+    DependencyMatrix
+    '''
+    np, sparse = load_sparse()
+    system_modules = list(AAModuleTree.traverse_modules(roots))
+    external_modules = list(AAModuleTree.traverse_modules(external_module_roots))
+    modules = system_modules + external_modules
+    module_ids = np.array([module_description.name_id for module_description in modules], dtype=np.int64)
+    LOC = np.array([module_description.LOC for module_description in modules], dtype=np.int64)
+    size = len(modules)
+    system_count = len(system_modules)
+
+    # The imports of each module as the collections they stop in (see AAGraph.import_stop), each numbered once
+    if resolve_imports:
+        stop = lambda module_id : AAGraph.import_stop(roots, external_module_roots, module_id)
+    else:
+        module_id_set = set(module_ids.tolist())
+        stop = lambda module_id : module_id if module_id in module_id_set else -1
+    columns = {}   # stop ID -> column
+    column_of = {} # import ID -> column, -1 if it stops in no collection
+    def column(module_id):
+        stop_id = stop(module_id)
+        result = column_of[module_id] = -1 if stop_id < 0 else columns.setdefault(stop_id, len(columns))
+        return result
+    rows = []
+    stop_columns = []
+    for position, module_description in enumerate(system_modules):
+        module_stop_columns = set(map(column_of.get, module_description.import_ids))
+        if None in module_stop_columns:
+            module_stop_columns = set(column_of[module_id] if module_id in column_of else column(module_id) for module_id in module_description.import_ids)
+        module_stop_columns.discard(-1)
+        rows.extend([position] * len(module_stop_columns))
+        stop_columns.extend(module_stop_columns)
+    import_stops = sparse.csr_array((np.ones(len(rows), dtype=np.int64), (np.array(rows, dtype=np.int64), np.array(stop_columns, dtype=np.int64))), shape=(size, len(columns)))
+    stop_ids = np.array(list(columns), dtype=np.int64)
+    matrix = DependencyMatrix(module_ids, system_count, None, LOC, import_stops, stop_ids)
+    matrix.adjacency = matrix.fold_into(matrix.folding(lambda module_id : module_id)).adjacency
+    matrix.adjacency.data[:] = 1 # two imports may stop in different collections of the same module
+    return matrix
+
+
+def fold_modules(roots, external_module_roots, fold_predicate):
+    '''
+    Sparse version of AAModuleTree.fold_modules.
+
+    Returns
+    -------
+    DependencyMatrix
+        The folded modules and their weighted imports.
+    '''
+    return dependency_matrix(roots, external_module_roots).fold(fold_predicate)
+
+
+def fold_modules_to_depth(roots, external_module_roots, depth):
+    '''
+    Sparse version of AAModuleTree.fold_modules_to_depth.
+
+    Returns
+    -------
+    DependencyMatrix
+        The folded modules and their weighted imports.
+    '''
+    return dependency_matrix(roots, external_module_roots).fold_to_depth(depth)
+
+
+'''
+    Class holding the import graph of a collection of trees as a sparse matrix.
+    Row and column i is the module with the name ID module_ids[i]. The first
+    system_count modules are target system modules, the rest external modules.
+    adjacency[i, j] is the number of modules folded into i importing a module
+    or collection that is folded into j (1 or 0 before folding).
+    LOC[i] is the sum of the LOC of the modules folded into i.
+    The folds start from import_stops, where import_stops[i, k] is 1 when
+    module i has an import that stops in the collection with the name ID
+    stop_ids[k] (see AAGraph.import_stop). For a folded matrix, they are the
+    imports of the folded modules.
+'''
+class DependencyMatrix:
+    def __init__(self, module_ids, system_count, adjacency, LOC, import_stops = None, stop_ids = None):
+        self.module_ids = module_ids
+        self.system_count = system_count
+        self.adjacency = adjacency
+        self.LOC = LOC
+        self.import_stops = adjacency if import_stops is None else import_stops
+        self.stop_ids = module_ids if stop_ids is None else stop_ids
+        self.collections = None # see AAGraph.module_collections, computed with the first fold
+
+    def folding(self, fold_target):
+        '''
+        Helper function for fold and fold_to_depth. Fold the modules, see AAGraph.Folding.
+        '''
+        module_ids = self.module_ids.tolist()
+        if self.collections is None:
+            self.collections = AAGraph.module_collections(module_ids, self.system_count)
+        return AAGraph.Folding(module_ids, self.system_count, fold_target, self.collections)
+
+    def fold(self, fold_predicate):
+        '''
+        Fold modules into their parent modules, like AAModuleTree.fold_modules.
+
+        Parameters
+        ----------
+        fold_predicate : function that takes a string argument and returns bool
+            See AAModuleTree.fold_modules.
+
+        Returns
+        -------
+        DependencyMatrix
+        '''
+        names = AASymbols.SYMBOLS.names
+        index = AASymbols.MODULE_INDEX
+        index.refresh()
+        parent = index.parent
+        folded = {} # memo of fold_predicate by name ID
+        def fold_target(module_id):
+            path = []
+            ancestor_id = module_id
+            while ancestor_id >= 0:
+                path.append(ancestor_id)
+                ancestor_id = parent[ancestor_id]
+            for ancestor_id in reversed(path): # top down, like AAModuleTree.find_folded_modules
+                if ancestor_id not in folded:
+                    folded[ancestor_id] = fold_predicate(names[ancestor_id])
+                if folded[ancestor_id]:
+                    return parent[ancestor_id]
+            return module_id
+        return self.fold_into(self.folding(fold_target))
+
+    def fold_to_depth(self, depth):
+        '''
+        Fold all modules below a level into their ancestor at that level,
+        like AAModuleTree.fold_modules_to_depth.
+
+        Parameters
+        ----------
+        depth : int
+            Level of the deepest modules to keep.
+
+        Returns
+        -------
+        DependencyMatrix
+        '''
+        return self.fold_into(self.folding(AAGraph.depth_fold_target(depth)))
+
+    def fold_into(self, folding):
+        '''
+        Helper function for fold and fold_to_depth.
+        Compute P.T @ S @ R, where S is import_stops, P maps the modules to the
+        folded modules and R the collections the imports stop in.
+
+        Parameters
+        ----------
+        folding : AAGraph.Folding
+            Fold of module_ids.
+
+        Returns
+        -------
+        DependencyMatrix
+        '''
+        np, sparse = load_sparse()
+        size = len(self.module_ids)
+        folded_size = len(folding.module_ids)
+        nodes = np.frombuffer(folding.nodes, dtype=np.int32).astype(np.int64)
+        members = np.flatnonzero(nodes >= 0)
+        membership = sparse.csr_array((np.ones(len(members), dtype=np.int64), (members, nodes[members])), shape=(size, folded_size))
+        resolved = np.array([folding.resolve(stop_id) for stop_id in self.stop_ids.tolist()], dtype=np.int64)
+        stops = np.flatnonzero(resolved >= 0)
+        resolution = sparse.csr_array((np.ones(len(stops), dtype=np.int64), (stops, resolved[stops])), shape=(len(resolved), folded_size))
+        folded = (membership.T @ self.import_stops @ resolution).tocoo()
+
+        # A module that other modules were folded into drops its imports of
+        # its own sub modules, like AAModuleTree.discard_folded_modules
+        module_ids = np.frombuffer(folding.module_ids, dtype=np.int32).astype(np.int64)
+        absorbing = np.frombuffer(folding.absorbing, dtype=np.uint8).astype(bool)
+        index = AASymbols.MODULE_INDEX
+        index.refresh_intervals()
+        enter = np.frombuffer(index.enter, dtype=np.int32)
+        exit = np.frombuffer(index.exit, dtype=np.int32)
+        row_ids = module_ids[folded.row]
+        column_enter = enter[module_ids[folded.col]]
+        own_sub_module = absorbing[folded.row] & (enter[row_ids] <= column_enter) & (column_enter <= exit[row_ids])
+        keep = ~own_sub_module & (folded.data != 0)
+        adjacency = sparse.csr_array((folded.data[keep], (folded.row[keep], folded.col[keep])), shape=(folded_size, folded_size))
+        LOC = membership.T @ self.LOC
+        return DependencyMatrix(module_ids, folding.system_count, adjacency, LOC)
+
+    def module_names(self):
+        '''
+        Get the full module names of the rows, target system modules first.
+        '''
+        return AASymbols.SYMBOLS.name_list(self.module_ids.tolist())
+
+    def edges(self):
+        '''
+        Get the imports.
+
+        Returns
+        -------
+        list of (string, string, int)
+            Full names of the importing and the imported module, and the
+            number of module level imports between them.
+        '''
+        names = AASymbols.SYMBOLS.names
+        module_ids = self.module_ids.tolist()
+        adjacency = self.adjacency.tocoo()
+        return [(names[module_ids[row]], names[module_ids[column]], count)
+                for row, column, count in zip(adjacency.row.tolist(), adjacency.col.tolist(), adjacency.data.tolist())]
+
+    def digraph(self):
+        '''
+        Construct a networkx DiGraph like AAGraph.dependencies_digraph_from_roots.
+        The edges have the import counts as the "weight" attribute.
+
+        Returns
+        -------
+        networkx.DiGraph.
+        '''
+        import networkx as nx # only loaded when a graph is needed
+        G = nx.DiGraph()
+        for full_module_name in self.module_names():
+            if G.has_node(full_module_name):
+                print("!!!!!!!!!!!!!!! DependencyMatrix.digraph: Duplicate module name: " + full_module_name)
+            G.add_node(full_module_name)
+        G.add_edges_from((module_name, imported_module_name, {"weight": count}) for module_name, imported_module_name, count in self.edges())
+        return G
+
+
+def self_test():
+    '''
+    Run the tests of this file. Skipped if numpy or scipy is not installed.
+    '''
+    try:
+        load_sparse()
+    except ImportError as e:
+        print("AASparse.self_test: skipped. " + str(e))
+        return
+    def trees(modules):
+        roots = AAModuleTree.ModuleRoots()
+        for full_name, imports in modules:
+            module_description = AAModuleTree.ModuleDescription()
+            module_description.full_name = full_name
+            module_description.imports = imports
+            module_description.LOC = 10
+            AAModuleTree.add_module_description_to_roots(module_description, roots)
+        external_module_roots = AAModuleTree.ModuleRoots()
+        AAModuleTree.build_external_module_tree(roots, external_module_roots)
+        return roots, external_module_roots
+
+    roots, external_module_roots = trees([("app", ["app.a.x", "flask"]), ("app.a", ["app.b", "os"]), ("app.a.x", ["app.b.y.f", "requests.get"]), ("app.b", ["app.a.x"]), ("app.b.y", ["app.a"])])
+    # app.ns and app.a.ns have no ModuleDescription, like namespace packages
+    namespace_roots, namespace_external_module_roots = trees([("app", ["app.ns"]), ("app.a", ["app.a.ns.z.f", "os"]), ("app.a.ns.z", ["app.ns.m", "app.a"]),
+                                                              ("app.ns.m", ["app.a.ns", "app.ns.q", "app.ns.m"]), ("lib", ["app.ns", "app.a.ns", "lib.f"])])
+    for test_roots, test_external_module_roots in [(roots, external_module_roots), (namespace_roots, namespace_external_module_roots), (namespace_roots, AAModuleTree.ModuleRoots())]:
+        matrix = dependency_matrix(test_roots, test_external_module_roots)
+        assert matrix.module_names() == [module_description.full_name for module_description in AAModuleTree.traverse_modules(test_roots)] + \
+            [module_description.full_name for module_description in AAModuleTree.traverse_modules(test_external_module_roots)]
+        for depth in [0, 1, 2, 3, 4]:
+            folded_roots, folded_external_module_roots = AAModuleTree.fold_modules_to_depth(test_roots, test_external_module_roots, depth)
+            for folded in [matrix.fold_to_depth(depth), matrix.fold(lambda full_module_name : full_module_name.count(".") >= depth)]:
+                assert folded.module_names() == [module_description.full_name for module_description in AAModuleTree.traverse_modules(folded_roots)] + \
+                    [module_description.full_name for module_description in AAModuleTree.traverse_modules(folded_external_module_roots)]
+                assert sorted((module_name, imported_module_name) for module_name, imported_module_name, _ in folded.edges()) == \
+                    sorted(set((module_description.full_name, imported_module_name) for module_description in AAModuleTree.traverse_modules(folded_roots) for imported_module_name in module_description.imports))
+        # Without resolving, the imports that name a module exactly, like AAGraph.dependencies_digraph_from_roots
+        module_names = set(matrix.module_names())
+        assert sorted(edge[:2] for edge in dependency_matrix(test_roots, test_external_module_roots, resolve_imports=False).edges()) == \
+            sorted(set((module_description.full_name, imported_module_name) for module_description in AAModuleTree.traverse_modules(test_roots) for imported_module_name in module_description.imports if imported_module_name in module_names))
+    matrix = dependency_matrix(roots, external_module_roots)
+    folded = matrix.fold_to_depth(2)
+    assert sorted(folded.edges()) == [("app", "app.a", 1), ("app", "flask", 1), ("app.a", "app.b", 2), ("app.a", "os", 1), ("app.a", "requests.get", 1), ("app.b", "app.a", 2)]
+    assert folded.LOC.tolist()[:3] == [10, 20, 20]
+    folded = dependency_matrix(namespace_roots, namespace_external_module_roots).fold_to_depth(1)
+    assert sorted(folded.edges()) == [("app", "os", 1), ("lib", "app", 2), ("lib", "lib", 1)] # lib.f is in lib
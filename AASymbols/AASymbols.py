@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Symbol table for module names.
+    Each full module name is stored once and given an integer ID, so that
+    ModuleDescriptions can keep their name and imports as compact integers.
+    The strings are only needed again when the modules are displayed
+    (AAGraph and AAView).
+    ModuleIndex answers containment and level queries about the names
+    with integer comparisons instead of splitting the names.
+"""
+
+import sys
+from array import array
+
+'''
+    Class mapping full module names to integer IDs and back
+'''
+class SymbolTable:
+    def __init__(self):
+        self.names = []  # ID -> full module name
+        self.ids = {}    # full module name -> ID
+
+    def id(self, full_module_name):
+        '''
+        Get the ID of a name. The name is added to the table if it is new.
+
+        Parameters
+        ----------
+        full_module_name : string
+
+        Returns
+        -------
+        int
+            ID of the name.
+        '''
+        symbol_id = self.ids.get(full_module_name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            full_module_name = sys.intern(full_module_name)
+            self.names.append(full_module_name)
+            self.ids[full_module_name] = symbol_id
+        return symbol_id
+
+    def lookup(self, full_module_name):
+        '''
+        Get the ID of a name without adding it to the table.
+
+        Returns
+        -------
+        int
+            ID of the name, or None if the name is not in the table.
+        '''
+        return self.ids.get(full_module_name)
+
+    def name(self, symbol_id):
+        '''
+        Get the name for an ID.
+        '''
+        return self.names[symbol_id]
+
+    def id_array(self, full_module_names):
+        '''
+        Convert a collection of names to a sorted array of unique IDs.
+
+        Parameters
+        ----------
+        full_module_names : iterable of string
+
+        Returns
+        -------
+        array of int
+        '''
+        return array("i", sorted(set(self.id(full_module_name) for full_module_name in full_module_names)))
+
+    def name_list(self, symbol_ids):
+        '''
+        Convert a collection of IDs to a list of names.
+        '''
+        names = self.names
+        return [names[symbol_id] for symbol_id in symbol_ids]
+
+
+# The table shared by all module trees. Sharing it means that IDs from
+# different trees (e.g., folded views, or two analyzed revisions) can be compared.
+SYMBOLS = SymbolTable()
+
+def id_array(symbol_ids):
+    '''
+    Convert a collection of IDs to a sorted array of unique IDs.
+    '''
+    return array("i", sorted(set(symbol_ids)))
+
+
+'''
+    Class indexing the module hierarchy of the names in a SymbolTable.
+    Every name is a node. Its parent is the name without the last component,
+    which is added to the table if needed. The nodes are numbered in
+    pre-order, so a module contains another module exactly when the
+    pre-order interval of the first encloses the number of the second.
+    The parents and depths are extended when names have been added to the
+    table. The pre-order numbers are only rebuilt when a containment query
+    needs them, since a new name can renumber every node.
+'''
+class ModuleIndex:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.size = 0             # number of names with a parent and depth
+        self.ordered = 0          # number of names with pre-order numbers
+        self.parent = array("i")  # ID -> ID of the parent. -1 for top level modules.
+        self.depth = array("i")   # ID -> number of components in the name
+        self.enter = array("i")   # ID -> pre-order number
+        self.exit = array("i")    # ID -> largest pre-order number in the sub tree
+
+    def refresh(self):
+        '''
+        Add the parents and depths of the names added to the table since the last refresh.
+        '''
+        names = self.symbols.names
+        if self.size == len(names):
+            return
+        ids = self.symbols.ids
+        parent = self.parent
+        depth = self.depth
+        symbol_id = self.size
+        while symbol_id < len(names): # grows while the missing parents are added
+            name = names[symbol_id]
+            parent_name, dot, _ = name.rpartition(".")
+            if dot:
+                parent_id = ids.get(parent_name)
+                parent.append(self.symbols.id(parent_name) if parent_id is None else parent_id)
+            else:
+                parent.append(-1)
+            depth.append(name.count(".") + 1)
+            symbol_id += 1
+        self.size = len(names)
+
+    def refresh_intervals(self):
+        '''
+        Refresh the index and rebuild the pre-order numbers if names have been added.
+        The numbers are new arrays, so callers holding the previous ones keep a consistent snapshot.
+        '''
+        self.refresh()
+        names = self.symbols.names
+        size = len(names)
+        if self.ordered == size:
+            return
+        parent = self.parent
+        # Sorting on the name components gives the pre-order, with each sub tree in one block.
+        # With the dots replaced by the smallest character, plain string order is component order.
+        pre_order = sorted(range(size), key=lambda symbol_id: names[symbol_id].replace(".", "\0"))
+        enter = array("i", bytes(4 * size))
+        for number, symbol_id in enumerate(pre_order):
+            enter[symbol_id] = number
+        exit = array("i", enter)
+        for symbol_id in reversed(pre_order): # sub modules before their parents
+            parent_id = parent[symbol_id]
+            if parent_id >= 0 and exit[symbol_id] > exit[parent_id]:
+                exit[parent_id] = exit[symbol_id]
+        self.enter = enter
+        self.exit = exit
+        self.ordered = size
+
+    def contains(self, parent_id, child_id):
+        '''
+        Test if one module contains another. A module does not contain itself.
+        Like AAModule.module_contains_module, but for IDs.
+        '''
+        if self.ordered != len(self.symbols.names):
+            self.refresh_intervals()
+        return parent_id != child_id and self.enter[parent_id] <= self.enter[child_id] <= self.exit[parent_id]
+
+    def level(self, symbol_id):
+        '''
+        Get the number of components in the name of a module. Like AAModule.module_level.
+        '''
+        if self.size != len(self.symbols.names):
+            self.refresh()
+        return self.depth[symbol_id]
+
+    def ancestor(self, symbol_id, depth):
+        '''
+        Get the ID of the parent of a module at a level. Like AAModule.top_level_module.
+        The module itself if it is not below that level.
+        '''
+        if self.size != len(self.symbols.names):
+            self.refresh()
+        parent = self.parent
+        level = self.depth[symbol_id]
+        while level > depth:
+            symbol_id = parent[symbol_id]
+            level -= 1
+        return symbol_id
+
+
+# The index of the shared table.
+MODULE_INDEX = ModuleIndex(SYMBOLS)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Purpose:
+    Watch mode. Keeps the module trees from AAModuleTree.init_tree_collection
+    up to date while the target system is being edited.
+    The py-files are polled for changes. Only the touched files are parsed again,
+    and the matching ModuleDescriptions in roots are patched in place.
+    The external package tree is updated incrementally. Like
+    AAModuleTree.build_external_module_tree, it holds the shortest of the
+    imported names that do not refer to a system module, so it matches a
+    fresh analysis whatever the order of the edits.
+    Subscribers, e.g., AAQuery.LiveView, are told about each module that is
+    added, removed or changed, and about each external module that is added
+    or removed, so they can update themselves incrementally too.
+"""
+
+import os
+import time
+from AAFileSystem import AAFileSystem
+from AAModuleTree import AAModuleTree
+from AAIngest import AAIngest
+
+def file_snapshot():
+    '''
+    Get the size and modification time of all py-files in the target system.
+
+    Returns
+    -------
+    dict
+        (size, mtime) by full file path.
+    '''
+    snapshot = {}
+    for file in AAFileSystem.all_file_paths(".py"):
+        full_path = str(file)
+        try:
+            stat = os.stat(full_path)
+        except OSError: # deleted while walking
+            continue
+        snapshot[full_path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def top_level_name(full_module_name):
+    '''
+    Get the first component of a module name.
+    '''
+    return full_module_name.partition(".")[0]
+
+
+def names_are_related(module_name1, module_name2):
+    '''
+    Test if one of two modules contains the other, or if they are the same module.
+    '''
+    return module_name1 == module_name2 or \
+        module_name1.startswith(module_name2 + ".") or \
+        module_name2.startswith(module_name1 + ".")
+
+
+'''
+    Class for keeping a pair of module trees up to date with the files of the target system
+'''
+class TreeWatcher:
+    def __init__(self, roots, external_module_roots, fast_imports=False):
+        '''
+        Parameters
+        ----------
+        roots : collection of trees
+            Description of the target system modules. Modified in place by poll.
+        external_module_roots : collection of trees
+            Description of the external packages, e.g., from
+            AAModuleTree.build_external_module_tree. Modified in place by poll.
+        fast_imports : bool, optional
+            See AAIngest.scan_file. The default is False.
+        '''
+        self.roots = roots
+        self.external_module_roots = external_module_roots
+        self.fast_imports = fast_imports
+        self.modules_by_path = {}
+        self.importers = {}             # import name -> set of full names of the system modules importing it
+        self.unresolved = {}            # top level name -> the import names below it that do not refer to a system module
+        self.external_module_names = {} # top level name -> full names of the external modules below it
+        self.subscribers = []
+        for module_description in AAModuleTree.traverse_modules(roots):
+            self.modules_by_path[module_description.full_path] = module_description
+            for imported_module_full_name in module_description.imports:
+                self.importers.setdefault(imported_module_full_name, set()).add(module_description.full_name)
+        for imported_module_full_name in self.importers:
+            if AAModuleTree.get_module_description(roots, imported_module_full_name) == None:
+                self.unresolved.setdefault(top_level_name(imported_module_full_name), set()).add(imported_module_full_name)
+        for module_description in AAModuleTree.traverse_modules(external_module_roots):
+            self.external_module_names.setdefault(top_level_name(module_description.full_name), set()).add(module_description.full_name)
+        for top_level_module_name in self.unresolved.keys() | self.external_module_names.keys():
+            self.update_external_modules(top_level_module_name)
+        self.snapshot = file_snapshot()
+
+    def subscribe(self, subscriber):
+        '''
+        Tell a subscriber about the changes found by poll, after the trees have been updated.
+
+        Parameters
+        ----------
+        subscriber : object
+            Has the methods module_added(module_description),
+            module_removed(module_description) and
+            module_changed(previous_module_description, module_description)
+            for the target system modules, and external_module_added(module_description)
+            and external_module_removed(module_description) for the external
+            modules, like AAQuery.LiveView. An external module is reported
+            as soon as it is added or removed, which can be before the
+            target system module whose change caused it.
+
+        Returns
+        -------
+        None.
+        '''
+        self.subscribers.append(subscriber)
+
+    def add_import(self, full_module_name, imported_module_full_name):
+        importers = self.importers.get(imported_module_full_name)
+        if importers is None:
+            importers = self.importers[imported_module_full_name] = set()
+            self.resolve(imported_module_full_name)
+        importers.add(full_module_name)
+
+    def remove_import(self, full_module_name, imported_module_full_name):
+        importers = self.importers.get(imported_module_full_name)
+        if not importers or full_module_name not in importers:
+            return
+        importers.discard(full_module_name)
+        if not importers:
+            del self.importers[imported_module_full_name]
+            self.resolve(imported_module_full_name)
+
+    def resolve(self, imported_module_full_name):
+        '''
+        Find out if an import name refers to a system module, like
+        AAModuleTree.build_external_module_tree, and update the external
+        modules if that changed. A name that is no longer imported refers to nothing.
+        '''
+        top_level_module_name = top_level_name(imported_module_full_name)
+        unresolved = self.unresolved.setdefault(top_level_module_name, set())
+        is_unresolved = imported_module_full_name in self.importers and \
+            AAModuleTree.get_module_description(self.roots, imported_module_full_name) == None
+        if is_unresolved != (imported_module_full_name in unresolved):
+            if is_unresolved:
+                unresolved.add(imported_module_full_name)
+            else:
+                unresolved.discard(imported_module_full_name)
+            self.update_external_modules(top_level_module_name)
+        if not unresolved:
+            del self.unresolved[top_level_module_name]
+
+    def update_external_modules(self, top_level_module_name):
+        '''
+        Make the external modules below a top level name the shortest of the
+        import names below it that do not refer to a system module. The other
+        names are folded into them, as in AAModuleTree.build_external_module_tree,
+        so the result does not depend on the order the imports came in.
+        '''
+        external_module_names = set()
+        shortest = None
+        for imported_module_full_name in sorted(self.unresolved.get(top_level_module_name, ())): # a name comes right before the names below it
+            if shortest is None or not imported_module_full_name.startswith(shortest + "."):
+                shortest = imported_module_full_name
+                external_module_names.add(imported_module_full_name)
+        previous_external_module_names = self.external_module_names.pop(top_level_module_name, set())
+        for external_module_name in previous_external_module_names - external_module_names:
+            module_description = AAModuleTree.remove_module_description_from_roots(external_module_name, self.external_module_roots)
+            for subscriber in self.subscribers:
+                subscriber.external_module_removed(module_description)
+        for external_module_name in sorted(external_module_names - previous_external_module_names):
+            module_description = AAModuleTree.ModuleDescription()
+            module_description.set_as_external(external_module_name)
+            AAModuleTree.add_module_description_to_roots(module_description, self.external_module_roots)
+            for subscriber in self.subscribers:
+                subscriber.external_module_added(module_description)
+        if external_module_names:
+            self.external_module_names[top_level_module_name] = external_module_names
+
+    def re_resolve_related_imports(self, full_module_name):
+        '''
+        A system module was added or removed. Imports of names in the
+        collections added or removed along with it may now refer somewhere else.
+        '''
+        changed_module_name = AAModuleTree.changed_collection(self.roots, full_module_name)
+        for imported_module_full_name in [imported_module_full_name for imported_module_full_name in self.importers
+                                          if names_are_related(imported_module_full_name, changed_module_name)]:
+            self.resolve(imported_module_full_name)
+
+    def poll(self):
+        '''
+        Check the files of the target system for changes, and update
+        roots and external_module_roots accordingly.
+        Files that fail to parse keep their previous description and are
+        recorded in AAModuleTree.parse_errors.
+
+        Returns
+        -------
+        dict
+            Full module names of the "added", "removed" and "modified" modules.
+        '''
+        changes = {"added": [], "removed": [], "modified": []}
+        snapshot = file_snapshot()
+        for full_path in self.snapshot.keys() - snapshot.keys():
+            self.remove_file(full_path, changes)
+        for full_path, stat in snapshot.items():
+            if self.snapshot.get(full_path) != stat:
+                self.update_file(full_path, changes)
+        self.snapshot = snapshot
+        return changes
+
+    def remove_file(self, full_path, changes):
+        AAModuleTree.parse_errors.pop(full_path, None)
+        module_description = self.modules_by_path.pop(full_path, None)
+        if module_description is None:
+            return
+        for imported_module_full_name in module_description.imports:
+            self.remove_import(module_description.full_name, imported_module_full_name)
+        AAModuleTree.remove_module_description_from_roots(module_description.full_name, self.roots)
+        AAModuleTree.add_to_subtree_LOC(self.roots, module_description.full_name, -module_description.LOC)
+        self.re_resolve_related_imports(module_description.full_name)
+        changes["removed"].append(module_description.full_name)
+        for subscriber in self.subscribers:
+            subscriber.module_removed(module_description)
+
+    def update_file(self, full_path, changes):
+        scan = AAIngest.scan_file(full_path, fast_imports=self.fast_imports)
+        if scan["error"]:
+            print("TreeWatcher: keeping the previous version of " + full_path + ": " + scan["error"])
+            AAModuleTree.parse_errors[full_path] = scan["error"]
+            return
+        AAModuleTree.parse_errors.pop(full_path, None)
+        imports = set(scan["imports"])
+        module_description = self.modules_by_path.get(full_path)
+        if module_description is None:
+            module_description = AAModuleTree.ModuleDescription(full_path, scan)
+            existing = AAModuleTree.get_module_description(self.roots, module_description.full_name)
+            if existing and existing.full_name == module_description.full_name:
+                print("TreeWatcher: duplicate module name " + module_description.full_name + " for " + full_path)
+                return
+            AAModuleTree.add_module_description_to_roots(module_description, self.roots)
+            AAModuleTree.add_to_subtree_LOC(self.roots, module_description.full_name, module_description.LOC)
+            module_collection = self.roots
+            for component in module_description.full_name.split("."):
+                module_collection = module_collection[component]
+            # the new module may be the parent of existing modules. The new module is not shared yet, so it can be changed in place.
+            module_description.subtree_LOC = sum(sub_module_description.LOC for sub_module_description in AAModuleTree.traverse_modules(module_collection))
+            self.modules_by_path[full_path] = module_description
+            self.re_resolve_related_imports(module_description.full_name)
+            for imported_module_full_name in imports:
+                self.add_import(module_description.full_name, imported_module_full_name)
+            changes["added"].append(module_description.full_name)
+            for subscriber in self.subscribers:
+                subscriber.module_added(module_description)
+            return
+        previous_module_description = module_description.copy()
+        previous_imports = module_description.imports
+        for imported_module_full_name in previous_imports - imports:
+            self.remove_import(module_description.full_name, imported_module_full_name)
+        for imported_module_full_name in imports - previous_imports:
+            self.add_import(module_description.full_name, imported_module_full_name)
+        # the ModuleDescription may be shared with trees derived from roots, then it is replaced by a copy
+        module_description = AAModuleTree.set_module_imports(self.roots, module_description.full_name, imports)
+        self.modules_by_path[full_path] = module_description
+        module_description.content_hash = scan["content_hash"]
+        AAModuleTree.add_to_subtree_LOC(self.roots, module_description.full_name, scan["LOC"] - module_description.LOC)
+        module_description.LOC = scan["LOC"]
+        module_description.SLOC = scan["SLOC"]
+        changes["modified"].append(module_description.full_name)
+        for subscriber in self.subscribers:
+            subscriber.module_changed(previous_module_description, module_description)
+
+    def watch(self, on_change=None, interval=1.0):
+        '''
+        Poll the target system for changes until interrupted (Ctrl-C).
+
+        Parameters
+        ----------
+        on_change : function taking the dict returned by poll, optional
+            Called after each poll that found changes. E.g., to redraw views.
+            The default is None.
+        interval : number, optional
+            Seconds between polls. The default is 1.0.
+
+        Returns
+        -------
+        None.
+        '''
+        try:
+            while True:
+                changes = self.poll()
+                if on_change and any(changes.values()):
+                    on_change(changes)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def self_test():
+    '''
+    Run the tests of this file. Edits the files of a temporary target system
+    and compares the trees of a TreeWatcher with a fresh analysis after each
+    poll, and the AAQuery.LiveViews subscribed to it with the views of the trees.
+    '''
+    from AAQuery import AAQuery
+    from AASymbols import AASymbols
+    import random
+    import shutil
+    import tempfile
+    module_names = ["app", "app.a", "app.a.x", "app.b", "app.b.z", "lib", "lib.u", "lib.u.v"]
+    imported_names = module_names + ["app.a.x.f", "app.ns", "os", "os.path", "flask", "flask.json", "numpy.linalg"]
+    folder = tempfile.mkdtemp()
+    code_root_folder = AAFileSystem.CODE_ROOT_FOLDER
+    modification_times = iter(range(10**18, 2 * 10**18, 10**9)) # set explicitly, so that every edit is seen by the next poll
+
+    def file_path(full_module_name):
+        components = full_module_name.split(".")
+        if any(module_name.startswith(full_module_name + ".") for module_name in module_names):
+            components.append("__init__")
+        return os.path.join(folder, *components) + ".py"
+
+    def write(full_module_name, imports):
+        full_path = file_path(full_module_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as file:
+            file.write("".join("import " + imported_module_full_name + "\n" for imported_module_full_name in imports))
+        modification_time = next(modification_times)
+        os.utime(full_path, ns=(modification_time, modification_time))
+
+    def trees(roots, external_module_roots):
+        return sorted((module_description.full_name, sorted(module_description.imports), module_description.LOC, module_description.subtree_LOC)
+                      for module_description in AAModuleTree.traverse_modules(roots)), \
+            sorted(module_description.full_name for module_description in AAModuleTree.traverse_modules(external_module_roots))
+
+    def view(view_result):
+        names = AASymbols.SYMBOLS.names
+        return sorted(module_description.full_name for module_description in view_result.modules), \
+            sorted((names[module_id], names[imported_module_id]) for module_id, imported_module_id in view_result.edges)
+
+    try:
+        AAFileSystem.set_code_root_folder(folder)
+        write("app", ["lib.u", "flask.json", "flask"])
+        roots, external_module_roots = AAModuleTree.init_tree_collection()
+        watcher = TreeWatcher(roots, external_module_roots)
+        queries = [AAQuery.ViewQuery(fold=depth) for depth in [1, 2, 3]]
+        live_views = [AAQuery.LiveView(query, roots, external_module_roots) for query in queries]
+        for live_view in live_views:
+            watcher.subscribe(live_view)
+        edits = [("app", ["lib.u", "flask.json"]), ("app", ["lib.u", "flask.json", "flask"]), ("lib", [])] # flask.json is folded into flask again, lib.u into the new lib
+        rnd = random.Random(0)
+        for _ in range(60):
+            full_module_name = rnd.choice(module_names)
+            edits.append((full_module_name, None if rnd.random() < 0.3 else rnd.sample(imported_names, rnd.randrange(4))))
+        for full_module_name, imports in edits:
+            if imports is not None:
+                write(full_module_name, imports)
+            elif os.path.exists(file_path(full_module_name)):
+                os.remove(file_path(full_module_name))
+            watcher.poll()
+            assert trees(roots, external_module_roots) == trees(*AAModuleTree.init_tree_collection()), (full_module_name, imports)
+            for query, live_view in zip(queries, live_views):
+                assert view(live_view.result()) == view(query.execute(roots, external_module_roots)), (full_module_name, imports, query.fold)
+    finally:
+        AAFileSystem.CODE_ROOT_FOLDER = code_root_folder
+        shutil.rmtree(folder, ignore_errors=True)
@@ -1,54 +1,368 @@
-# -*- coding: utf-8 -*-
-"""
-@author: mlv
-"""
-
-from AAView import AAView
-from AAModuleTree import AAModuleTree
-
-roots, external_module_roots = AAModuleTree.init_tree_collection()
-#AAModuleTree.dump_modules(roots)
-#AAModuleTree.dump_modules(external_module_roots)
-
-AAView.create_top_module_view(roots, external_module_roots)
-
-AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.api", [], 1)
-
-AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.api.api", [], 1, ["flask"]) # excluding flask for clarity (most zeeguu.api.api modules depend on it)
-
-AAView.create_sub_module_view(roots, {}, "zeeguu.core", [], .2)
-
-AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.core.model", [], 3, ["sqlalchemy"]) # excluding sqlalchemy for clarity (most zeeguu.core.model modules depend on it)
-
-AAView.create_sub_module_view(roots, external_module_roots, "tools", [], 1)
-
-'''
-The remainder of the file are not part of the report.
-Just extracting statistics for explorative purposes.
-'''
-'''
-# from AAAST import AAAST
-# from AAModule import AAModule
-# from AAGraph import AAGraph
-# from AAFileSystem import AAFileSystem
-# from AAHistory import AAHistory
-
-# print("calc churn")
-# modules = AAModule.get_all_modules()
-# AAHistory.add_churns_for_modules(modules)
-# print("calc churn done")
-
-# # Attempt of a view of the rest api
-# RDG = AAGraph.rest_api_digraph(modules)
-# AAView.draw_graph_with_labels(RDG, (20,18))
-
-# print("################################################")
-# AAHistory.print_churns(AAHistory.get_all_commits())
-
-# print("=======================================")
-# AAModule.dump_raw_rest_api_data(modules)
-# print("=======================================")
-# AAModule.dump_rest_routes(modules)
-# print("=======================================")
-# AAFileSystem.dump_file_type_count()   
+# -*- coding: utf-8 -*-
+"""
+@author: mlv
+
+Command line entry point.
+    python ArchAnalyze.py [--root FOLDER] [options] [command]
+
+Commands:
+    views     display the graph plots used in the report (the default)
+    modules   list the modules with their LOC and imports
+    watch     keep the analysis up to date while the target system is edited
+    cycles    report the import cycles, exits with 1 if there are any
+    check     check the imports against layering rules, exits with 1 on violations
+    metrics   write the coupling metrics of the modules at each fold depth as CSV or Parquet
+    save      save the modules and imports as a model file for diff
+    diff      list the modules and imports that differ between two revisions or model files,
+              exits with 1 if there are any
+    selftest  run the tests of the AA packages
+
+Importing this file does no work. networkx and matplotlib are only
+imported by the commands that draw.
+"""
+
+import os
+import sys
+import argparse
+from AAFileSystem import AAFileSystem
+from AAModuleTree import AAModuleTree
+
+DEFAULT_CACHE_PATH = "ArchAnalyze.cache.json"
+DEFAULT_RULES_PATH = "ArchAnalyze.rules.json"
+
+def load_trees(args):
+    '''
+    Analyze the target system as specified by the command line arguments.
+
+    Returns
+    -------
+    roots, external_module_roots
+        See AAModuleTree.init_tree_collection. None if git cannot read the
+        revision, after printing why.
+    '''
+    cache_path = None if args.no_cache else args.cache
+    if args.revision:
+        import subprocess # only loaded when git is used
+        code_root_folder = AAFileSystem.get_code_root_folder()
+        try:
+            return AAModuleTree.init_tree_collection_from_git(code_root_folder, args.revision, cache_path, args.fast_imports)
+        except (subprocess.CalledProcessError, OSError):
+            print(args.command + ": " + args.revision + " is not a revision of " + code_root_folder)
+            return None
+    return AAModuleTree.init_tree_collection(args.workers, cache_path, args.fast_imports)
+
+
+def command_views(args):
+    from AAView import AAView
+    from AAQuery import AAQuery
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, external_module_roots = trees
+    rollups = AAQuery.RollupCache(roots, external_module_roots) # the sub module views are looked up in this
+
+    AAView.create_top_module_view(roots, external_module_roots)
+
+    AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.api", [], 1, rollups=rollups)
+
+    AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.api.api", [], 1, ["flask"], rollups) # excluding flask for clarity (most zeeguu.api.api modules depend on it)
+
+    AAView.create_sub_module_view(roots, {}, "zeeguu.core", [], .2)
+
+    AAView.create_sub_module_view(roots, external_module_roots, "zeeguu.core.model", [], 3, ["sqlalchemy"], rollups) # excluding sqlalchemy for clarity (most zeeguu.core.model modules depend on it)
+
+    AAView.create_sub_module_view(roots, external_module_roots, "tools", [], 1, rollups=rollups)
+
+
+def command_modules(args):
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, external_module_roots = trees
+    for module_description in AAModuleTree.traverse_modules(external_module_roots if args.external else roots):
+        print(module_description.full_name + "\t" + str(module_description.LOC) + "\t" + str(module_description.SLOC))
+        if args.imports:
+            for imported_module_full_name in sorted(module_description.imports):
+                print("    " + imported_module_full_name)
+
+
+def command_watch(args):
+    from AAWatch import AAWatch
+    if args.revision:
+        print("watch: --revision is not supported, the working tree is watched")
+        return 2
+    roots, external_module_roots = load_trees(args)
+    watcher = AAWatch.TreeWatcher(roots, external_module_roots, args.fast_imports)
+    live_view = None
+    dependencies = set()
+    if args.depth is not None:
+        from AAQuery import AAQuery
+        from AASymbols import AASymbols
+        live_view = AAQuery.LiveView(AAQuery.ViewQuery(fold=args.depth), roots, external_module_roots)
+        watcher.subscribe(live_view)
+        dependencies = set(live_view.result().edges)
+
+    def print_changes(changes):
+        nonlocal dependencies
+        for change, full_module_names in changes.items():
+            for full_module_name in full_module_names:
+                print(change + ": " + full_module_name)
+        if live_view is not None:
+            names = AASymbols.SYMBOLS.names
+            previous_dependencies, dependencies = dependencies, set(live_view.result().edges)
+            for sign, edges in [("-", previous_dependencies - dependencies), ("+", dependencies - previous_dependencies)]:
+                for module_id, imported_module_id in sorted(edges):
+                    print("  " + sign + " " + names[module_id] + " -> " + names[imported_module_id])
+
+    print("watch: watching " + AAFileSystem.get_code_root_folder() + " (Ctrl-C to stop)")
+    watcher.watch(print_changes, args.interval)
+
+
+def command_cycles(args):
+    from AACycles import AACycles
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, _ = trees
+    cycles = AACycles.import_cycles(roots, args.depth)
+    for cycle in cycles:
+        print("cycle group of " + str(len(cycle["modules"])) + " modules with " + str(cycle["imports"]) + " imports between them:")
+        for full_module_name in cycle["modules"]:
+            print("    " + full_module_name)
+        print("  breaking these " + str(len(cycle["break"])) + " imports breaks all its cycles" +
+              ("" if cycle["minimal"] else " (not pruned to a minimal set, the group has more than " + str(AACycles.PRUNED_GROUP_SIZE) + " modules)") + ":")
+        for full_module_name, imported_module_full_name, weight in cycle["break"]:
+            print("    " + full_module_name + " -> " + imported_module_full_name + ("" if args.depth is None else " (" + str(weight) + " module imports)"))
+    print("cycles: " + str(len(cycles)) + " cycle groups")
+    return 1 if cycles else 0
+
+
+def command_check(args):
+    from AARules import AARules
+    try:
+        rules = AARules.load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        print("check: " + str(e))
+        return 2
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, external_module_roots = trees
+    if args.revision:
+        from AAGitSource import AAGitSource
+        with AAGitSource.BlobReader(AAFileSystem.get_code_root_folder()) as reader:
+            violations = AARules.check_rules(rules, roots, external_module_roots,
+                                             lambda module_description: reader.read(module_description.content_hash) if module_description.content_hash else None)
+    else:
+        violations = AARules.check_rules(rules, roots, external_module_roots)
+    for violation in violations:
+        for line in violation["lines"] or [None]:
+            print(violation["path"] + ("" if line is None else ":" + str(line)) + ": " +
+                  violation["module"] + " imports " + violation["imported_module"] + " (" + violation["rule"] + ")")
+    print("check: " + str(len(violations)) + " violating imports of " + str(len(rules)) + " rules")
+    return 1 if violations else 0
+
+
+def command_metrics(args):
+    from AAMetrics import AAMetrics
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, external_module_roots = trees
+    table = AAMetrics.coupling_metrics(roots, external_module_roots, args.depth)
+    if args.output is None:
+        AAMetrics.write_csv(table, sys.stdout)
+    elif args.output.endswith(".parquet"):
+        AAMetrics.write_parquet(table, args.output)
+    else:
+        with open(args.output, "w", newline="", encoding="utf-8") as file:
+            AAMetrics.write_csv(table, file)
+
+
+def command_save(args):
+    from AADiff import AADiff
+    trees = load_trees(args)
+    if trees is None:
+        return 2
+    roots, external_module_roots = trees
+    AADiff.save_model(AADiff.model_from_trees(roots, external_module_roots), args.path)
+
+
+def load_model(args, source):
+    '''
+    Get the model of a diff argument.
+
+    Parameters
+    ----------
+    source : string
+        A model file written by the save command, or else a git revision
+        of the repository in the root folder.
+
+    Returns
+    -------
+    AADiff.ArchitectureModel
+
+    Raises
+    ------
+    ValueError if source is not a model file and git cannot read it as a revision.
+    '''
+    import subprocess # only loaded when git is used
+    from AADiff import AADiff
+    if os.path.isfile(source):
+        return AADiff.load_model(source)
+    cache_path = None if args.no_cache else args.cache
+    try:
+        roots, external_module_roots = AAModuleTree.init_tree_collection_from_git(AAFileSystem.get_code_root_folder(), source, cache_path, args.fast_imports)
+    except (subprocess.CalledProcessError, OSError) as e:
+        raise ValueError(source + " is neither a model file nor a revision") from e
+    return AADiff.model_from_trees(roots, external_module_roots)
+
+
+def command_diff(args):
+    from AADiff import AADiff
+    try:
+        old = load_model(args, args.old)
+        new = load_model(args, args.new)
+    except ValueError as e:
+        print("diff: " + str(e))
+        return 2
+    if args.depth is not None:
+        old = old.fold_to_depth(args.depth)
+        new = new.fold_to_depth(args.depth)
+    diff = AADiff.diff_models(old, new, args.package_depth)
+    for sign, change in [("-", "removed"), ("+", "added")]:
+        for full_module_name in diff[change + "_modules"]:
+            print(sign + " module " + full_module_name)
+    for sign, change in [("-", "removed"), ("+", "added")]:
+        for full_module_name, imported_module_full_name, weight in diff[change + "_imports"]:
+            print(sign + " " + full_module_name + " -> " + imported_module_full_name + ("" if args.depth is None else " (" + str(weight) + " module imports)"))
+    for package, summary in diff["packages"].items():
+        print(package + ": modules +" + str(summary["added_modules"]) + " -" + str(summary["removed_modules"]) +
+              ", imports +" + str(summary["added_imports"]) + " -" + str(summary["removed_imports"]))
+    return 1 if diff["packages"] else 0
+
+
+def command_selftest(args):
+    from AAAST import AAAST
+    from AAModule import AAModule
+    from AAQuery import AAQuery
+    from AASparse import AASparse
+    from AACycles import AACycles
+    from AAReach import AAReach
+    from AARules import AARules
+    from AAMetrics import AAMetrics
+    from AADiff import AADiff
+    from AAWatch import AAWatch
+    modules = [AAAST, AAFileSystem, AAModule, AAModuleTree, AAQuery, AASparse, AACycles, AAReach, AARules, AAMetrics, AADiff, AAWatch]
+    for module in modules:
+        module.self_test()
+    print("selftest: ok (" + ", ".join(module.__name__.split(".")[-1] for module in modules) + ")")
+
+
+def argument_parser():
+    '''
+    Build the parser for the command line.
+
+    Returns
+    -------
+    argparse.ArgumentParser
+    '''
+    parser = argparse.ArgumentParser(prog="ArchAnalyze", description="Architecture analysis of a python system.")
+    parser.add_argument("--root", help="root folder of the target system. The default is AAFileSystem.CODE_ROOT_FOLDER")
+    parser.add_argument("--clone", action="store_true", help="clone the target system into the root folder if it does not exist")
+    parser.add_argument("--revision", help="analyze this git revision of the repository in the root folder, without checking it out")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="parse cache file. The default is " + DEFAULT_CACHE_PATH)
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parse cache")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes parsing the files. 0 means one per CPU")
+    parser.add_argument("--fast-imports", action="store_true", help="extract the imports without building the AST")
+    commands = parser.add_subparsers(title="commands", dest="command")
+    parser.set_defaults(function=command_views, command="views")
+    commands.add_parser("views", help="display the graph plots used in the report").set_defaults(function=command_views)
+    modules = commands.add_parser("modules", help="list the modules with their LOC and SLOC")
+    modules.add_argument("--imports", action="store_true", help="also list the imports of each module")
+    modules.add_argument("--external", action="store_true", help="list the external packages instead")
+    modules.set_defaults(function=command_modules)
+    watch = commands.add_parser("watch", help="keep the analysis up to date while the target system is edited")
+    watch.add_argument("--interval", type=float, default=1.0, help="seconds between polls. The default is 1.0")
+    watch.add_argument("--depth", type=int, help="also print the dependencies between the modules folded to this level that appear or disappear")
+    watch.set_defaults(function=command_watch)
+    cycles = commands.add_parser("cycles", help="report the groups of modules that import each other in a cycle, and imports that would break them. Exits with 1 if there are any")
+    cycles.add_argument("--depth", type=int, help="fold the modules to this level first. The default is not to fold")
+    cycles.set_defaults(function=command_cycles)
+    check = commands.add_parser("check", help="report the imports that break the layering rules in a json file, see AARules. Exits with 1 if there are any")
+    check.add_argument("--rules", default=DEFAULT_RULES_PATH, help="rule file. The default is " + DEFAULT_RULES_PATH)
+    check.set_defaults(function=command_check)
+    metrics = commands.add_parser("metrics", help="write the afferent and efferent coupling and instability of the modules at each fold depth. Needs numpy")
+    metrics.add_argument("--depth", type=int, action="append", help="fold to this level. Can be given more than once. The default is every level")
+    metrics.add_argument("--output", help="file to write. Parquet (needs pyarrow) if it ends with .parquet, else CSV. The default is CSV on standard output")
+    metrics.set_defaults(function=command_metrics)
+    save = commands.add_parser("save", help="save the modules and imports as a model file, to compare later with diff")
+    save.add_argument("path", help="model file to write")
+    save.set_defaults(function=command_save)
+    diff = commands.add_parser("diff", help="list the modules and imports that appeared or disappeared between two revisions or model files. Exits with 1 if there are any")
+    diff.add_argument("old", help="model file written by save, or else a git revision of the repository in the root folder")
+    diff.add_argument("new", help="model file written by save, or else a git revision of the repository in the root folder")
+    diff.add_argument("--depth", type=int, help="fold the modules to this level first. The default is not to fold")
+    diff.add_argument("--package-depth", type=int, default=1, help="level of the packages the changes are summarized for. The default is 1")
+    diff.set_defaults(function=command_diff)
+    commands.add_parser("selftest", help="run the tests of the AA packages").set_defaults(function=command_selftest)
+    return parser
+
+
+def main(argv=None):
+    '''
+    Run ArchAnalyze with command line arguments.
+
+    Parameters
+    ----------
+    argv : list of string, optional
+        The arguments. The default is None, which means sys.argv[1:].
+
+    Returns
+    -------
+    int
+        Exit code.
+    '''
+    args = argument_parser().parse_args(argv)
+    if args.workers == 0:
+        args.workers = None # see AAIngest.scan_files
+    if args.root:
+        AAFileSystem.set_code_root_folder(args.root)
+    if args.clone:
+        AAFileSystem.clone_target_system()
+    return args.function(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+'''
+The remainder of the file are not part of the report.
+Just extracting statistics for explorative purposes.
+'''
+'''
+# from AAAST import AAAST
+# from AAModule import AAModule
+# from AAGraph import AAGraph
+# from AAFileSystem import AAFileSystem
+# from AAHistory import AAHistory
+
+# print("calc churn")
+# modules = AAModule.get_all_modules()
+# AAHistory.add_churns_for_modules(modules)
+# print("calc churn done")
+
+# # Attempt of a view of the rest api
+# RDG = AAGraph.rest_api_digraph(modules)
+# AAView.draw_graph_with_labels(RDG, (20,18))
+
+# print("################################################")
+# AAHistory.print_churns(AAHistory.get_all_commits())
+
+# print("=======================================")
+# AAModule.dump_raw_rest_api_data(modules)
+# print("=======================================")
+# AAModule.dump_rest_routes(modules)
+# print("=======================================")
+# AAFileSystem.dump_file_type_count()   
 '''
\ No newline at end of file